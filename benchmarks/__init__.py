@@ -0,0 +1 @@
+"""Microbenchmarks for hot paths. Run modules with ``python -m benchmarks.<name>``."""
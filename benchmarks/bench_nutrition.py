@@ -0,0 +1,71 @@
+"""Per-row cost of nutrition normalization.
+
+Usage::
+
+    python -m benchmarks.bench_nutrition [--rows N] [--repeat R]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import timeit
+from typing import Any, Dict, List
+
+from src.utils.nutrition import (
+    MACRO_FIELDS,
+    MICRO_FIELDS,
+    NUTRIENT_ALIASES,
+    filter_nutrition,
+    filter_nutrition_batch,
+)
+
+
+def payloads(rows: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Return a deterministic mix of nested, flat and aliased payloads."""
+    rng = random.Random(seed)
+    macros = sorted(MACRO_FIELDS)
+    micros = sorted(MICRO_FIELDS) + sorted(NUTRIENT_ALIASES)
+    result = []
+    for i in range(rows):
+        picked_macros = {k: rng.randint(0, 50) for k in rng.sample(macros, 6)}
+        picked_micros = {k: rng.random() for k in rng.sample(micros, 8)}
+        if i % 2:
+            result.append(
+                {
+                    "serving": {"size_g": 30, "calories": rng.randint(0, 400)},
+                    "macros": picked_macros,
+                    "micronutrients": picked_micros,
+                }
+            )
+        else:
+            result.append(
+                {
+                    "serving_size": 30,
+                    "calories": rng.randint(0, 400),
+                    "unknown_field": 1,
+                    **picked_macros,
+                    **picked_micros,
+                }
+            )
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    data = payloads(args.rows)
+    cases = {
+        "filter_nutrition": lambda: [filter_nutrition(p) for p in data],
+        "filter_nutrition_batch": lambda: filter_nutrition_batch(data),
+    }
+    for name, fn in cases.items():
+        best = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+        print(f"{name:<24} {best / args.rows * 1e6:8.3f} us/row")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Rolled-up nutrition totals against a full vectorized pass.
+
+Usage::
+
+    python -m benchmarks.bench_nutrition_summary [--rows N] [--repeat R]
+
+The service answers from :class:`src.db.rollups.Rollups`, which writes keep
+current. :func:`recompute` works the totals out again from every unit with
+NumPy instead; the tests use it as an independent check of the rollups,
+and this benchmark times it against a cold rollup rebuild and a warm read.
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+import timeit
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+
+from benchmarks.generate import generate
+from src.db import JsonlDB, open_inventory_db
+from src.services.nutrition_summary import nutrition_summary
+from src.utils.nutrition import NUTRIENT_COLUMNS, per_gram, to_number
+
+
+class Columns:
+    """Inventory units projected into NumPy arrays.
+
+    ``grams`` and ``item`` have one entry per unit; ``item`` points into the
+    per-item ``density`` matrix, which holds nutrients per gram with one
+    column per entry of :data:`NUTRIENT_COLUMNS`. Units of an item share its
+    nutrition, so densities are stored once per item. ``tag_item`` and
+    ``tag`` list ``(item, tag)`` memberships, with tag names in ``tags``.
+
+    Rows are walked once to collect flat lists. Unit grams are then worked
+    out with array operations: a weighed unit counts its weight less the
+    empty container, an unweighed one the container's net weight.
+    """
+
+    def __init__(self, rows: Iterable[Dict[str, Any]]) -> None:
+        weight: List[float] = []
+        item: List[int] = []
+        empty: List[float] = []
+        net: List[float] = []
+        cell_item: List[int] = []
+        cell_column: List[int] = []
+        cell_amount: List[float] = []
+        tag_item: List[int] = []
+        tag: List[int] = []
+        tag_ids: Dict[str, int] = {}
+        nan = float("nan")
+        i = -1
+        for i, row in enumerate(rows):
+            container = row.get("container_info") or {}
+            empty.append(to_number(container.get("empty_container_weight_g")) or 0.0)
+            net.append(to_number(container.get("net_weight_g")) or 0.0)
+            for column, amount in per_gram(row.get("nutrition")):
+                cell_item.append(i)
+                cell_column.append(column)
+                cell_amount.append(amount)
+            for unit in row.get("units") or ():
+                value = to_number(unit.get("weight_g"))
+                weight.append(nan if value is None else value)
+                item.append(i)
+            for name in set(row.get("tags") or ()):
+                tag_item.append(i)
+                tag.append(tag_ids.setdefault(str(name), len(tag_ids)))
+
+        self.item = np.asarray(item, dtype=np.intp)
+        weights = np.asarray(weight, dtype=float)
+        empties = np.asarray(empty, dtype=float)[self.item]
+        nets = np.asarray(net, dtype=float)[self.item]
+        self.grams = np.where(
+            np.isnan(weights), nets, np.maximum(weights - empties, 0.0)
+        )
+        self.density = np.full((i + 1, len(NUTRIENT_COLUMNS)), np.nan)
+        self.density[cell_item, cell_column] = cell_amount
+        self.tag_item = np.asarray(tag_item, dtype=np.intp)
+        self.tag = np.asarray(tag, dtype=np.intp)
+        self.tags = list(tag_ids)
+
+
+def _group(
+    units: np.ndarray,
+    grams: np.ndarray,
+    nutrients: np.ndarray,
+    reported: np.ndarray,
+) -> Dict[str, Any]:
+    return {
+        "units": int(units),
+        "grams": round(float(grams), 3),
+        "nutrients": {
+            name: round(float(nutrients[i]), 3)
+            for i, name in enumerate(NUTRIENT_COLUMNS)
+            if reported[i]
+        },
+    }
+
+
+def summarize(columns: Columns) -> Dict[str, Any]:
+    """Total units, grams and nutrients overall and per tag."""
+    n_items = len(columns.density)
+    item_units = np.bincount(columns.item, minlength=n_items)
+    item_grams = np.bincount(columns.item, weights=columns.grams, minlength=n_items)
+    known = ~np.isnan(columns.density)
+    # Nutrients per item: grams on hand times nutrients per gram.
+    item_totals = np.where(known, columns.density, 0.0) * item_grams[:, None]
+    item_reported = known & (item_units > 0)[:, None]
+
+    # Group (item, tag) memberships by tag and reduce each run of them.
+    order = np.argsort(columns.tag, kind="stable")
+    members = columns.tag_item[order]
+    starts = np.searchsorted(columns.tag[order], np.arange(len(columns.tags)))
+    if len(members):
+        tag_units = np.add.reduceat(item_units[members], starts)
+        tag_grams = np.add.reduceat(item_grams[members], starts)
+        tag_totals = np.add.reduceat(item_totals[members], starts)
+        tag_reported = np.logical_or.reduceat(item_reported[members], starts)
+    else:
+        tag_units = tag_grams = tag_totals = tag_reported = np.empty((0,))
+
+    return {
+        **_group(
+            item_units.sum(),
+            item_grams.sum(),
+            item_totals.sum(axis=0),
+            item_reported.any(axis=0),
+        ),
+        "by_tag": {
+            name: _group(tag_units[t], tag_grams[t], tag_totals[t], tag_reported[t])
+            for t, name in sorted(enumerate(columns.tags), key=lambda p: p[1])
+        },
+    }
+
+
+def recompute(inv_db: JsonlDB) -> Dict[str, Any]:
+    """Summarize nutrition on hand with a full pass over the inventory."""
+    return summarize(Columns(inv_db.iter_rows()))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _, inv_path = generate(Path(tmp), args.rows)
+        rollups = inv_path.with_name(inv_path.name + ".rollups")
+        db = open_inventory_db(inv_path, "jsonl")
+
+        def rebuild() -> None:
+            rollups.unlink(missing_ok=True)
+            nutrition_summary(open_inventory_db(inv_path, "jsonl"))
+
+        cases = {
+            "recompute": lambda: recompute(db),
+            "rollups_rebuild": rebuild,
+            "rollups_read": lambda: nutrition_summary(db),
+        }
+        for name, fn in cases.items():
+            best = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+            print(f"{name:<16} {best * 1e3:10.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""How storage and the services scale with the size of the data files.
+
+Usage::
+
+    python -m benchmarks.bench_storage [--sizes 1k,100k,1m] [--output FILE]
+                                       [--compare BASELINE] [--threshold 0.2]
+
+For each size, synthetic files from :mod:`benchmarks.generate` are copied
+into a fresh directory and opened the way the service opens them, so
+``JOURNAL_MODE``, ``FSYNC_POLICY``, ``OFFSET_INDEX``, ``MUTATION_LOG`` and
+``STORAGE_BACKEND`` apply (SQLite databases are migrated from the files
+first, untimed). Results are written as JSON; ``--compare`` reports the
+cases that got slower than a previous result by more than ``--threshold``
+and exits with status 1 if there are any.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.generate import generate
+from src import config
+from src.db import open_inventory_db, open_product_db
+from src.db.sqlite import migrate
+from src.services import inventory_service, product_info_service
+from src.utils.nutrition import filter_nutrition
+
+# Cases faster than this per operation are too noisy to flag, in seconds.
+NOISE_FLOOR = 2e-6
+
+
+def parse_size(text: str) -> int:
+    """Parse ``1000``, ``100k`` or ``1m``."""
+
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def _timed(fn: Callable[[], Any], ops: int = 1) -> Dict[str, float]:
+    start = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds, "ops": ops, "per_op": seconds / ops}
+
+
+def _open(work: Path) -> Any:
+    return (
+        open_inventory_db(work / "inventory.ndjson"),
+        open_product_db(work / "product-info.ndjson"),
+    )
+
+
+def _sample(rows: List[Dict[str, Any]], ops: int, rng: random.Random) -> List[Any]:
+    return [rng.choice(rows) for _ in range(ops)]
+
+
+def run_size(
+    rows: int, source: Path, work: Path, ops: int, writes: int, seed: int = 0
+) -> Dict[str, Any]:
+    """Time every case against ``rows``-row copies of the files in ``source``."""
+
+    work.mkdir(parents=True)
+    for name in ("inventory.ndjson", "product-info.ndjson"):
+        shutil.copy(source / name, work / name)
+    if config.get_storage_backend() == "sqlite":
+        migrate(
+            open_inventory_db(work / "inventory.ndjson", "jsonl"),
+            open_inventory_db(work / "inventory.ndjson"),
+        )
+        migrate(
+            open_product_db(work / "product-info.ndjson", "jsonl"),
+            open_product_db(work / "product-info.ndjson"),
+        )
+
+    rng = random.Random(seed)
+    timings: Dict[str, Dict[str, float]] = {}
+    inv_db, prod_db = _open(work)
+    first = {}
+    timings["cold_load_inventory"] = _timed(lambda: first.update(item=inv_db.get(1)))
+    timings["cold_load_products"] = _timed(
+        lambda: first.update(product=prod_db.lookup("upc", first["item"]["upc"]))
+    )
+    # A second process start, with whatever the first one persisted.
+    inv_db, prod_db = _open(work)
+    timings["restart_inventory"] = _timed(lambda: inv_db.get(1))
+    timings["restart_products"] = _timed(
+        lambda: prod_db.lookup("upc", first["item"]["upc"])
+    )
+
+    items = inventory_service.list_items(inv_db)
+    products = product_info_service.list_product_info(prod_db)
+    uuids = [
+        unit["uuid"] for item in _sample(items, ops, rng) for unit in item["units"][:1]
+    ]
+    ids = [item["id"] for item in _sample(items, ops, rng)]
+    upcs = [product["upc"] for product in _sample(products, ops, rng)]
+    product_ids = [product["product_id"] for product in _sample(products, ops, rng)]
+
+    timings["lookup_item_id"] = _timed(
+        lambda: [inventory_service.get_item_by_id(inv_db, id_) for id_ in ids], ops
+    )
+    timings["lookup_unit_uuid"] = _timed(
+        lambda: [inventory_service.get_item_by_unit_uuid(inv_db, u) for u in uuids],
+        ops,
+    )
+    timings["lookup_product_id"] = _timed(
+        lambda: [
+            product_info_service.get_product_info_by_id(prod_db, id_)
+            for id_ in product_ids
+        ],
+        ops,
+    )
+    timings["lookup_product_upc"] = _timed(
+        lambda: [
+            product_info_service.get_product_info_by_upc(prod_db, u) for u in upcs
+        ],
+        ops,
+    )
+    timings["list_items"] = _timed(lambda: inventory_service.list_items(inv_db))
+    timings["list_items_by_tag"] = _timed(
+        lambda: inventory_service.list_items(inv_db, tags=["protein"], opened=True)
+    )
+    timings["list_products"] = _timed(
+        lambda: product_info_service.list_product_info(prod_db)
+    )
+    nutrition = [p["nutrition"] for p in _sample(products, min(rows, 10_000), rng)]
+    timings["filter_nutrition"] = _timed(
+        lambda: [filter_nutrition(n) for n in nutrition], len(nutrition)
+    )
+
+    # Half the entries add units to known products, half bring a new UPC.
+    entries = []
+    for i in range(writes):
+        if i % 2:
+            entries.append({"product": rng.choice(product_ids), "quantity": 3})
+        else:
+            entries.append(
+                {"upc": f"9{rows + i:011d}", "name": f"Bench item {i}", "quantity": 2}
+            )
+    timings["create_item"] = _timed(
+        lambda: [inventory_service.create_item(inv_db, prod_db, e) for e in entries],
+        writes,
+    )
+
+    return {
+        "rows": rows,
+        "units": sum(len(item["units"]) for item in items),
+        "bytes": {
+            name: (source / name).stat().st_size
+            for name in ("inventory.ndjson", "product-info.ndjson")
+        },
+        "timings": timings,
+    }
+
+
+def _commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).resolve().parent,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def _settings() -> Dict[str, Any]:
+    return {
+        "storage_backend": config.get_storage_backend(),
+        "journal_mode": config.get_journal_mode(),
+        "fsync_policy": config.get_fsync_policy(),
+        "offset_index": config.get_offset_index(),
+        "mutation_log": config.get_mutation_log(),
+    }
+
+
+def compare(
+    baseline: Dict[str, Any], current: Dict[str, Any], threshold: float
+) -> List[str]:
+    """Return a line for each case more than ``threshold`` slower than before."""
+
+    regressions = []
+    for size, result in current["sizes"].items():
+        before = baseline.get("sizes", {}).get(size)
+        if before is None:
+            continue
+        for case, timing in result["timings"].items():
+            old = before["timings"].get(case)
+            if old is None or timing["per_op"] < NOISE_FLOOR:
+                continue
+            ratio = timing["per_op"] / old["per_op"]
+            if ratio > 1 + threshold:
+                regressions.append(
+                    f"{size:>8} {case:<22} {old['per_op'] * 1e3:10.3f} ms -> "
+                    f"{timing['per_op'] * 1e3:10.3f} ms ({ratio:.2f}x)"
+                )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="\n".join(__doc__.splitlines()[1:]),
+    )
+    parser.add_argument("--sizes", default="1k,100k")
+    parser.add_argument("--ops", type=int, default=1000, help="lookups per case")
+    parser.add_argument("--writes", type=int, default=200, help="create_item calls")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--data-dir",
+        type=Path,
+        help="keep generated files here and reuse them on later runs",
+    )
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--compare", type=Path, help="earlier result to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    result: Dict[str, Any] = {
+        "commit": _commit(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": _settings(),
+        "seed": args.seed,
+        "sizes": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir or Path(tmp) / "data"
+        for rows in map(parse_size, args.sizes.split(",")):
+            source = data_dir / f"{rows}-{args.seed}"
+            if not (source / "inventory.ndjson").exists():
+                print(f"generating {rows:,} rows", file=sys.stderr)
+                generate(source, rows, args.seed)
+            size = run_size(
+                rows,
+                source,
+                Path(tmp) / f"run-{rows}",
+                args.ops,
+                args.writes,
+                args.seed,
+            )
+            result["sizes"][str(rows)] = size
+            for case, timing in size["timings"].items():
+                print(
+                    f"{rows:>8} {case:<22} {timing['per_op'] * 1e3:10.3f} ms/op"
+                    f"  ({timing['ops']} ops)"
+                )
+
+    output = args.output or Path(f"bench-storage-{result['commit'] or 'local'}.json")
+    output.write_text(json.dumps(result, indent=2) + "\n", encoding="utf-8")
+    print(f"results written to {output}", file=sys.stderr)
+
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        regressions = compare(baseline, result, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            raise SystemExit(1)
+        print(f"no regressions against {args.compare}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Deterministic synthetic catalog and pantry data.
+
+Usage::
+
+    python -m benchmarks.generate --rows 100000 --out DIR [--seed S]
+
+Writes ``DIR/product-info.ndjson`` with ``rows`` products and
+``DIR/inventory.ndjson`` with one item per product, each holding several
+units. The same ``rows`` and ``seed`` always produce the same bytes.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Tuple
+
+from src.utils.nutrition import MACRO_FIELDS, MICRO_FIELDS
+
+# shortuuid's alphabet, so generated ids look like the service's own.
+_ALPHABET = "23456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+# fmt: off
+BRANDS = (
+    "Acme", "Barton", "Cascade", "Dalby", "Evergreen", "Fairfield", "Golden",
+    "Harvest", "Isola", "Juniper", "Kinloch", "Lakeside", "Meadow", "Northway",
+    "Orchard", "Prairie", "Quarry", "Riverside", "Summit", "Thistle",
+)
+ADJECTIVES = (
+    "Creamy", "Crunchy", "Organic", "Smoked", "Roasted", "Unsalted", "Spicy",
+    "Sweet", "Whole", "Light", "Classic", "Honey", "Garlic", "Sea Salt",
+    "Dark", "Extra Virgin", "Wild", "Toasted", "Frozen", "Fresh",
+)
+FOODS = (
+    "Peanut Butter", "Almonds", "Oat Milk", "Cheddar", "Greek Yogurt",
+    "Rolled Oats", "Black Beans", "Chickpeas", "Brown Rice", "Pasta",
+    "Tomato Sauce", "Olive Oil", "Tuna", "Salmon", "Granola", "Crackers",
+    "Coffee", "Green Tea", "Maple Syrup", "Salsa", "Tortillas", "Bread",
+    "Butter", "Eggs", "Spinach", "Blueberries", "Chicken Broth", "Lentils",
+    "Quinoa", "Dark Chocolate",
+)
+SIZES = ("", " Pouch", " Jar", " Family Size", " Snack Pack", " 2-Pack")
+TAGS = (
+    "favorite", "protein", "snack", "breakfast", "dairy", "vegan", "gluten-free",
+    "pantry", "frozen", "bulk", "organic", "kids",
+)
+# fmt: on
+
+_MACROS = sorted(MACRO_FIELDS)
+_MICROS = sorted(MICRO_FIELDS)
+_TODAY = date(2024, 1, 1)
+
+
+def _uuid(rng: random.Random) -> str:
+    return "".join(rng.choices(_ALPHABET, k=22))
+
+
+def _nutrition(rng: random.Random) -> Dict[str, Any]:
+    macros = {
+        name: round(rng.uniform(0, 40), 1)
+        for name in rng.sample(_MACROS, rng.randint(6, len(_MACROS)))
+    }
+    micros = {
+        name: round(rng.uniform(0, 30), 2) if rng.random() < 0.8 else None
+        for name in rng.sample(_MICROS, rng.randint(4, 16))
+    }
+    return {
+        "serving": {
+            "size_g": rng.choice((15, 28, 30, 33, 40, 100, 240)),
+            "calories": rng.randint(0, 450),
+        },
+        "macros": macros,
+        "micronutrients": micros,
+    }
+
+
+def products(rows: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """Yield ``rows`` catalog products with nested nutrition."""
+
+    rng = random.Random(f"products:{seed}")
+    for i in range(rows):
+        net = rng.choice((85, 150, 227, 340, 369, 454, 907, 1000, 1360))
+        yield {
+            "name": " ".join(
+                (rng.choice(BRANDS), rng.choice(ADJECTIVES), rng.choice(FOODS))
+            )
+            + rng.choice(SIZES),
+            "upc": f"{i:011d}{(seed + i) % 10}",
+            "product_id": _uuid(rng),
+            "tags": sorted(rng.sample(TAGS, rng.randint(0, 3))),
+            "container_info": {
+                "net_weight_g": net,
+                "empty_container_weight_g": rng.randint(5, net // 8 + 5),
+            },
+            "nutrition": _nutrition(rng),
+        }
+
+
+def inventory(
+    catalog: Iterable[Dict[str, Any]], seed: int = 0, max_units: int = 12
+) -> Iterator[Dict[str, Any]]:
+    """Yield one inventory item per product of ``catalog``.
+
+    Items hold 1 to ``max_units`` units, some opened and most with an
+    expiration date within a year of 2024-01-01.
+    """
+
+    rng = random.Random(f"inventory:{seed}")
+    for item_id, product in enumerate(catalog, 1):
+        container = product["container_info"]
+        weight = container["net_weight_g"] + container["empty_container_weight_g"]
+        units = []
+        for _ in range(rng.randint(1, max_units)):
+            expires = None
+            if rng.random() < 0.85:
+                expires = (_TODAY + timedelta(days=rng.randint(-30, 365))).isoformat()
+            opened = rng.random() < 0.2
+            units.append(
+                {
+                    "uuid": _uuid(rng),
+                    "opened": opened,
+                    "weight_g": (
+                        round(weight * rng.uniform(0.1, 1), 1) if opened else weight
+                    ),
+                    "expiration_date": expires,
+                }
+            )
+        yield {
+            "id": item_id,
+            "product_id": product["product_id"],
+            "name": product["name"],
+            "upc": product["upc"],
+            "tags": product["tags"],
+            "container_info": container,
+            "nutrition": product["nutrition"],
+            "units": units,
+        }
+
+
+def write_ndjson(path: Path, rows: Iterable[Dict[str, Any]]) -> int:
+    """Write ``rows`` to ``path`` and return how many there were."""
+
+    count = 0
+    with path.open("w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+            count += 1
+    return count
+
+
+def generate(out: Path, rows: int, seed: int = 0) -> Tuple[Path, Path]:
+    """Write the catalog and inventory files into ``out`` and return their paths."""
+
+    out.mkdir(parents=True, exist_ok=True)
+    prod_path = out / "product-info.ndjson"
+    inv_path = out / "inventory.ndjson"
+    write_ndjson(prod_path, products(rows, seed))
+    write_ndjson(inv_path, inventory(products(rows, seed), seed))
+    return prod_path, inv_path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--out", type=Path, required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for path in generate(args.out, args.rows, args.seed):
+        print(f"{path}  {path.stat().st_size:>14,} bytes")
+
+
+if __name__ == "__main__":
+    main()
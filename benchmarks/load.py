@@ -0,0 +1,314 @@
+"""Concurrent load against the API, with latency percentiles per endpoint.
+
+Usage::
+
+    python -m benchmarks.load [--rows N] [--requests N] [--concurrency C]
+                              [--mix create=1,list=2,lookup=7]
+                              [--url URL | --uvicorn [--workers W]]
+                              [--data-dir DIR] [--output FILE]
+
+By default the app in ``src/api/app.py`` is driven in-process through
+httpx's ASGI transport, so no socket is opened. ``--uvicorn`` starts the app
+under uvicorn on a free localhost port instead, and ``--url`` targets a
+server that is already running. Unless ``--data-dir`` is given, requests go
+to a temporary copy of a catalog and pantry of ``--rows`` rows generated by
+:mod:`benchmarks.generate`.
+
+Each of ``--concurrency`` clients sends requests back to back, picking
+``create`` (``POST /inventory``), ``list`` (a page of ``GET /inventory``) or
+``lookup`` (``GET /inventory/uuid/{uuid}``) according to ``--mix``. The
+report gives throughput and p50/p95/p99 latency per endpoint; the exit
+status is 1 if any request failed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List
+
+import httpx
+
+from benchmarks.generate import generate
+
+PROJECT_DIR = Path(__file__).resolve().parents[1]
+OPS = ("create", "list", "lookup")
+ENDPOINTS = {
+    "create": "POST /inventory",
+    "list": "GET /inventory",
+    "lookup": "GET /inventory/uuid/{uuid}",
+}
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """Parse ``create=1,list=2,lookup=7`` into weights by operation."""
+
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPS:
+            raise ValueError(f"Unknown operation {name!r}, expected one of {OPS}")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise ValueError("The mix needs at least one positive weight")
+    return mix
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Return the nearest-rank ``q`` percentile of sorted ``ordered``."""
+
+    if not ordered:
+        return 0.0
+    rank = max(math.ceil(q / 100 * len(ordered)), 1)
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class Load:
+    """Shared state of one run: known ids, latencies and failures."""
+
+    def __init__(self, mix: Dict[str, float], seed: int) -> None:
+        self.ops = list(mix)
+        total = 0.0
+        self.cum_weights = []
+        for op in self.ops:
+            total += mix[op]
+            self.cum_weights.append(total)
+        self.rng = random.Random(seed)
+        self.uuids: List[str] = []
+        self.product_ids: List[str] = []
+        self.latencies: Dict[str, List[float]] = {op: [] for op in self.ops}
+        self.errors: Dict[str, int] = {op: 0 for op in self.ops}
+        self.created = 0
+
+    def learn(self, items: List[Dict[str, Any]]) -> None:
+        for item in items:
+            if item.get("product_id"):
+                self.product_ids.append(item["product_id"])
+            self.uuids.extend(unit["uuid"] for unit in item.get("units") or [])
+
+    async def request(self, client: httpx.AsyncClient, op: str) -> None:
+        if op == "create":
+            self.created += 1
+            if self.product_ids and self.created % 2:
+                body = {"product": self.rng.choice(self.product_ids), "quantity": 1}
+            else:
+                body = {
+                    "upc": f"8{os.getpid() % 1000:03d}{self.created:08d}",
+                    "name": f"Load item {self.created}",
+                    "quantity": 2,
+                }
+            call = client.post("/inventory", json=body)
+        elif op == "list":
+            call = client.get("/inventory", params={"limit": 50})
+        else:
+            if not self.uuids:
+                return await self.request(client, "create")
+            call = client.get(f"/inventory/uuid/{self.rng.choice(self.uuids)}")
+        start = time.perf_counter()
+        try:
+            response = await call
+        except httpx.HTTPError:
+            self.errors[op] += 1
+            return
+        self.latencies[op].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[op] += 1
+        elif op == "create":
+            self.learn([response.json()])
+
+    async def worker(self, client: httpx.AsyncClient, budget: List[int]) -> None:
+        while budget[0] > 0:
+            budget[0] -= 1
+            op = self.rng.choices(self.ops, cum_weights=self.cum_weights)[0]
+            await self.request(client, op)
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        endpoints = {}
+        for op in self.ops:
+            ordered = sorted(self.latencies[op])
+            endpoints[ENDPOINTS[op]] = {
+                "requests": len(ordered),
+                "errors": self.errors[op],
+                "throughput": len(ordered) / elapsed if elapsed else 0.0,
+                "p50_ms": percentile(ordered, 50) * 1e3,
+                "p95_ms": percentile(ordered, 95) * 1e3,
+                "p99_ms": percentile(ordered, 99) * 1e3,
+            }
+        requests = sum(e["requests"] for e in endpoints.values())
+        return {
+            "seconds": elapsed,
+            "requests": requests,
+            "throughput": requests / elapsed if elapsed else 0.0,
+            "endpoints": endpoints,
+        }
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    requests: int,
+    concurrency: int,
+    mix: Dict[str, float],
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Send ``requests`` requests from ``concurrency`` clients and report."""
+
+    load = Load(mix, seed)
+    warmup = await client.get("/inventory", params={"limit": 1000})
+    warmup.raise_for_status()
+    if isinstance(warmup.json(), list):
+        load.learn(warmup.json())
+    budget = [requests]
+    start = time.perf_counter()
+    await asyncio.gather(*(load.worker(client, budget) for _ in range(concurrency)))
+    return load.report(time.perf_counter() - start)
+
+
+@asynccontextmanager
+async def asgi_client() -> AsyncIterator[httpx.AsyncClient]:
+    """Yield a client for the app in this process, with its lifespan run."""
+
+    from src.api.app import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://app", timeout=60
+        ) as client:
+            yield client
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@asynccontextmanager
+async def uvicorn_client(workers: int) -> AsyncIterator[httpx.AsyncClient]:
+    """Start the app under uvicorn on localhost and yield a client for it."""
+
+    port = _free_port()
+    env = dict(os.environ)
+    if workers > 1:
+        env["MULTI_PROCESS"] = "1"
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "src.api.app:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ],
+        cwd=PROJECT_DIR,
+        env=env,
+    )
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}", timeout=60
+        ) as client:
+            deadline = time.monotonic() + 60
+            while True:
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if server.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn did not start")
+                await asyncio.sleep(0.2)
+            yield client
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(
+        f"{'endpoint':<28} {'requests':>9} {'errors':>7} {'req/s':>9} "
+        f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    )
+    for name, e in report["endpoints"].items():
+        print(
+            f"{name:<28} {e['requests']:>9} {e['errors']:>7} {e['throughput']:>9.1f} "
+            f"{e['p50_ms']:>9.2f} {e['p95_ms']:>9.2f} {e['p99_ms']:>9.2f}"
+        )
+    print(
+        f"{'total':<28} {report['requests']:>9} {'':>7} "
+        f"{report['throughput']:>9.1f}  in {report['seconds']:.2f}s"
+    )
+
+
+async def _run(args: argparse.Namespace, mix: Dict[str, float]) -> Dict[str, Any]:
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+    elif args.uvicorn:
+        client = uvicorn_client(args.workers)
+    else:
+        client = asgi_client()
+    async with client as c:
+        return await drive(c, args.requests, args.concurrency, mix, args.seed)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="\n".join(__doc__.splitlines()[1:]),
+    )
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--mix", default="create=1,list=2,lookup=7")
+    parser.add_argument("--seed", type=int, default=0)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="base URL of a running server")
+    target.add_argument("--uvicorn", action="store_true", help="start uvicorn")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--data-dir", type=Path, help="use this DATA_DIR as is")
+    parser.add_argument("--output", type=Path, help="also write the report as JSON")
+    args = parser.parse_args()
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if not args.url:
+            data_dir = args.data_dir
+            if data_dir is None:
+                data_dir = Path(tmp)
+                print(f"generating {args.rows:,} rows", file=sys.stderr)
+                generate(data_dir, args.rows, args.seed)
+            # Read when the app is imported or started, so set it first.
+            os.environ["DATA_DIR"] = str(data_dir)
+            os.environ.pop("PRODUCT_DATABASE_URL", None)
+        report = asyncio.run(_run(args, mix))
+
+    print_report(report)
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    if any(e["errors"] for e in report["endpoints"].values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
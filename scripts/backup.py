@@ -1,33 +1,163 @@
 #!/usr/bin/env python3
-"""Create a timestamped backup of the JSONL data files."""
+"""Back up and restore the data files.
+
+Backups are incremental: files are split into chunks that are stored once,
+compressed, under the hash of their contents in BACKUP_DIR, and each
+snapshot is a small manifest naming its chunks. A backup when little has
+changed therefore takes little time and space.
+"""
 from __future__ import annotations
 
-import shutil
+import argparse
 import sys
-from datetime import datetime
+import tempfile
 from pathlib import Path
+from typing import Any, Callable, Dict
 
 PROJECT_DIR = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(PROJECT_DIR))
 
 from src import config
+from src.db import JsonlDB, open_inventory_db, open_product_db, storage_path
+from src.db.wal import MutationLog, log_dir
+from src.services.backup import CODECS, BackupStore
+
+
+def _data_files() -> Dict[str, Path]:
+    return {
+        "inventory": storage_path(Path(config.get_inventory_database_url())),
+        "products": storage_path(Path(config.get_product_database_url())),
+    }
+
+
+OPENERS: Dict[str, Callable[..., JsonlDB]] = {
+    "inventory": open_inventory_db,
+    "products": open_product_db,
+}
+
+
+def _logs() -> Dict[str, MutationLog]:
+    return {
+        name: MutationLog(path)
+        for name, path in _data_files().items()
+        if log_dir(path).exists()
+    }
+
+
+def _pin_logs(store: BackupStore) -> Dict[str, MutationLog]:
+    """Keep the log records the remaining snapshots need to recover from."""
+
+    manifests = [store.manifest(name) for name in store.snapshots()]
+    logs = _logs()
+    for name, log in logs.items():
+        seqs = [m["files"].get(name, {}).get("wal_seq") for m in manifests]
+        seqs = [seq for seq in seqs if seq is not None]
+        log.keep(min(seqs) + 1 if seqs else None)
+    return logs
+
+
+def backup(store: BackupStore, args: argparse.Namespace) -> None:
+    files = _data_files()
+    missing = [str(path) for path in files.values() if not path.exists()]
+    if missing:
+        raise SystemExit(f"Data files do not exist: {', '.join(missing)}")
+    logs = _logs()
+    for log in logs.values():
+        # Hold on to every segment until the new snapshot is recorded.
+        log.keep(log.first_seq)
+    # Read before the files: they hold at least the logged changes up to
+    # the checkpoint, which is where recovery replays the log from.
+    meta = {name: {"wal_seq": log.checkpointed} for name, log in logs.items()}
+    try:
+        manifest = store.create(files, codec=args.codec, meta=meta)
+    finally:
+        _pin_logs(store)
+    size = sum(entry["size"] for entry in manifest["files"].values())
+    print(
+        f"Snapshot {manifest['name']} of {size:,} bytes written to {store.root} "
+        f"({manifest['stored']:,} new bytes stored)"
+    )
+
+
+def list_snapshots(store: BackupStore, args: argparse.Namespace) -> None:
+    for name in store.snapshots():
+        manifest = store.manifest(name)
+        size = sum(entry["size"] for entry in manifest["files"].values())
+        print(f"{name:<20} {size:>14,} bytes  {manifest['stored']:>14,} stored")
+
+
+def restore(store: BackupStore, args: argparse.Namespace) -> None:
+    files = _data_files()
+    logged: Dict[str, Path] = {}
+    tmp = tempfile.TemporaryDirectory()
+
+    def target(name: str, entry: Dict[str, Any]) -> Path:
+        if args.to is not None:
+            path = args.to / entry["file"]
+        else:
+            path = files.get(name, config.get_data_dir() / entry["file"])
+        if path.name != entry["file"]:
+            path = path.with_name(entry["file"])
+        if path.exists() and not args.force:
+            raise SystemExit(f"{path} exists; use --force to replace it")
+        if name in OPENERS and log_dir(path).exists():
+            # Written below as a logged replace: copying the bytes over would
+            # leave the changes logged since the snapshot to be replayed on
+            # top of it, and recovery would not know about the restore.
+            logged[name] = path
+            return Path(tmp.name) / entry["file"]
+        # A stale write-ahead log would be replayed over the restored database.
+        for suffix in ("-wal", "-shm"):
+            path.with_name(path.name + suffix).unlink(missing_ok=True)
+        return path
+
+    with tmp:
+        for name, path in store.restore(args.snapshot, target).items():
+            if name in logged:
+                db = OPENERS[name](logged[name], "jsonl")
+                db.write_all(JsonlDB(path, key=db.key).read_all())
+                path = logged[name]
+            print(f"Restored {name} to {path}")
+
+
+def prune(store: BackupStore, args: argparse.Namespace) -> None:
+    dropped, removed = store.prune(args.keep)
+    print(f"Dropped {len(dropped)} snapshots and {removed} unused chunks")
+    for name, log in _pin_logs(store).items():
+        kept = log.kept
+        segments = log.prune(log.checkpointed + 1 if kept is None else kept)
+        print(f"Dropped {segments} {name} log segments")
 
 
 def main() -> None:
-    db_path = Path(config.get_database_url())
-    prod_path = Path(config.get_product_database_url())
-    if not db_path.exists() or not prod_path.exists():
-        raise SystemExit("Data files do not exist")
-
-    backup_dir = config.get_backup_dir()
-    backup_dir.mkdir(parents=True, exist_ok=True)
-
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    inv_backup = backup_dir / f"inventory_{timestamp}.jsonl"
-    prod_backup = backup_dir / f"products_{timestamp}.jsonl"
-    shutil.copy2(db_path, inv_backup)
-    shutil.copy2(prod_path, prod_backup)
-    print(f"Backup written to {inv_backup} and {prod_backup}")
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.set_defaults(run=backup, codec="gzip")
+    commands = parser.add_subparsers(title="commands")
+
+    create = commands.add_parser("create", help="take a snapshot (the default)")
+    create.add_argument("--codec", choices=sorted(CODECS), default="gzip")
+    create.set_defaults(run=backup)
+
+    commands.add_parser("list", help="list snapshots").set_defaults(run=list_snapshots)
+
+    rebuild = commands.add_parser("restore", help="rebuild the files of a snapshot")
+    rebuild.add_argument("snapshot", help="snapshot name, as shown by list")
+    rebuild.add_argument(
+        "--to", type=Path, help="directory to write to instead of the data files"
+    )
+    rebuild.add_argument(
+        "--force", action="store_true", help="replace files that already exist"
+    )
+    rebuild.set_defaults(run=restore)
+
+    drop = commands.add_parser("prune", help="drop old snapshots and unused chunks")
+    drop.add_argument("--keep", type=int, required=True, help="snapshots to keep")
+    drop.set_defaults(run=prune)
+
+    args = parser.parse_args()
+    args.run(BackupStore(config.get_backup_dir()), args)
 
 
 if __name__ == "__main__":
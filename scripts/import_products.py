@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""Import product catalog rows from an NDJSON file."""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_DIR))
+
+from src.db import get_product_db
+from src.services.product_import import import_products, iter_ndjson
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("source", type=Path, help="NDJSON file of products")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    if not args.source.exists():
+        raise SystemExit(f"{args.source} does not exist")
+
+    start = time.monotonic()
+
+    def report(counts: dict) -> None:
+        elapsed = time.monotonic() - start
+        rate = counts["read"] / elapsed if elapsed else 0.0
+        print(f"\r{counts['read']} rows read ({rate:,.0f}/s)", end="", file=sys.stderr)
+
+    counts = import_products(
+        get_product_db(),
+        iter_ndjson(args.source),
+        batch_size=args.batch_size,
+        progress=report,
+    )
+    print(file=sys.stderr)
+    print(
+        f"Imported {counts['read']} rows in {time.monotonic() - start:.1f}s: "
+        f"{counts['created']} created, {counts['updated']} updated, "
+        f"{counts['skipped']} skipped"
+    )
+
+
+if __name__ == "__main__":
+    main()
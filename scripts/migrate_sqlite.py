@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Copy the NDJSON inventory and catalog into SQLite databases.
+
+Run this once before starting the service with ``STORAGE_BACKEND=sqlite``.
+The databases are created next to the NDJSON files, which are left as is.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_DIR))
+
+from src import config
+from src.db import open_inventory_db, open_product_db
+from src.db.sqlite import migrate
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="replace the rows of SQLite databases that already hold data",
+    )
+    args = parser.parse_args()
+
+    sources = [
+        (open_inventory_db, Path(config.get_inventory_database_url())),
+        (open_product_db, Path(config.get_product_database_url())),
+    ]
+    for open_db, path in sources:
+        if not path.exists():
+            print(f"Skipping {path}: not found")
+            continue
+        target = open_db(path, backend="sqlite")
+        if target.max_key() is not None and not args.force:
+            raise SystemExit(f"{target.path} already holds rows; use --force")
+        count = migrate(open_db(path, backend="jsonl"), target)
+        print(f"Copied {count} rows from {path} to {target.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Rebuild the data files as they were at a point in time.
+
+Changes recorded in each file's mutation log are replayed on top of the
+newest backup snapshot taken before that time, or on top of an empty file
+when the log goes back that far. Stop the service before recovering in
+place.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+PROJECT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_DIR))
+
+from src import config
+from src.db import JsonlDB, open_inventory_db, open_product_db
+from src.db.wal import MutationLog, log_dir, rows_as_of
+from src.services.backup import BackupStore
+
+Base = Tuple[Iterable[Dict[str, Any]], int]
+
+
+def _base(
+    store: BackupStore, name: str, path: Path, key: str, at: datetime, tmp: Path
+) -> Optional[Base]:
+    """Return the rows and log position of the newest usable snapshot."""
+
+    for snapshot in reversed(store.snapshots()):
+        manifest = store.manifest(snapshot)
+        entry = manifest["files"].get(name)
+        created = datetime.fromisoformat(manifest["created"])
+        if created > at or entry is None or "wal_seq" not in entry:
+            continue
+        if entry["file"] != path.name:
+            continue
+        out = tmp / snapshot
+        store.restore(snapshot, lambda _, e: out / e["file"])
+        rows = JsonlDB(out / path.name, key=key).read_all()
+        print(f"{name}: starting from snapshot {snapshot}")
+        return rows, entry["wal_seq"]
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "at", type=datetime.fromisoformat, help="local time, e.g. 2024-01-31T18:30"
+    )
+    parser.add_argument(
+        "--to", type=Path, help="directory to write to instead of the data files"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="replace the data files in place"
+    )
+    args = parser.parse_args()
+    if config.get_storage_backend() != "jsonl":
+        raise SystemExit("Point-in-time recovery needs STORAGE_BACKEND=jsonl")
+    if args.to is None and not args.force:
+        raise SystemExit("Give --to DIR, or --force to replace the data files")
+    at = args.at
+    if at.tzinfo is not None:
+        at = at.astimezone().replace(tzinfo=None)
+
+    store = BackupStore(config.get_backup_dir())
+    sources = [
+        ("inventory", open_inventory_db, "id", config.get_inventory_database_url()),
+        ("products", open_product_db, "product_id", config.get_product_database_url()),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, open_db, key, url in sources:
+            path = Path(url)
+            if not log_dir(path).exists():
+                print(f"Skipping {name}: {path} has no mutation log")
+                continue
+            base = _base(store, name, path, key, at, Path(tmp))
+            try:
+                rows = rows_as_of(MutationLog(path), key, at.timestamp(), base)
+            except ValueError as exc:
+                raise SystemExit(f"{name}: {exc}; no snapshot before {at} to start from")
+            if args.to is not None:
+                target = args.to / path.name
+                JsonlDB(target, key=key).write_all(rows)
+            else:
+                # Logged as a replace, so later recoveries see it too.
+                target = path
+                open_db(path).write_all(rows)
+            print(f"{name}: wrote {len(rows)} rows as of {at} to {target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,25 @@
 from __future__ import annotations
 
+import json
 import os
-from typing import Any, Dict, List, Optional
-from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import Any, AsyncIterator, Dict, List, Optional
+from pydantic import BaseModel, ValidationError
 
-from fastapi import Depends, FastAPI, HTTPException
-from fastapi.responses import JSONResponse
-from starlette.concurrency import run_in_threadpool
-from src.db import JsonlDB, get_inventory_db, get_product_db
-from src.services import inventory_service, product_info_service
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from src import config
+from src.api.cache import ResponseCache, cached_response
+from src.api.metrics import RequestMetrics, render
+from src.db import JsonlDB, get_inventory_db, get_product_db, views
+from src.db.aio import Storage
+from src.metrics import Exposition, Histograms
+from src.services import inventory_service, nutrition_summary, product_info_service
+
+NDJSON = "application/x-ndjson"
+DEFAULT_PAGE_SIZE = 50
 
 
 class ItemCreate(BaseModel):
@@ -24,7 +35,38 @@ class ItemCreate(BaseModel):
     tags: Optional[List[str]] = None
 
 
-app = FastAPI()
+class RowsResponse(JSONResponse):
+    """JSON response for service results that may hold read-only row views.
+
+    Rows are serialized straight from the cached data, skipping FastAPI's
+    generic encoding pass.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return views.dumps(
+            content,
+            ensure_ascii=False,
+            allow_nan=False,
+            indent=None,
+            separators=(",", ":"),
+        ).encode("utf-8")
+
+
+response_cache = ResponseCache(config.get_response_cache_bytes())
+storage = Storage(config.get_storage_workers())
+request_latency = Histograms()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # Build the product search index before the first query needs it.
+    prod_db = get_product_db()
+    await storage.run(prod_db.read_index, "search", len)
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(RequestMetrics, latency=request_latency)
 
 
 async def inventory_conn() -> JsonlDB:
@@ -38,23 +80,174 @@ async def product_conn() -> JsonlDB:
 @app.get("/health")
 async def health(db: JsonlDB = Depends(inventory_conn)) -> JSONResponse:
     try:
-        await run_in_threadpool(db.read_all)
-        return JSONResponse({"status": "ok"})
+        await storage.read(db, db.read_all)
+        return JSONResponse({"status": "ok", "storage": storage.stats()})
     except Exception as exc:  # pragma: no cover - simple healthcheck
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+@app.get("/metrics")
+async def metrics(
+    inv_db: JsonlDB = Depends(inventory_conn),
+    prod_db: JsonlDB = Depends(product_conn),
+) -> Response:
+    text = render(
+        request_latency,
+        storage,
+        response_cache,
+        {"inventory": inv_db, "product": prod_db},
+    )
+    return Response(text, media_type=Exposition.CONTENT_TYPE)
+
+
 @app.get("/inventory")
 async def list_items(
+    request: Request,
+    tags: Optional[List[str]] = Query(None),
+    upc: Optional[str] = None,
+    opened: Optional[bool] = None,
+    expires_before: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
     inv_db: JsonlDB = Depends(inventory_conn),
 ) -> Any:
-    items = await run_in_threadpool(
-        inventory_service.list_items,
-        inv_db,
+    filters = {
+        "tags": tags,
+        "upc": upc,
+        "opened": opened,
+        "expires_before": expires_before,
+    }
+    filtered = any(value is not None for value in filters.values())
+    paged = limit is not None or cursor is not None
+    if not filtered and not paged and NDJSON in request.headers.get("accept", ""):
+        return StreamingResponse(
+            storage.iterate(inventory_service.iter_item_lines(inv_db)),
+            media_type=NDJSON,
+        )
+
+    async def build() -> Response:
+        try:
+            if paged:
+                items, next_cursor = await storage.run(
+                    inventory_service.page_items,
+                    inv_db,
+                    limit or DEFAULT_PAGE_SIZE,
+                    cursor,
+                    **filters,
+                )
+                headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+                return RowsResponse(items, headers=headers)
+            items = await storage.run(
+                inventory_service.list_items,
+                inv_db,
+                **filters,
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        if not items and not filtered:
+            return RowsResponse({"message": "Inventory empty"})
+        return RowsResponse(items)
+
+    return await cached_response(response_cache, request, inv_db.version, build)
+
+
+@app.get("/inventory/expiring")
+async def list_expiring(
+    request: Request,
+    within: str = "3d",
+    inv_db: JsonlDB = Depends(inventory_conn),
+) -> Any:
+    try:
+        window = inventory_service.parse_window(within)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    async def build() -> Response:
+        units = await storage.read(
+            inv_db, inventory_service.expiring_units, inv_db, window
+        )
+        return RowsResponse(units)
+
+    # The window is relative to today, so the result changes at midnight too.
+    return await cached_response(
+        response_cache, request, inv_db.version, build, vary=date.today()
     )
-    if not items:
-        return {"message": "Inventory empty"}
-    return items
+
+
+@app.get("/inventory/nutrition-summary")
+async def get_nutrition_summary(
+    request: Request,
+    inv_db: JsonlDB = Depends(inventory_conn),
+) -> Any:
+    async def build() -> Response:
+        summary = await storage.read(
+            inv_db, nutrition_summary.nutrition_summary, inv_db
+        )
+        return RowsResponse(summary)
+
+    return await cached_response(response_cache, request, inv_db.version, build)
+
+
+@app.get("/inventory/uuid/{uuid}")
+async def get_item_by_uuid(
+    request: Request,
+    uuid: str,
+    inv_db: JsonlDB = Depends(inventory_conn),
+) -> Any:
+    async def build() -> Response:
+        item = await storage.read(
+            inv_db,
+            inventory_service.get_item_by_unit_uuid,
+            inv_db,
+            uuid,
+        )
+        if item is None:
+            raise HTTPException(status_code=404, detail="Item not found")
+        return RowsResponse(item)
+
+    return await cached_response(response_cache, request, inv_db.version, build)
+
+
+@app.post("/inventory/uuid/{uuid}/consume")
+async def consume_unit(
+    uuid: str,
+    inv_db: JsonlDB = Depends(inventory_conn),
+) -> Any:
+    item = await storage.run(inventory_service.consume_unit, inv_db, uuid)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return RowsResponse(item)
+
+
+@app.get("/inventory/{item_id}")
+async def get_item(
+    request: Request,
+    item_id: int,
+    inv_db: JsonlDB = Depends(inventory_conn),
+) -> Any:
+    async def build() -> Response:
+        item = await storage.read(
+            inv_db,
+            inventory_service.get_item_by_id,
+            inv_db,
+            item_id,
+        )
+        if item is None:
+            raise HTTPException(status_code=404, detail="Item not found")
+        return RowsResponse(item)
+
+    return await cached_response(response_cache, request, inv_db.version, build)
+
+
+@app.delete("/inventory/{item_id}", status_code=204)
+async def delete_item(
+    item_id: int,
+    inv_db: JsonlDB = Depends(inventory_conn),
+) -> Response:
+    deleted = await storage.run(inventory_service.delete_item, inv_db, item_id)
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return Response(status_code=204)
 
 
 @app.post("/inventory", status_code=201)
@@ -64,7 +257,7 @@ async def create_item(
     prod_db: JsonlDB = Depends(product_conn),
 ) -> Any:
     try:
-        return await run_in_threadpool(
+        item = await storage.run(
             inventory_service.create_item,
             inv_db,
             prod_db,
@@ -72,6 +265,85 @@ async def create_item(
         )
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return RowsResponse(item, status_code=201)
+
+
+def _parse_bulk_body(body: bytes, content_type: str) -> List[Any]:
+    try:
+        if content_type.startswith(NDJSON):
+            return [json.loads(line) for line in body.splitlines() if line.strip()]
+        entries = json.loads(body)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail="Invalid JSON body") from exc
+    if not isinstance(entries, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array")
+    return entries
+
+
+def _entry_error(index: int, exc: ValidationError) -> Dict[str, Any]:
+    """Describe an invalid bulk entry the way FastAPI's 422 ``detail`` does."""
+
+    detail = [
+        {
+            **{key: value for key, value in error.items() if key != "url"},
+            "loc": ("body", index, *error["loc"]),
+        }
+        for error in exc.errors()
+    ]
+    return {
+        "index": index,
+        "error": "Invalid entry",
+        "detail": jsonable_encoder(detail),
+    }
+
+
+@app.post("/inventory/bulk")
+async def create_items(
+    request: Request,
+    inv_db: JsonlDB = Depends(inventory_conn),
+    prod_db: JsonlDB = Depends(product_conn),
+) -> Any:
+    entries = _parse_bulk_body(
+        await request.body(), request.headers.get("content-type", "")
+    )
+    results: List[Optional[Dict[str, Any]]] = [None] * len(entries)
+    valid: List[Dict[str, Any]] = []
+    positions: List[int] = []
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            results[i] = {"index": i, "error": "entry must be a JSON object"}
+            continue
+        try:
+            valid.append(ItemCreate(**entry).dict(exclude_unset=True))
+        except ValidationError as exc:
+            results[i] = _entry_error(i, exc)
+            continue
+        positions.append(i)
+    created = await storage.run(
+        inventory_service.create_items,
+        inv_db,
+        prod_db,
+        valid,
+    )
+    for i, result in zip(positions, created):
+        results[i] = {**result, "index": i}
+    return RowsResponse(results)
+
+
+@app.get("/products/search")
+async def search_products(
+    request: Request,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=100),
+    prod_db: JsonlDB = Depends(product_conn),
+) -> Any:
+    async def build() -> Response:
+        products = await storage.read(
+            prod_db, product_info_service.search_products, prod_db, q, limit
+        )
+        return RowsResponse(products)
+
+    return await cached_response(response_cache, request, prod_db.version, build)
 
 
 if __name__ == "__main__":  # pragma: no cover
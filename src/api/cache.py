@@ -0,0 +1,112 @@
+"""Serialized response cache with ETag revalidation."""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, NamedTuple, Optional
+
+from fastapi import Request, Response
+
+
+class CachedResponse(NamedTuple):
+    version: int
+    etag: str
+    body: bytes
+    media_type: Optional[str]
+    headers: Dict[str, str]
+
+
+class ResponseCache:
+    """LRU cache of response bodies keyed by request and database version.
+
+    An entry is only served while the database still reports the version it
+    was built at, so writes invalidate it without explicit bookkeeping.
+    Entries are evicted least recently used first once their bodies exceed
+    ``max_bytes`` in total. Bodies larger than the whole budget are not
+    cached.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, version: int) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.version != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Hashable, version: int, response: Response) -> CachedResponse:
+        body = bytes(response.body)
+        headers = {
+            name: value
+            for name, value in response.headers.items()
+            if name not in ("content-length", "content-type")
+        }
+        entry = CachedResponse(
+            version,
+            '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest(),
+            body,
+            response.media_type,
+            headers,
+        )
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old.body)
+            if len(body) <= self.max_bytes:
+                self._entries[key] = entry
+                self.size += len(body)
+                while self.size > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.size -= len(evicted.body)
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (
+        tag[2:] if tag.startswith("W/") else tag for tag in tags
+    )
+
+
+async def cached_response(
+    cache: ResponseCache,
+    request: Request,
+    version: int,
+    build: Callable[[], Awaitable[Response]],
+    vary: Hashable = None,
+) -> Response:
+    """Serve ``request`` from ``cache`` or from ``build()``, honouring ETags.
+
+    ``version`` is the version of the data the response is built from and
+    ``vary`` anything else the body depends on besides the URL. Only
+    ``200`` responses are cached. A matching ``If-None-Match`` gets an
+    empty ``304``.
+    """
+    key = (request.url.path, str(request.query_params), vary)
+    entry = cache.get(key, version)
+    if entry is None:
+        response = await build()
+        if response.status_code != 200:
+            return response
+        entry = cache.put(key, version, response)
+    headers = {**entry.headers, "ETag": entry.etag}
+    if _matches(request.headers.get("if-none-match", ""), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type=entry.media_type, headers=headers)
@@ -0,0 +1,179 @@
+"""Request timing middleware and the ``/metrics`` exposition."""
+
+from __future__ import annotations
+
+import os
+import time
+from typing import Any, Dict
+
+from src.api.cache import ResponseCache
+from src.db.aio import Storage
+from src.db.wal import log_dir
+from src.metrics import Exposition, Histograms
+
+STORAGE_GAUGES = {
+    "workers": "Storage worker threads.",
+    "queued": "Storage calls waiting for a worker.",
+    "running": "Storage calls running on a worker.",
+}
+DB_STATS = {
+    "cache_hits": "Reads answered from the in-memory rows.",
+    "cache_misses": "Reads that had to load the file.",
+    "commits": "Committed write batches.",
+    "commit_seconds": "Time spent committing SQLite transactions.",
+    "fsyncs": "Calls to fsync.",
+    "fsync_seconds": "Time spent in fsync.",
+    "replayed": "Mutation log records replayed on open.",
+    "bytes_read": "Bytes read by full loads.",
+    "rows_read": "Records parsed by full loads.",
+    "bytes_written": "Bytes written by commits.",
+    "rows_written": "Records written by commits.",
+    "parse_errors": "Lines skipped by full loads because they were not JSON objects.",
+}
+DB_TIMINGS = {
+    "read": "Time to load the whole database file.",
+    "write": "Time to commit a batch of writes.",
+}
+
+
+class RequestMetrics:
+    """ASGI middleware timing every HTTP request by method, route and status.
+
+    The route is the path template that matched, such as
+    ``/inventory/{item_id}``, so ids do not multiply the series; requests
+    that match no route are recorded under ``other``. The time runs until
+    the app returns, which for streamed responses includes sending the body.
+    """
+
+    def __init__(self, app: Any, latency: Histograms) -> None:
+        self.app = app
+        self.latency = latency
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_status(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "other")
+            self.latency((scope["method"], route, str(status))).observe(
+                time.perf_counter() - start
+            )
+
+
+def _file_bytes(db: Any) -> Dict[str, int]:
+    sizes = {}
+    try:
+        sizes["data"] = os.path.getsize(db.path)
+    except OSError:
+        pass
+    wal = log_dir(db.path)
+    if wal.is_dir():
+        sizes["log"] = sum(
+            entry.stat().st_size for entry in os.scandir(wal) if entry.is_file()
+        )
+    return sizes
+
+
+def render(
+    requests: Histograms,
+    storage: Storage,
+    cache: ResponseCache,
+    dbs: Dict[str, Any],
+) -> str:
+    """Return every metric in the Prometheus text format.
+
+    ``dbs`` maps a label, such as ``inventory``, to an open database. Each
+    entry of a database's ``stats`` becomes a ``db_<name>_total`` counter
+    and each of its ``timings`` a ``db_<name>_duration_seconds`` histogram,
+    so both backends are covered.
+    """
+
+    out = Exposition()
+    out.histogram(
+        "http_request_duration_seconds",
+        "Time to handle HTTP requests.",
+        (
+            ({"method": method, "route": route, "status": status}, histogram)
+            for (method, route, status), histogram in requests.items()
+        ),
+    )
+
+    stats = storage.stats()
+    out.histogram(
+        "storage_queue_wait_seconds",
+        "Time storage calls waited for a worker thread.",
+        [(None, storage.queue_wait)],
+    )
+    for name, help in STORAGE_GAUGES.items():
+        out.metric(f"storage_{name}", "gauge", help, [(None, stats[name])])
+    out.metric(
+        "storage_calls_total",
+        "counter",
+        "Storage calls answered from memory (inline) or sent to a worker.",
+        [
+            ({"path": "inline"}, stats["inline"]),
+            ({"path": "offloaded"}, stats["offloaded"]),
+        ],
+    )
+
+    out.metric(
+        "response_cache_hits_total",
+        "counter",
+        "Requests served from the response cache.",
+        [(None, cache.hits)],
+    )
+    out.metric(
+        "response_cache_misses_total",
+        "counter",
+        "Requests the response cache could not serve.",
+        [(None, cache.misses)],
+    )
+    out.metric(
+        "response_cache_bytes",
+        "gauge",
+        "Size of the cached response bodies.",
+        [(None, cache.size)],
+    )
+
+    counters: Dict[str, list] = {}
+    timings: Dict[str, list] = {}
+    for label, db in dbs.items():
+        for name, value in db.stats.items():
+            counters.setdefault(name, []).append(({"db": label}, value))
+        for name, histogram in getattr(db, "timings", {}).items():
+            timings.setdefault(name, []).append(({"db": label}, histogram))
+    for name, samples in counters.items():
+        out.metric(
+            f"db_{name}_total",
+            "counter",
+            DB_STATS.get(name, f"Database {name.replace('_', ' ')}."),
+            samples,
+        )
+    for name, series in timings.items():
+        out.histogram(
+            f"db_{name}_duration_seconds",
+            DB_TIMINGS.get(name, f"Database {name} time."),
+            series,
+        )
+    out.metric(
+        "db_file_bytes",
+        "gauge",
+        "Size of the database's data file and mutation log.",
+        (
+            ({"db": label, "file": kind}, size)
+            for label, db in dbs.items()
+            for kind, size in _file_bytes(db).items()
+        ),
+    )
+    return out.text()
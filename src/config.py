@@ -31,6 +31,46 @@ def get_product_database_url() -> str:
     return os.environ.get("PRODUCT_DATABASE_URL", str(default_path))
 
 
+def get_journal_mode() -> str:
+    """Return how JSONL files are written: ``append`` or ``rewrite``."""
+    return os.environ.get("JOURNAL_MODE", "append").lower()
+
+
+def get_fsync_policy() -> str:
+    """Return when writes are fsynced: ``always``, ``batched`` or ``never``."""
+    return os.environ.get("FSYNC_POLICY", "always").lower()
+
+
+def get_offset_index() -> bool:
+    """Return whether product lookups use the persisted byte-offset index."""
+    return os.environ.get("OFFSET_INDEX", "1").lower() not in {"0", "false", "no"}
+
+
+def get_response_cache_bytes() -> int:
+    """Return the memory budget for cached API responses, in bytes."""
+    return int(os.environ.get("RESPONSE_CACHE_BYTES", 32 * 1024 * 1024))
+
+
+def get_storage_workers() -> int:
+    """Return the number of threads that run blocking storage calls."""
+    return int(os.environ.get("STORAGE_WORKERS", 4))
+
+
+def get_storage_backend() -> str:
+    """Return where rows are stored: ``jsonl`` files or ``sqlite``."""
+    return os.environ.get("STORAGE_BACKEND", "jsonl").lower()
+
+
+def get_multi_process() -> bool:
+    """Return whether data files may be shared by several worker processes."""
+    return os.environ.get("MULTI_PROCESS", "0").lower() in {"1", "true", "yes"}
+
+
+def get_mutation_log() -> bool:
+    """Return whether JSONL databases keep a write-ahead mutation log."""
+    return os.environ.get("MUTATION_LOG", "1").lower() not in {"0", "false", "no"}
+
+
 def get_database_url() -> str:
     """Backward compatibility shim for inventory DB."""
     return get_inventory_database_url()
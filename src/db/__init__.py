@@ -2,43 +2,1116 @@
 
 from __future__ import annotations
 
+import itertools
 import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
 
 from src import config
+from src.db import views
+from src.db.index import (
+    IndexSpec,
+    SortedIndex,
+    build_index,
+    field,
+    item_ids,
+    unit_expirations,
+    unit_uuids,
+    values,
+)
+from src.db.locking import SharedFile
+from src.db.offsets import CHECK_BYTES, Location, OffsetIndex
+from src.db.rollups import Rollups
+from src.db.search import TextIndex
+from src.db.wal import MutationLog, change, replay
+from src.db.writer import Batch, GroupCommitWriter
+from src.metrics import Histogram
+
+# Marker written on tombstone records in append-only files.
+TOMBSTONE = "_deleted"
+
+FSYNC_POLICIES = ("always", "batched", "never")
+
+
+Signature = Tuple[int, int, int]
+T = TypeVar("T")
+
+# Returned by :meth:`JsonlDB.if_cached` when a call needs the disk.
+MISS = object()
+
+# Shared by all databases so a version number is never reused in-process.
+_VERSIONS = itertools.count(1)
 
 
 class JsonlDB:
-    """Lightweight JSON Lines storage."""
+    """Lightweight JSON Lines storage, described in ``docs/storage.md``."""
 
-    def __init__(self, path: Path) -> None:
+    def __init__(
+        self,
+        path: Path,
+        key: Optional[str] = None,
+        append_only: bool = False,
+        compact_min_dead: int = 1000,
+        compact_ratio: float = 0.5,
+        commit_window: float = 0.002,
+        fsync: str = "always",
+        fsync_interval: float = 1.0,
+        indexes: Optional[Dict[str, IndexSpec]] = None,
+        lazy: bool = False,
+        shared: bool = False,
+        log: bool = False,
+        checkpoint_records: int = 1000,
+    ) -> None:
         self.path = path
+        self.key = key
+        self.append_only = append_only and key is not None
+        self.compact_min_dead = compact_min_dead
+        self.compact_ratio = compact_ratio
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.checkpoint_records = checkpoint_records
+        self._offsets: Optional[OffsetIndex] = None
+        if lazy and key is not None:
+            self._offsets = OffsetIndex(path, key, TOMBSTONE, indexes)
+            indexes = None
+        self.indexes = {
+            name: build_index(spec) for name, spec in (indexes or {}).items()
+        }
+        self.stats: Dict[str, float] = {
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "commits": 0,
+            "fsyncs": 0,
+            "fsync_seconds": 0.0,
+            "replayed": 0,
+            "bytes_read": 0,
+            "rows_read": 0,
+            "bytes_written": 0,
+            "rows_written": 0,
+            "parse_errors": 0,
+        }
+        self.timings = {"read": Histogram(), "write": Histogram()}
+        self._lock = threading.RLock()
+        self._live: Optional[Dict[Any, Dict[str, Any]]] = None
+        self._loose: List[Dict[str, Any]] = []
+        # Largest live key, or MISS until max_key next computes it.
+        self._max: Any = MISS
+        # Where each live keyed row was last written, when not lazy.
+        self._spans: Optional[Dict[Any, Location]] = None
+        self._records = 0
+        self._bad_lines = 0
+        # Where the loaded part of the file ends and the bytes just before
+        # that, so a file that has only grown can be extended, not reloaded.
+        self._end: Optional[int] = None
+        self._tail = b""
+        self._sig: Optional[Signature] = None
+        self._compactor: Optional[threading.Thread] = None
+        self._pending: List[Dict[str, Any]] = []
+        self._undo: List[Tuple[Any, Any, Any]] = []
+        self._changes: List[Dict[str, Any]] = []
+        self._rewrite = False
+        self._last_sync = 0.0
+        self._sync_timer: Optional[threading.Timer] = None
+        self._version = 0
+        self._version_sig: Optional[Any] = None
+        self._generation: Optional[int] = None
+        self._writer = GroupCommitWriter(
+            self._commit_batch, window=commit_window, name=f"writer:{path.name}"
+        )
         self.path.parent.mkdir(parents=True, exist_ok=True)
         if not self.path.exists():
             self.path.touch()
+        self._shared = SharedFile(path) if shared else None
+        self._log = MutationLog(path) if log and key is not None else None
+        if self._log is not None:
+            self._recover()
+
+    @property
+    def version(self) -> int:
+        """Return a number that changes whenever the file's contents do.
+
+        Committed writes, compactions and changes made by other processes
+        all yield a new version. Only a ``stat`` (or, for shared databases,
+        a read of the generation counter) is needed, and the lock is not
+        taken, so this is cheap enough to check on every request.
+        """
+
+        if self._shared is not None:
+            sig: Any = self._shared.generation
+        else:
+            sig = self._signature()
+        if sig != self._version_sig:
+            self._version_sig = sig
+            self._version = next(_VERSIONS)
+        return self._version
+
+    def _signature(self) -> Optional[Signature]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def _stale(self) -> bool:
+        """Return whether the file may have changed since it was loaded."""
+
+        if self._shared is not None:
+            return self._shared.generation != self._generation
+        return self._signature() != self._sig
+
+    def _reading(self) -> ContextManager[None]:
+        return self._shared.shared() if self._shared else nullcontext()
+
+    def _writing(self) -> ContextManager[None]:
+        return self._shared.exclusive() if self._shared else nullcontext()
+
+    def _bump(self) -> None:
+        """Tell other processes the file changed. Caller holds :meth:`_writing`."""
+
+        if self._shared is not None:
+            fresh = self._generation == self._shared.generation
+            generation = self._shared.bump()
+            if fresh:
+                self._generation = generation
+
+    def _parse(
+        self, data: bytes, start: int = 0
+    ) -> Tuple[List[Dict[str, Any]], List[Location], int]:
+        """Decode JSONL ``data`` into dict records and count unusable lines.
+
+        Also returns the ``(offset, length)`` of each record's line, with
+        offsets counted from ``start``.
+        """
+
+        records: List[Dict[str, Any]] = []
+        locations: List[Location] = []
+        bad = 0
+        pos = start
+        for line in data.splitlines(keepends=True):
+            loc = (pos, len(line))
+            pos += len(line)
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+            except json.JSONDecodeError:
+                bad += 1
+                continue
+            if isinstance(obj, dict):
+                records.append(obj)
+                locations.append(loc)
+            else:
+                bad += 1
+        return records, locations, bad
+
+    def _collapse(
+        self, records: List[Dict[str, Any]]
+    ) -> Tuple[Dict[Any, Dict[str, Any]], List[Dict[str, Any]]]:
+        """Fold keyed records into the rows that are still live."""
+
+        if self.key is None:
+            return {}, records
+        live: Dict[Any, Dict[str, Any]] = {}
+        loose: List[Dict[str, Any]] = []
+        for obj in records:
+            if self.key not in obj:
+                loose.append(obj)
+            elif obj.get(TOMBSTONE):
+                live.pop(obj[self.key], None)
+            else:
+                live[obj[self.key]] = obj
+        return live, loose
+
+    def _track(self, records: List[Dict[str, Any]], locations: List[Location]) -> None:
+        """Note where keyed ``records`` landed, as :meth:`_collapse` folds them."""
+
+        if self._spans is None:
+            return
+        for record, loc in zip(records, locations):
+            if self.key not in record:
+                continue
+            if record.get(TOMBSTONE):
+                self._spans.pop(record[self.key], None)
+            else:
+                self._spans[record[self.key]] = loc
+
+    def _load(self) -> Dict[Any, Dict[str, Any]]:
+        """Bring the cache up to date with the file. Caller holds the lock."""
+
+        if self._live is not None and not self._stale():
+            self.stats["cache_hits"] += 1
+            return self._live
+        self.stats["cache_misses"] += 1
+        start = time.perf_counter()
+        with self._reading():
+            if self._shared is not None:
+                self._generation = self._shared.generation
+            sig = self._signature()
+            grown = self._read_growth(sig)
+            if grown is None:
+                data = self.path.read_bytes() if sig is not None else b""
+        if grown is not None:
+            self._extend(grown, sig)
+            self.timings["read"].observe(time.perf_counter() - start)
+            return self._live
+        records, locations, self._bad_lines = self._parse(data)
+        self._live, self._loose = self._collapse(records)
+        self._max = MISS
+        self._spans = self._new_spans()
+        self._track(records, locations)
+        self._records = len(records)
+        self._sig = sig
+        self._end = len(data) if data.endswith(b"\n") or not data else None
+        self._tail = data[-CHECK_BYTES:]
+        if self._offsets is not None:
+            for record in self._offsets.staged():
+                self._apply(record)
+        self._reindex()
+        self._synced()
+        self.stats["bytes_read"] += len(data)
+        self.stats["rows_read"] += len(records)
+        self.stats["parse_errors"] += self._bad_lines
+        self.timings["read"].observe(time.perf_counter() - start)
+        return self._live
+
+    def _read_growth(self, sig: Optional[Signature]) -> Optional[bytes]:
+        """Return the bytes appended since the load, if that is all that changed.
+
+        ``None`` means the file must be reloaded: it was replaced, shrank,
+        no longer holds the bytes it ended with, or ends in a partial line.
+        """
+
+        if (
+            self._live is None
+            or self._offsets is not None
+            or self._end is None
+            or sig is None
+            or self._sig is None
+            or sig[0] != self._sig[0]
+            or sig[1] < self._end
+        ):
+            return None
+        with self.path.open("rb") as f:
+            f.seek(self._end - len(self._tail))
+            data = f.read(sig[1] - self._end + len(self._tail))
+        if not data.startswith(self._tail):
+            return None
+        grown = data[len(self._tail) :]
+        return grown if not grown or grown.endswith(b"\n") else None
+
+    def _extend(self, data: bytes, sig: Signature) -> None:
+        """Fold records appended by another writer into the cache."""
+
+        records, locations, bad = self._parse(data, self._end)
+        for record in records:
+            if self.key is None or self.key not in record:
+                self._loose.append(record)
+            else:
+                self._apply(record)
+        self._track(records, locations)
+        self._records += len(records)
+        self._bad_lines += bad
+        self._end += len(data)
+        self._tail = (self._tail + data)[-CHECK_BYTES:]
+        self._sig = sig
+        self._synced()
+        self.stats["bytes_read"] += len(data)
+        self.stats["rows_read"] += len(records)
+        self.stats["parse_errors"] += bad
+
+    @staticmethod
+    def _locate(lines: List[bytes], start: int = 0) -> List[Location]:
+        locations = []
+        for line in lines:
+            locations.append((start, len(line)))
+            start += len(line)
+        return locations
+
+    def _new_spans(self) -> Optional[Dict[Any, Location]]:
+        # Lazy databases stream through their offset index instead.
+        return {} if self.key is not None and self._offsets is None else None
+
+    def _synced(self) -> None:
+        for index in self.indexes.values():
+            synced = getattr(index, "synced", None)
+            if synced is not None:
+                synced(self._sig)
+
+    def _reindex(self) -> None:
+        for index in self.indexes.values():
+            index.clear()
+            for key, row in self._live.items():
+                index.add(key, row)
+
+    def _apply(self, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Fold one keyed record into the cache and return the row it replaced."""
+
+        key = record[self.key]
+        old = self._live.get(key)
+        if old is not None:
+            for index in self.indexes.values():
+                index.remove(key, old)
+        if record.get(TOMBSTONE):
+            self._live.pop(key, None)
+            if key == self._max:
+                self._max = MISS
+        else:
+            self._live[key] = record
+            if self._max is not MISS and (self._max is None or key > self._max):
+                self._max = key
+            for index in self.indexes.values():
+                index.add(key, record)
+        return old
 
     def read_all(self) -> List[Dict[str, Any]]:
-        if not self.path.exists():
-            return []
-        rows: List[Dict[str, Any]] = []
-        with self.path.open("r", encoding="utf-8") as f:
+        with self._lock:
+            live = self._load()
+            return list(live.values()) + self._loose
+
+    def iter_rows(self) -> Iterator[Dict[str, Any]]:
+        """Yield live rows one at a time.
+
+        A lazy database that has not loaded its rows decodes them one by
+        one from the offset index instead of building the full cache.
+        """
+
+        with self._lock:
+            if self._offsets is None or self._live is not None:
+                rows = self.read_all()
+                locations = None
+            else:
+                self._offsets.refresh()
+                locations = list(self._offsets.offsets.values())
+        if locations is None:
+            yield from rows
+            return
+        for loc in locations:
+            with self._lock:
+                row = self._offsets.decode(loc)
+            yield row
+
+    def iter_lines(self, chunk_rows: int = 256) -> Iterator[bytes]:
+        """Yield live rows as raw NDJSON bytes without decoding them.
+
+        Lines are copied straight from the file, through the offset index
+        for lazy databases. When the file holds superseded records, only the
+        ranges last written for each live row are read. Files with lines
+        that are not JSON objects have their live rows re-serialized
+        instead. Lines are grouped ``chunk_rows`` at a time to keep
+        per-chunk overhead low.
+        """
+
+        locations = spans = end = rows = f = None
+        with self._lock:
+            if self._offsets is not None:
+                self._offsets.refresh()
+                locations = list(self._offsets.offsets.values())
+            else:
+                self._load()
+                usable = self._spans is not None and not self._loose
+                if (
+                    self._sig
+                    and not self._bad_lines
+                    and (not self.dead_records or usable)
+                ):
+                    # Opened under the lock, so the inode, size and spans
+                    # all describe the file this handle reads.
+                    with self._reading():
+                        f = self.path.open("rb")
+                    if os.fstat(f.fileno()).st_ino != self._sig[0]:
+                        f.close()
+                        f = None
+                    elif self.dead_records:
+                        spans = list(self._spans.values())
+                    else:
+                        end = self._sig[1]
+                if f is None:
+                    rows = self.read_all()
+        if locations is not None:
+            for start in range(0, len(locations), chunk_rows):
+                with self._lock:
+                    chunk = b"".join(
+                        self._offsets.raw(loc)
+                        for loc in locations[start : start + chunk_rows]
+                    )
+                yield chunk
+            return
+        if rows is not None:
+            yield from self._dump_lines(rows, chunk_rows)
+            return
+        if spans is not None:
+            with f:
+                for start in range(0, len(spans), chunk_rows):
+                    yield b"".join(
+                        self._read_line(f, loc)
+                        for loc in spans[start : start + chunk_rows]
+                    )
+            return
+        buffer: List[bytes] = []
+        with f:
             for line in f:
-                line = line.strip()
-                if not line:
+                end -= len(line)
+                if end < 0 or not line.endswith(b"\n"):
+                    break
+                if line.strip():
+                    buffer.append(line)
+                if len(buffer) >= chunk_rows:
+                    yield b"".join(buffer)
+                    buffer = []
+        if buffer:
+            yield b"".join(buffer)
+
+    @staticmethod
+    def _read_line(f: BinaryIO, loc: Location) -> bytes:
+        offset, length = loc
+        f.seek(offset)
+        line = f.read(length)
+        # The last line of a file written by hand may lack its newline.
+        return line if line.endswith(b"\n") else line + b"\n"
+
+    @staticmethod
+    def _dump_lines(rows: List[Dict[str, Any]], chunk_rows: int) -> Iterator[bytes]:
+        for start in range(0, len(rows), chunk_rows):
+            yield "".join(
+                views.dumps(row) + "\n" for row in rows[start : start + chunk_rows]
+            ).encode("utf-8")
+
+    def write_all(self, rows: List[Dict[str, Any]], log: bool = True) -> None:
+        """Replace the whole file with ``rows``.
+
+        With ``log`` false the mutation log only records that the file was
+        rewritten, not the rows, which keeps bulk imports from writing the
+        data twice; recovering to a later time then needs a backup taken
+        after the rewrite.
+        """
+
+        if not self._writer.on_thread():
+            self.mutate(lambda: self.write_all(rows, log))
+            return
+        self._undo.append((None, (self._live, self._loose), None))
+        if self._log is not None:
+            if log:
+                self._changes.append({"op": "replace", "rows": list(rows)})
+            else:
+                self._changes.append({"op": "rewrite"})
+        self._live, self._loose = self._collapse(list(rows))
+        self._max = MISS
+        self._reindex()
+        self._rewrite = True
+
+    def get(self, key_value: Any) -> Optional[Dict[str, Any]]:
+        """Return the row whose key equals ``key_value``."""
+
+        self._require_key()
+        with self._lock:
+            if self._offsets is not None:
+                self._offsets.refresh()
+                return self._offsets.get(key_value)
+            return self._load().get(key_value)
+
+    def max_key(self) -> Any:
+        """Return the largest key, or ``None`` when there are no rows.
+
+        Writes keep it current, so the keys are only scanned again after a
+        reload or once the row holding the largest key is deleted.
+        """
+
+        self._require_key()
+        with self._lock:
+            if self._offsets is not None:
+                self._offsets.refresh()
+                return max(self._offsets.offsets, default=None)
+            live = self._load()
+            if self._max is MISS:
+                self._max = max(live, default=None)
+            return self._max
+
+    def lookup(self, index: str, value: Any) -> Optional[Tuple[Dict[str, Any], Any]]:
+        """Return ``(row, position)`` for the first row indexed under ``value``."""
+
+        with self._lock:
+            if self._offsets is not None:
+                self._offsets.refresh()
+                return self._offsets.find(index, value)
+            live = self._load()
+            hit = self.indexes[index].find(value)
+            if hit is None:
+                return None
+            key, pos = hit
+            return live[key], pos
+
+    def lookup_all(self, index: str, value: Any) -> List[Tuple[Dict[str, Any], Any]]:
+        """Return ``(row, position)`` for every row indexed under ``value``."""
+
+        with self._lock:
+            if self._offsets is not None:
+                self._offsets.refresh()
+                return self._offsets.find_all(index, value)
+            live = self._load()
+            return [
+                (live[key], pos) for key, pos in self.indexes[index].find_all(value)
+            ]
+
+    def lookup_between(
+        self,
+        index: str,
+        low: Any = None,
+        high: Any = None,
+        limit: Optional[int] = None,
+    ) -> List[Tuple[Dict[str, Any], Any]]:
+        """Return ``(row, position)`` for values in ``[low, high)`` of a sorted index.
+
+        Results come in value order; a row appears once per matching value.
+        At most ``limit`` results are returned when it is given.
+        """
+
+        with self._lock:
+            if self._offsets is not None:
+                self._offsets.refresh()
+                return self._offsets.find_between(index, low, high, limit)
+            live = self._load()
+            return [
+                (live[key], pos)
+                for key, pos in self.indexes[index].between(low, high, limit)
+            ]
+
+    def if_cached(self, fn: Callable[[], T]) -> Any:
+        """Call ``fn`` only if it can be answered from memory right away.
+
+        Returns :data:`MISS` without calling ``fn`` when the rows are not
+        cached (lazy databases never cache them for lookups), the file has
+        changed since they were loaded, or a writer holds the lock. This
+        lets callers on an event loop serve hits inline and send the rest
+        to a thread.
+        """
+
+        if self._offsets is not None or not self._lock.acquire(blocking=False):
+            return MISS
+        try:
+            if self._live is None or self._stale():
+                return MISS
+            return fn()
+        finally:
+            self._lock.release()
+
+    def read_index(self, name: str, read: Callable[[Any], T]) -> T:
+        """Call ``read`` with index ``name`` once it reflects the file.
+
+        When the rows are not cached but the index carries a ``signature``
+        equal to the file's, as persisted indexes do after a restart, it is
+        read as is without loading the file. Lazy databases read the index
+        kept by their offset index.
+        """
+
+        with self._lock:
+            if self._offsets is not None:
+                self._offsets.refresh()
+                return read(self._offsets.index(name))
+            index = self.indexes[name]
+            sig = self._signature()
+            cached = self._live is not None and not self._stale()
+            if not cached and getattr(index, "signature", None) != sig:
+                self._load()
+            return read(index)
+
+    def _require_key(self) -> str:
+        if self.key is None:
+            raise ValueError("Keyed access requires a key field")
+        return self.key
+
+    def mutate(self, fn: Callable[[], T]) -> T:
+        """Run ``fn`` on the writer thread and return its result.
+
+        All writes to a database are serialized through one writer thread,
+        so ``fn`` can read, decide and :meth:`put` without racing other
+        writers. Mutations queued within ``commit_window`` seconds of each
+        other are committed together with one write and one fsync; the call
+        returns once its batch is durable. If ``fn`` raises, its changes are
+        rolled back and the exception propagates to the caller.
+        """
+
+        if self._writer.on_thread():
+            return fn()
+        return self._writer.submit(fn).result()
+
+    def _commit_batch(self, batch: Batch) -> None:
+        done = []
+        with self._lock, self._writing():
+            self._prepare()
+            for fn, future in batch:
+                if not future.set_running_or_notify_cancel():
                     continue
+                mark = len(self._undo)
                 try:
-                    obj = json.loads(line)
-                except json.JSONDecodeError:
+                    result = fn()
+                except BaseException as exc:
+                    self._rollback(mark)
+                    future.set_exception(exc)
+                else:
+                    done.append((future, result))
+            try:
+                self._flush()
+            except BaseException as exc:
+                self._live = None
+                if self._offsets is not None:
+                    self._offsets.discard()
+                for future, _ in done:
+                    future.set_exception(exc)
+                return
+            finally:
+                self._pending = []
+                self._undo = []
+                self._changes = []
+                self._rewrite = False
+        for future, result in done:
+            future.set_result(result)
+        self._maybe_compact()
+
+    def _prepare(self) -> None:
+        """Make sure a batch starts from the current file contents."""
+
+        if self._offsets is None:
+            self._load()
+            return
+        self._offsets.refresh()
+        if self._live is not None and self._stale():
+            self._live = None
+
+    def _rollback(self, mark: int) -> None:
+        while len(self._undo) > mark:
+            key, old, token = self._undo.pop()
+            if self._log is not None:
+                self._changes.pop()
+            if key is None:
+                self._live, self._loose = old
+                self._max = MISS
+                self._reindex()
+                continue
+            if token is not None:
+                self._offsets.unstage(token)
+                self._live = None
+            elif old is None:
+                self._apply({self.key: key, TOMBSTONE: True})
+            else:
+                self._apply(old)
+            if self.append_only:
+                self._pending.pop()
+
+    def _sync(self, fd: int, force: bool = False) -> None:
+        """fsync ``fd`` according to the configured policy."""
+
+        if self.fsync == "never":
+            return
+        if self.fsync == "batched" and not force:
+            wait = self._last_sync + self.fsync_interval - time.monotonic()
+            if wait > 0:
+                if self._sync_timer is None:
+                    self._sync_timer = threading.Timer(wait, self._deferred_sync)
+                    self._sync_timer.daemon = True
+                    self._sync_timer.start()
+                return
+        start = time.perf_counter()
+        os.fsync(fd)
+        self._last_sync = time.monotonic()
+        self.stats["fsyncs"] += 1
+        self.stats["fsync_seconds"] += time.perf_counter() - start
+
+    def _sync_path(self, path: Path) -> None:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            self._sync(fd, force=True)
+        finally:
+            os.close(fd)
+
+    def _deferred_sync(self) -> None:
+        with self._lock:
+            self._sync_timer = None
+            path = self._log.current if self._log is not None else self.path
+            if path is not None:
+                self._sync_path(path)
+
+    def _replace(self, tmp: Path) -> None:
+        """Atomically move ``tmp`` over the data file."""
+
+        os.replace(tmp, self.path)
+        if self.fsync != "never":
+            fd = os.open(self.path.parent, os.O_RDONLY)
+            try:
+                self._sync(fd, force=True)
+            finally:
+                os.close(fd)
+
+    def _write_atomic(self, payload: bytes) -> None:
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with tmp.open("wb") as f:
+            f.write(payload)
+            f.flush()
+            self._sync(f.fileno(), force=True)
+        self._replace(tmp)
+
+    @contextmanager
+    def _logged(self, end: Optional[int] = None) -> Iterator[None]:
+        """Log the batch's changes ahead of the data file write in the block.
+
+        If the write fails the records are cut off again, so a replay never
+        applies a batch its callers were told had failed.
+        """
+
+        if self._log is None or not self._changes:
+            yield
+            return
+        mark = self._log.append(self._changes, self._sync, end)
+        try:
+            yield
+        except BaseException:
+            self._log.truncate(mark)
+            raise
+
+    def _recover(self) -> None:
+        """Replay logged changes that the data file may not hold.
+
+        Appended batches are compared byte for byte with where the log says
+        they landed; if all of them are there the file is just synced.
+        Otherwise the rows are rebuilt from the file and the log and written
+        out as a new checkpoint.
+        """
+
+        with self._writing():
+            self._log.refresh()
+            pending = self._log.pending()
+            rewrites = [i for i, r in enumerate(pending) if r["op"] == "rewrite"]
+            if rewrites:
+                # The file was replaced, and synced, before the marker was
+                # logged, so it holds every change up to there.
+                last = pending[rewrites[-1]]["seq"]
+                pending = pending[rewrites[-1] + 1 :]
+                if not pending:
+                    self._log.checkpoint(last)
+                    return
+            if not pending:
+                return
+            if self.append_only and self._holds(pending):
+                self._sync_path(self.path)
+            else:
+                live, loose = self._collapse(self._parse(self.path.read_bytes())[0])
+                replay(live, pending, self.key)
+                rows = list(live.values()) + loose
+                self._write_atomic(
+                    b"".join((views.dumps(r) + "\n").encode("utf-8") for r in rows)
+                )
+                self._bump()
+                self.stats["replayed"] += len(pending)
+            self._log.checkpoint(pending[-1]["seq"])
+
+    def _rewrite_unlogged(self, payload: bytes) -> None:
+        """Replace the file and log a ``rewrite`` marker instead of its rows.
+
+        Everything logged before is checkpointed first, so a crash before
+        the marker is written leaves nothing to replay over the new file.
+        """
+
+        self._sync_path(self.path)
+        self._log.checkpoint()
+        self._write_atomic(payload)
+        self._log.append([{"op": "rewrite"}], self._sync)
+        self._log.checkpoint()
+
+    def _holds(self, records: List[Dict[str, Any]]) -> bool:
+        """Return whether logged ``records`` were all appended to the file."""
+
+        batch: List[Dict[str, Any]] = []
+        with self.path.open("rb") as f:
+            for record in records:
+                if record["op"] == "replace":
+                    return False
+                if record["op"] == "delete":
+                    batch.append({self.key: record["key"], TOMBSTONE: True})
+                else:
+                    batch.append(record["row"])
+                if "end" not in record:
                     continue
-                if isinstance(obj, dict):
-                    rows.append(obj)
-        return rows
+                rows = {row[self.key]: row for row in batch}.values()
+                data = "".join(views.dumps(row) + "\n" for row in rows).encode()
+                f.seek(max(record["end"] - len(data), 0))
+                if f.read(len(data)) != data:
+                    return False
+                batch = []
+        return not batch
+
+    def _flush(self) -> None:
+        began = time.perf_counter()
+        if self._rewrite:
+            live = self._live if self._live is not None else self._load()
+            rows = list(live.values()) + self._loose
+            lines = [(views.dumps(r) + "\n").encode("utf-8") for r in rows]
+            payload = b"".join(lines)
+            if any(c["op"] == "rewrite" for c in self._changes):
+                self._rewrite_unlogged(payload)
+            else:
+                with self._logged():
+                    self._write_atomic(payload)
+                if self._log is not None:
+                    self._log.checkpoint()
+            self._records = len(rows)
+            self._end = len(payload)
+            self._tail = payload[-CHECK_BYTES:]
+            self._spans = self._new_spans()
+            self._track(rows, self._locate(lines))
+            written = (len(payload), len(rows))
+            if self._offsets is not None:
+                self._offsets.replaced(rows, [len(line) for line in lines])
+        elif self._pending:
+            # Only the last record per key in a batch matters to readers.
+            records = list({r[self.key]: r for r in self._pending}.values())
+            lines = [(views.dumps(r) + "\n").encode("utf-8") for r in records]
+            data = b"".join(lines)
+            with self.path.open("ab") as f:
+                start = f.tell()
+                if start > 0:
+                    with self.path.open("rb") as tail:
+                        tail.seek(-1, os.SEEK_END)
+                        if tail.read(1) != b"\n":
+                            data = b"\n" + data
+                            start += 1
+                with self._logged(end=start + sum(map(len, lines))):
+                    f.write(data)
+                    f.flush()
+                if self._log is None:
+                    self._sync(f.fileno())
+                elif (
+                    self._log.last_seq - self._log.checkpointed
+                    >= self.checkpoint_records
+                ):
+                    self._sync(f.fileno(), force=True)
+                    self._log.checkpoint()
+            self._records += len(records)
+            if self._end is not None and self._end + len(data) == start + sum(
+                map(len, lines)
+            ):
+                self._end += len(data)
+                self._tail = (self._tail + data)[-CHECK_BYTES:]
+            else:
+                self._end = None
+            self._track(records, self._locate(lines, start))
+            if self._offsets is not None:
+                self._offsets.committed(records, [len(line) for line in lines], start)
+            written = (len(data), len(records))
+        else:
+            return
+        self._sig = self._signature()
+        self._bump()
+        self._synced()
+        self.stats["commits"] += 1
+        self.stats["bytes_written"] += written[0]
+        self.stats["rows_written"] += written[1]
+        self.timings["write"].observe(time.perf_counter() - began)
+
+    def _stage(self, record: Dict[str, Any], op: Optional[str] = None) -> None:
+        if not self._writer.on_thread():
+            self.mutate(lambda: self._stage(record, op))
+            return
+        key = record[self.key]
+        if self._offsets is not None:
+            if self._log is not None and op is None:
+                op = "update" if self._offsets.get(key) is not None else "create"
+            token = self._offsets.stage(record)
+            if self._live is not None:
+                self._apply(record)
+            self._undo.append((key, None, token))
+        else:
+            self._load()
+            old = self._apply(record)
+            self._undo.append((key, old, None))
+            if op is None:
+                op = "update" if old is not None else "create"
+        if self._log is not None:
+            op = "delete" if record.get(TOMBSTONE) else op
+            self._changes.append(change(record, self.key, op))
+        if self.append_only:
+            self._pending.append(record)
+        else:
+            self._rewrite = True
+
+    def put(self, row: Dict[str, Any], op: Optional[str] = None) -> None:
+        """Insert ``row`` or replace the row that has the same key.
+
+        ``op`` labels the change in the mutation log, such as ``consume``;
+        by default it is ``create`` or ``update``.
+        """
+
+        self._require_key()
+        self._stage(row, op)
+
+    def delete(self, key_value: Any) -> None:
+        """Remove the row identified by ``key_value``."""
+
+        key = self._require_key()
+        self._stage({key: key_value, TOMBSTONE: True})
+
+    @property
+    def dead_records(self) -> int:
+        """Number of superseded records waiting for compaction."""
+
+        if self._offsets is not None:
+            return max(self._offsets.records - len(self._offsets.offsets), 0)
+        if self._live is None:
+            return 0
+        return max(self._records - len(self._live) - len(self._loose), 0)
+
+    def _maybe_compact(self) -> None:
+        dead = self.dead_records
+        records = self._offsets.records if self._offsets else self._records
+        if dead < self.compact_min_dead or dead < records * self.compact_ratio:
+            return
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(target=self.compact, daemon=True)
+        self._compactor.start()
+
+    def compact(self) -> None:
+        """Rewrite the file so it holds only live rows.
+
+        Records appended while the snapshot is being written are copied over
+        before the new file replaces the old one, so writers are only blocked
+        for the final swap. If the file was replaced in the meantime, by a
+        rewrite or another compaction, it is left alone.
+        """
+
+        with self._lock, self._reading():
+            with self.path.open("rb") as src:
+                ino = os.fstat(src.fileno()).st_ino
+                data = src.read()
+        live, loose = self._collapse(self._parse(data)[0])
+        rows = list(live.values()) + loose
+        lines = [(views.dumps(row) + "\n").encode("utf-8") for row in rows]
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.compact")
+        with tmp.open("wb") as f:
+            f.writelines(lines)
+            with self._lock, self._writing():
+                with self.path.open("rb") as src:
+                    if os.fstat(src.fileno()).st_ino != ino:
+                        f.close()
+                        tmp.unlink()
+                        return
+                    src.seek(len(data))
+                    tail = src.read()
+                f.write(tail)
+                f.flush()
+                self._sync(f.fileno(), force=True)
+                current = not self._stale()
+                self._replace(tmp)
+                self._bump()
+                if self._log is not None:
+                    self._log.checkpoint()
+                if self._offsets is not None:
+                    self._offsets.invalidate()
+                if current:
+                    size = sum(map(len, lines))
+                    appended, locations, self._bad_lines = self._parse(tail, size)
+                    self._records = len(rows) + len(appended)
+                    self._spans = self._new_spans()
+                    self._end = None
+                    self._track(rows, self._locate(lines))
+                    self._track(appended, locations)
+                    self._sig = self._signature()
+                    self._synced()
+
+
+def storage_path(path: Path, backend: Optional[str] = None) -> Path:
+    """Return where ``backend`` keeps the data of NDJSON ``path``.
+
+    ``backend`` defaults to the configured ``STORAGE_BACKEND``.
+    """
+
+    if (backend or config.get_storage_backend()) == "sqlite":
+        return path.with_suffix(".sqlite3")
+    return path
+
+
+def _open(
+    path: Path,
+    backend: Optional[str],
+    key: str,
+    indexes: Dict[str, IndexSpec],
+    **options: Any,
+) -> Any:
+    backend = backend or config.get_storage_backend()
+    if backend == "sqlite":
+        # Imported here because src.db.sqlite builds on this module.
+        from src.db.sqlite import SqliteDB
+
+        return SqliteDB(
+            storage_path(path, backend),
+            key=key,
+            fsync=config.get_fsync_policy(),
+            indexes=indexes,
+        )
+    if backend != "jsonl":
+        raise ValueError(f"Unknown storage backend: {backend}")
+    return JsonlDB(
+        path,
+        key=key,
+        append_only=config.get_journal_mode() == "append",
+        fsync=config.get_fsync_policy(),
+        shared=config.get_multi_process(),
+        log=config.get_mutation_log(),
+        indexes=indexes,
+        **options,
+    )
+
+
+def open_inventory_db(path: Path, backend: Optional[str] = None) -> JsonlDB:
+    """Open ``path`` as an inventory database keyed on ``id``.
+
+    With the ``sqlite`` backend (``STORAGE_BACKEND=sqlite`` unless
+    ``backend`` says otherwise) a :class:`~src.db.sqlite.SqliteDB` next to
+    ``path`` is opened instead; see :func:`storage_path`.
+    """
+
+    return _open(
+        path,
+        backend,
+        "id",
+        {
+            "product_id": field("product_id"),
+            "upc": field("upc"),
+            "tag": values("tags"),
+            "unit_uuid": unit_uuids,
+            "expires": SortedIndex(unit_expirations),
+            "id": SortedIndex(item_ids),
+            "rollups": Rollups(storage_path(path, backend)),
+        },
+    )
+
+
+def open_product_db(path: Path, backend: Optional[str] = None) -> JsonlDB:
+    """Open ``path`` as a product database keyed on ``product_id``."""
 
-    def write_all(self, rows: List[Dict[str, Any]]) -> None:
-        with self.path.open("w", encoding="utf-8") as f:
-            for row in rows:
-                f.write(json.dumps(row) + "\n")
+    return _open(
+        path,
+        backend,
+        "product_id",
+        {"upc": field("upc"), "search": TextIndex()},
+        lazy=config.get_offset_index(),
+    )
 
 
 _inventory_db: Optional[JsonlDB] = None
@@ -49,9 +1122,9 @@ def get_inventory_db() -> JsonlDB:
     """Return the inventory JSONL database."""
 
     global _inventory_db
-    url = Path(config.get_inventory_database_url())
+    url = storage_path(Path(config.get_inventory_database_url()))
     if _inventory_db is None or _inventory_db.path != url:
-        _inventory_db = JsonlDB(url)
+        _inventory_db = open_inventory_db(url)
     return _inventory_db
 
 
@@ -59,9 +1132,9 @@ def get_product_db() -> JsonlDB:
     """Return the products JSONL database."""
 
     global _product_db
-    url = Path(config.get_product_database_url())
+    url = storage_path(Path(config.get_product_database_url()))
     if _product_db is None or _product_db.path != url:
-        _product_db = JsonlDB(url)
+        _product_db = open_product_db(url)
     return _product_db
 
 
@@ -0,0 +1,97 @@
+"""Asyncio access to JSONL databases through a bounded executor."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, TypeVar
+
+from src.db import MISS, JsonlDB
+from src.metrics import Histogram
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+class Storage:
+    """Run blocking storage calls without tying up the event loop.
+
+    :meth:`read` first tries to answer from a database's in-memory cache
+    directly on the event loop (see :meth:`JsonlDB.if_cached`); only calls
+    that need the disk, or that would wait for a writer, are handed to a
+    dedicated pool of ``workers`` threads. :meth:`run` always uses the
+    pool and is meant for writes and large scans. The number of calls
+    waiting for a worker is reported as :attr:`queued`, and how long each
+    one waited is recorded in :attr:`queue_wait`.
+    """
+
+    def __init__(self, workers: int) -> None:
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="storage")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.inline = 0
+        self.offloaded = 0
+        self.queue_wait = Histogram()
+
+    async def read(
+        self, db: JsonlDB, fn: Callable[..., T], *args: Any, **kwargs: Any
+    ) -> T:
+        """Call ``fn``, inline if ``db`` can answer it from memory."""
+
+        call = partial(fn, *args, **kwargs)
+        result = db.if_cached(call)
+        if result is not MISS:
+            with self._lock:
+                self.inline += 1
+            return result
+        return await self._submit(call)
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Call ``fn`` on a storage worker and wait for the result."""
+
+        return await self._submit(partial(fn, *args, **kwargs))
+
+    async def _submit(self, call: Callable[[], T]) -> T:
+        with self._lock:
+            self.queued += 1
+            self.offloaded += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self._call, call, time.perf_counter()
+        )
+
+    def _call(self, call: Callable[[], T], submitted: float) -> T:
+        self.queue_wait.observe(time.perf_counter() - submitted)
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return call()
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    async def iterate(self, it: Iterator[T]) -> AsyncIterator[T]:
+        """Drain a blocking iterator one item at a time on the workers."""
+
+        while True:
+            item = await self.run(next, it, _DONE)
+            if item is _DONE:
+                return
+            yield item
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queued": self.queued,
+                "running": self.running,
+                "inline": self.inline,
+                "offloaded": self.offloaded,
+            }
@@ -0,0 +1,205 @@
+"""Secondary indexes maintained alongside cached JSONL rows."""
+
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+# An extractor returns ``(value, position)`` pairs for a row. ``position``
+# locates the value inside the row (e.g. a unit index) and may be ``None``.
+Extractor = Callable[[Dict[str, Any]], Iterable[Tuple[Hashable, Any]]]
+
+
+def field(name: str) -> Extractor:
+    """Index rows on the string value of a top-level field."""
+
+    def extract(row: Dict[str, Any]) -> Iterable[Tuple[Hashable, Any]]:
+        value = row.get(name)
+        if value is None:
+            return ()
+        return ((str(value), None),)
+
+    return extract
+
+
+def values(name: str) -> Extractor:
+    """Index rows on each string in a list-valued field such as ``tags``."""
+
+    def extract(row: Dict[str, Any]) -> Iterable[Tuple[Hashable, Any]]:
+        return [(str(v), None) for v in row.get(name) or () if v is not None]
+
+    return extract
+
+
+def unit_uuids(row: Dict[str, Any]) -> Iterable[Tuple[Hashable, Any]]:
+    """Index inventory items on the UUID of each of their units."""
+
+    return [
+        (str(unit["uuid"]), pos)
+        for pos, unit in enumerate(row.get("units") or [])
+        if unit.get("uuid") is not None
+    ]
+
+
+def unit_expirations(row: Dict[str, Any]) -> Iterable[Tuple[Hashable, Any]]:
+    """Index inventory items on the expiration date of each of their units."""
+
+    return [
+        (str(unit["expiration_date"]), pos)
+        for pos, unit in enumerate(row.get("units") or [])
+        if unit.get("expiration_date")
+    ]
+
+
+def item_ids(row: Dict[str, Any]) -> Iterable[Tuple[Hashable, Any]]:
+    """Index inventory items on their integer id, so pages can seek by id."""
+
+    return ((row["id"], None),) if row.get("id") is not None else ()
+
+
+class HashIndex:
+    """Map extracted values to the keys of the rows that contain them."""
+
+    def __init__(self, extract: Extractor) -> None:
+        self.extract = extract
+        self._entries: Dict[Hashable, Dict[Any, Any]] = {}
+
+    def clear(self) -> None:
+        self._entries = {}
+
+    def add(self, key: Any, row: Dict[str, Any]) -> None:
+        for value, pos in self.extract(row):
+            self._entries.setdefault(value, {}).setdefault(key, pos)
+
+    def remove(self, key: Any, row: Dict[str, Any]) -> None:
+        for value, _ in self.extract(row):
+            bucket = self._entries.get(value)
+            if bucket is None:
+                continue
+            bucket.pop(key, None)
+            if not bucket:
+                del self._entries[value]
+
+    def entries(self) -> Iterator[Tuple[Hashable, Any, Any]]:
+        """Yield ``(value, key, position)`` for every indexed entry."""
+
+        for value, bucket in self._entries.items():
+            for key, pos in bucket.items():
+                yield value, key, pos
+
+    def restore(self, value: Hashable, key: Any, pos: Any) -> None:
+        self._entries.setdefault(value, {})[key] = pos
+
+    def find(self, value: Hashable) -> Optional[Tuple[Any, Any]]:
+        """Return ``(key, position)`` of the first row holding ``value``."""
+
+        bucket = self._entries.get(value)
+        if not bucket:
+            return None
+        return next(iter(bucket.items()))
+
+    def find_all(self, value: Hashable) -> List[Tuple[Any, Any]]:
+        return list(self._entries.get(value, {}).items())
+
+
+class SortedIndex:
+    """Keep extracted values in order so ranges of them can be queried.
+
+    Entries are ``(value, key, position)`` tuples in a sorted list. After
+    :meth:`clear` new entries are appended and sorted once on first use, so
+    rebuilding the whole index costs one sort rather than one insertion per
+    entry. Values of one index must be mutually comparable.
+    """
+
+    def __init__(self, extract: Extractor) -> None:
+        self.extract = extract
+        self._entries: List[Tuple[Hashable, Any, Any]] = []
+        self._building = False
+
+    def _ordered(self) -> List[Tuple[Hashable, Any, Any]]:
+        if self._building:
+            self._entries.sort()
+            self._building = False
+        return self._entries
+
+    def clear(self) -> None:
+        self._entries = []
+        self._building = True
+
+    def add(self, key: Any, row: Dict[str, Any]) -> None:
+        for value, pos in self.extract(row):
+            self.restore(value, key, pos)
+
+    def remove(self, key: Any, row: Dict[str, Any]) -> None:
+        entries = self._ordered()
+        for value, pos in self.extract(row):
+            i = bisect_left(entries, (value, key, pos))
+            if i < len(entries) and entries[i] == (value, key, pos):
+                del entries[i]
+
+    def entries(self) -> Iterator[Tuple[Hashable, Any, Any]]:
+        """Yield ``(value, key, position)`` for every entry in value order."""
+
+        return iter(list(self._ordered()))
+
+    def restore(self, value: Hashable, key: Any, pos: Any) -> None:
+        if self._building:
+            self._entries.append((value, key, pos))
+        else:
+            insort(self._entries, (value, key, pos))
+
+    def between(
+        self,
+        low: Optional[Hashable] = None,
+        high: Optional[Hashable] = None,
+        limit: Optional[int] = None,
+    ) -> List[Tuple[Any, Any]]:
+        """Return ``(key, position)`` for values in ``[low, high)``, in order.
+
+        Either bound may be ``None`` to leave that side open. ``limit``
+        caps the number of entries returned.
+        """
+
+        entries = self._ordered()
+        start = 0 if low is None else bisect_left(entries, (low,))
+        end = len(entries) if high is None else bisect_left(entries, (high,))
+        if limit is not None:
+            end = min(end, start + limit)
+        return [(key, pos) for _, key, pos in entries[start:end]]
+
+    def find(self, value: Hashable) -> Optional[Tuple[Any, Any]]:
+        hits = self.find_all(value)
+        return hits[0] if hits else None
+
+    def find_all(self, value: Hashable) -> List[Tuple[Any, Any]]:
+        entries = self._ordered()
+        hits = []
+        for i in range(bisect_left(entries, (value,)), len(entries)):
+            if entries[i][0] != value:
+                break
+            hits.append(entries[i][1:])
+        return hits
+
+
+# An index declaration is either an extractor, indexed by hash, or a ready
+# index object such as a :class:`SortedIndex`. Index objects provide
+# ``clear``, ``add`` and ``remove``; lookups use ``find``, ``find_all`` and
+# ``between`` when they have them.
+IndexSpec = Union[Extractor, HashIndex, SortedIndex, Any]
+
+
+def build_index(spec: IndexSpec) -> Any:
+    if callable(spec):
+        return HashIndex(spec)
+    return spec
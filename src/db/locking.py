@@ -0,0 +1,78 @@
+"""Cross-process locking and change notification for shared data files."""
+
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+from pathlib import Path
+from typing import ContextManager, Iterator
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore[assignment]
+
+_COUNTER = struct.Struct("<Q")
+
+
+class SharedFile:
+    """Coordinate processes that share one data file.
+
+    A small ``<name>.lock`` file next to the data file serves two purposes.
+    ``flock`` on it gives a reader/writer lock: readers take it shared so
+    they never see a half-appended record, writers take it exclusively.
+    Its first eight bytes hold a generation counter that writers bump after
+    every change. The counter is read through a shared ``mmap``, so
+    checking whether another process has written costs a memory read
+    rather than a system call.
+
+    Locks are per process and re-entrant: nested :meth:`shared` or
+    :meth:`exclusive` blocks inside an exclusive one keep the outer lock.
+    Threads within a process must serialize their use of one instance
+    themselves.
+    """
+
+    def __init__(self, path: Path) -> None:
+        if fcntl is None:
+            raise RuntimeError("Shared data files need fcntl, which is unavailable")
+        self.path = path.with_name(path.name + ".lock")
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size < _COUNTER.size:
+            os.ftruncate(self._fd, _COUNTER.size)
+        self._map = mmap.mmap(self._fd, _COUNTER.size)
+        self._mode = 0
+        self._depth = 0
+
+    @property
+    def generation(self) -> int:
+        return _COUNTER.unpack_from(self._map)[0]
+
+    def bump(self) -> int:
+        """Advance the generation. Call while holding :meth:`exclusive`."""
+
+        value = self.generation + 1
+        _COUNTER.pack_into(self._map, 0, value)
+        return value
+
+    @contextmanager
+    def _hold(self, mode: int) -> Iterator[None]:
+        if self._depth == 0:
+            fcntl.flock(self._fd, mode)
+            self._mode = mode
+        elif mode == fcntl.LOCK_EX and self._mode != fcntl.LOCK_EX:
+            raise RuntimeError("Cannot upgrade a shared lock to exclusive")
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def shared(self) -> ContextManager[None]:
+        return self._hold(fcntl.LOCK_SH)
+
+    def exclusive(self) -> ContextManager[None]:
+        return self._hold(fcntl.LOCK_EX)
@@ -0,0 +1,356 @@
+"""Persisted byte-offset index for lazily decoded JSONL rows."""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from src.db.index import IndexSpec, build_index
+
+INDEX_VERSION = 2
+# Bytes before the indexed end of file that must be unchanged for the
+# index to be extended instead of rebuilt.
+CHECK_BYTES = 4096
+
+Location = Tuple[int, int]
+
+
+class OffsetIndex:
+    """Map row keys to ``(offset, length)`` ranges in a JSONL file.
+
+    Only the rows that are asked for get decoded, straight out of an
+    ``mmap`` of the data file. The index is saved next to the file as
+    ``<name>.idx`` together with the file's inode, size and a checksum of
+    its last indexed bytes. When the file has only grown since then, just
+    the new tail is scanned; any other change triggers a full rebuild.
+
+    Indexes whose ``persist`` attribute is false, such as the search index,
+    are left out of the saved file to keep it small; after a restart they
+    are filled from the indexed rows the first time they are read.
+
+    Rows that have been staged by a writer but not yet committed are kept
+    in an overlay so readers in the same batch see them.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        key: str,
+        tombstone: str,
+        extractors: Optional[Dict[str, IndexSpec]] = None,
+        save_every: int = 1 << 20,
+    ) -> None:
+        self.path = path
+        self.index_path = path.with_name(path.name + ".idx")
+        self.key = key
+        self.tombstone = tombstone
+        self.extractors = dict(extractors or {})
+        self.save_every = save_every
+        self.indexes = {name: build_index(ex) for name, ex in self.extractors.items()}
+        self.offsets: Dict[Any, Location] = {}
+        self.records = 0
+        self.size = 0
+        self.ino: Optional[int] = None
+        self.mtime_ns: Optional[int] = None
+        self.rebuilds = 0
+        self._saved_size = 0
+        self._checksum = 0
+        self._overlay: Dict[Any, Optional[Dict[str, Any]]] = {}
+        self._map: Optional[mmap.mmap] = None
+        self._map_ino: Optional[int] = None
+        self._loaded = False
+        # Indexes not restored from the saved file and not yet filled.
+        self._unfilled: Set[str] = set()
+
+    # -- reading -----------------------------------------------------------
+
+    def _mapped(self, end: int) -> mmap.mmap:
+        current = self._map is not None and self._map_ino == self.ino
+        if current and len(self._map) >= end:
+            return self._map
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        with self.path.open("rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._map_ino = self.ino
+        return self._map
+
+    def raw(self, loc: Location) -> bytes:
+        """Return the bytes of the line at ``loc``, newline included."""
+
+        offset, length = loc
+        return self._mapped(offset + length)[offset : offset + length]
+
+    def decode(self, loc: Location) -> Dict[str, Any]:
+        return json.loads(self.raw(loc))
+
+    def get(self, key: Any) -> Optional[Dict[str, Any]]:
+        if key in self._overlay:
+            return self._overlay[key]
+        loc = self.offsets.get(key)
+        return self.decode(loc) if loc is not None else None
+
+    def index(self, name: str) -> Any:
+        """Return index ``name``, filling it first if it was not persisted."""
+
+        index = self.indexes[name]
+        if name in self._unfilled:
+            index.clear()
+            for key, loc in self.offsets.items():
+                if key not in self._overlay:
+                    index.add(key, self.decode(loc))
+            for key, row in self._overlay.items():
+                if row is not None:
+                    index.add(key, row)
+            self._unfilled.discard(name)
+        return index
+
+    def find(self, index: str, value: Any) -> Optional[Tuple[Dict[str, Any], Any]]:
+        hit = self.index(index).find(value)
+        if hit is None:
+            return None
+        key, pos = hit
+        return self.get(key), pos
+
+    def find_all(self, index: str, value: Any) -> List[Tuple[Dict[str, Any], Any]]:
+        return [(self.get(key), pos) for key, pos in self.index(index).find_all(value)]
+
+    def find_between(
+        self, index: str, low: Any, high: Any, limit: Optional[int] = None
+    ) -> List[Tuple[Dict[str, Any], Any]]:
+        return [
+            (self.get(key), pos)
+            for key, pos in self.index(index).between(low, high, limit)
+        ]
+
+    # -- keeping up with the file -----------------------------------------
+
+    def _check(self, size: int) -> int:
+        start = max(size - CHECK_BYTES, 0)
+        with self.path.open("rb") as f:
+            f.seek(start)
+            return zlib.crc32(f.read(size - start))
+
+    def refresh(self) -> None:
+        """Bring the index up to date with the data file."""
+
+        st = os.stat(self.path)
+        if not self._loaded:
+            self._loaded = True
+            self._restore()
+        if (st.st_ino, st.st_size, st.st_mtime_ns) == (
+            self.ino,
+            self.size,
+            self.mtime_ns,
+        ):
+            return
+        rebuild = (
+            st.st_ino != self.ino
+            or st.st_size < self.size
+            or self._check(self.size) != self._checksum
+        )
+        if rebuild:
+            self._reset()
+            self.rebuilds += 1
+        self.ino = st.st_ino
+        self._scan(self.size)
+        self.mtime_ns = st.st_mtime_ns
+        if rebuild or self.size - self._saved_size >= self.save_every:
+            self.save()
+
+    def invalidate(self) -> None:
+        """Forget the file position so the next refresh rebuilds."""
+
+        self.ino = None
+
+    def _reset(self) -> None:
+        self.offsets = {}
+        self.records = 0
+        self.size = 0
+        self._checksum = 0
+        self._unfilled = set()
+        for index in self.indexes.values():
+            index.clear()
+
+    def _scan(self, start: int) -> None:
+        pos = start
+        with self.path.open("rb") as f:
+            f.seek(start)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # incomplete trailing record, picked up once finished
+                length = len(line)
+                try:
+                    obj = json.loads(line) if line.strip() else None
+                except json.JSONDecodeError:
+                    obj = None
+                if isinstance(obj, dict):
+                    self.records += 1
+                    if self.key in obj:
+                        self._place(obj, (pos, length))
+                pos += length
+        self.size = pos
+        self._checksum = self._check(pos)
+
+    def _place(self, record: Dict[str, Any], loc: Location) -> None:
+        key = record[self.key]
+        old = self.offsets.get(key)
+        if old is not None and self.indexes:
+            old_row = self.decode(old)
+            for index in self.indexes.values():
+                index.remove(key, old_row)
+        if record.get(self.tombstone):
+            self.offsets.pop(key, None)
+        else:
+            self.offsets[key] = loc
+            for index in self.indexes.values():
+                index.add(key, record)
+
+    # -- writer support ----------------------------------------------------
+
+    def stage(self, record: Dict[str, Any]) -> Tuple[Any, bool, Any]:
+        """Apply an uncommitted record and return a token to undo it."""
+
+        key = record[self.key]
+        token = (key, key in self._overlay, self._overlay.get(key))
+        old = self.get(key)
+        if old is not None:
+            for index in self.indexes.values():
+                index.remove(key, old)
+        if record.get(self.tombstone):
+            self._overlay[key] = None
+        else:
+            self._overlay[key] = record
+            for index in self.indexes.values():
+                index.add(key, record)
+        return token
+
+    def unstage(self, token: Tuple[Any, bool, Any]) -> None:
+        key, had_overlay, previous = token
+        current = self.get(key)
+        if current is not None:
+            for index in self.indexes.values():
+                index.remove(key, current)
+        if had_overlay:
+            self._overlay[key] = previous
+        else:
+            self._overlay.pop(key, None)
+        restored = self.get(key)
+        if restored is not None:
+            for index in self.indexes.values():
+                index.add(key, restored)
+
+    def committed(
+        self, records: Iterable[Dict[str, Any]], lengths: List[int], start: int
+    ) -> None:
+        """Record where staged ``records`` landed after an append at ``start``."""
+
+        st = os.stat(self.path)
+        pos = start
+        for record, length in zip(records, lengths):
+            key = record[self.key]
+            self._overlay.pop(key, None)
+            if record.get(self.tombstone):
+                self.offsets.pop(key, None)
+            else:
+                self.offsets[key] = (pos, length)
+            self.records += 1
+            pos += length
+        self.size = pos
+        self.ino = st.st_ino
+        self.mtime_ns = st.st_mtime_ns
+        self._checksum = self._check(pos)
+        if self.size - self._saved_size >= self.save_every:
+            self.save()
+
+    def replaced(self, rows: List[Dict[str, Any]], lengths: List[int]) -> None:
+        """Index a freshly rewritten file from the rows that were written."""
+
+        self._reset()
+        self._overlay = {}
+        pos = 0
+        for row, length in zip(rows, lengths):
+            self.records += 1
+            if self.key in row:
+                self._place(row, (pos, length))
+            pos += length
+        st = os.stat(self.path)
+        self.size = pos
+        self.ino = st.st_ino
+        self.mtime_ns = st.st_mtime_ns
+        self._checksum = self._check(pos)
+        self.save()
+
+    def staged(self) -> List[Dict[str, Any]]:
+        """Return the uncommitted records as rows or tombstones."""
+
+        return [
+            row if row is not None else {self.key: key, self.tombstone: True}
+            for key, row in self._overlay.items()
+        ]
+
+    def discard(self) -> None:
+        """Drop staged rows after a failed commit and rebuild from disk."""
+
+        self._overlay = {}
+        self.invalidate()
+
+    # -- persistence -------------------------------------------------------
+
+    def _persisted(self) -> Dict[str, Any]:
+        return {
+            name: index
+            for name, index in self.indexes.items()
+            if getattr(index, "persist", True)
+        }
+
+    def save(self) -> None:
+        state = {
+            "version": INDEX_VERSION,
+            "key": self.key,
+            "ino": self.ino,
+            "size": self.size,
+            "mtime_ns": self.mtime_ns,
+            "checksum": self._checksum,
+            "records": self.records,
+            "offsets": [[k, off, length] for k, (off, length) in self.offsets.items()],
+            "indexes": {
+                name: [[value, k, pos] for value, k, pos in index.entries()]
+                for name, index in self._persisted().items()
+            },
+        }
+        tmp = self.index_path.with_name(f"{self.index_path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(state), encoding="utf-8")
+        os.replace(tmp, self.index_path)
+        self._saved_size = self.size
+
+    def _restore(self) -> None:
+        self._reset()
+        try:
+            state = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if (
+            not isinstance(state, dict)
+            or state.get("version") != INDEX_VERSION
+            or state.get("key") != self.key
+            or set(state.get("indexes", {})) != set(self._persisted())
+        ):
+            return
+        self.offsets = {k: (off, length) for k, off, length in state["offsets"]}
+        for name, entries in state["indexes"].items():
+            index = self.indexes[name]
+            for value, k, pos in entries:
+                index.restore(value, k, pos)
+        self.records = state["records"]
+        self.size = state["size"]
+        self.ino = state["ino"]
+        self.mtime_ns = state["mtime_ns"]
+        self._checksum = state["checksum"]
+        self._saved_size = self.size
+        self._unfilled = set(self.indexes) - set(state["indexes"])
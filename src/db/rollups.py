@@ -0,0 +1,171 @@
+"""Materialized stock and nutrition totals kept current by row deltas."""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.utils.nutrition import NUTRIENT_COLUMNS, per_gram, to_number
+
+ROLLUP_VERSION = 1
+
+Signature = Tuple[int, int, int]
+
+
+def _grams(unit: Dict[str, Any], container: Dict[str, Any]) -> float:
+    weight = to_number(unit.get("weight_g"))
+    if weight is None:
+        return to_number(container.get("net_weight_g")) or 0.0
+    empty = to_number(container.get("empty_container_weight_g")) or 0.0
+    return max(weight - empty, 0.0)
+
+
+class _Group:
+    """Running totals for the items of one group."""
+
+    __slots__ = ("items", "units", "grams", "nutrients", "reported")
+
+    def __init__(self) -> None:
+        self.items = 0
+        self.units = 0
+        self.grams = 0.0
+        self.nutrients = [0.0] * len(NUTRIENT_COLUMNS)
+        # Items with units on hand that report each nutrient.
+        self.reported = [0] * len(NUTRIENT_COLUMNS)
+
+    def apply(
+        self,
+        sign: int,
+        units: int,
+        grams: float,
+        amounts: List[Tuple[int, float]],
+    ) -> None:
+        self.items += sign
+        self.units += sign * units
+        self.grams += sign * grams
+        for column, amount in amounts:
+            self.nutrients[column] += sign * amount
+            if units:
+                self.reported[column] += sign
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "units": self.units,
+            "grams": round(self.grams, 3),
+            "nutrients": {
+                name: round(self.nutrients[i], 3)
+                for i, name in enumerate(NUTRIENT_COLUMNS)
+                if self.reported[i] > 0
+            },
+        }
+
+    def dump(self) -> List[Any]:
+        return [self.items, self.units, self.grams, self.nutrients, self.reported]
+
+    @classmethod
+    def load(cls, state: List[Any]) -> "_Group":
+        group = cls()
+        group.items, group.units, group.grams, nutrients, reported = state
+        if len(nutrients) != len(NUTRIENT_COLUMNS):
+            raise ValueError("Nutrient columns changed")
+        group.nutrients = [float(v) for v in nutrients]
+        group.reported = [int(v) for v in reported]
+        return group
+
+
+class Rollups:
+    """Unit counts, grams of food and nutrient totals, overall and per tag.
+
+    Registered as an index on the inventory database, so every row that is
+    written, replaced or rolled back adjusts the totals by its own
+    contribution instead of triggering a full pass. The numbers match
+    :func:`src.services.nutrition_summary.nutrition_summary`.
+
+    The totals are saved as ``<name>.rollups`` next to the data file,
+    together with the file's signature, whenever that signature changes.
+    On restart they are used as saved while the data file still has it.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path.with_name(path.name + ".rollups")
+        self.signature: Optional[Signature] = None
+        # Signature of the totals in the saved file.
+        self._saved: Optional[Signature] = None
+        self.clear()
+        self._restore()
+
+    # -- index protocol ----------------------------------------------------
+
+    def clear(self) -> None:
+        self.total = _Group()
+        self.tags: Dict[str, _Group] = {}
+        self.signature = None
+
+    def add(self, key: Any, row: Dict[str, Any]) -> None:
+        self._apply(1, row)
+
+    def remove(self, key: Any, row: Dict[str, Any]) -> None:
+        self._apply(-1, row)
+
+    def _apply(self, sign: int, row: Dict[str, Any]) -> None:
+        self.signature = None
+        container = row.get("container_info") or {}
+        units = row.get("units") or ()
+        grams = sum(_grams(unit, container) for unit in units)
+        amounts = [(c, v * grams) for c, v in per_gram(row.get("nutrition"))]
+        self.total.apply(sign, len(units), grams, amounts)
+        for tag in {str(t) for t in row.get("tags") or ()}:
+            group = self.tags.get(tag)
+            if group is None:
+                group = self.tags[tag] = _Group()
+            group.apply(sign, len(units), grams, amounts)
+            if group.items <= 0:
+                del self.tags[tag]
+        if self.total.items <= 0:
+            self.total = _Group()
+
+    def synced(self, signature: Optional[Signature]) -> None:
+        """Note that the totals match the data file at ``signature``."""
+
+        self.signature = signature
+        if signature is None:
+            return
+        if signature != self._saved or not self.path.exists():
+            self.save()
+
+    # -- reading -----------------------------------------------------------
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            **self.total.summary(),
+            "by_tag": {tag: self.tags[tag].summary() for tag in sorted(self.tags)},
+        }
+
+    # -- persistence -------------------------------------------------------
+
+    def save(self) -> None:
+        state = {
+            "version": ROLLUP_VERSION,
+            "signature": self.signature,
+            "total": self.total.dump(),
+            "tags": {tag: group.dump() for tag, group in self.tags.items()},
+        }
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(state), encoding="utf-8")
+        os.replace(tmp, self.path)
+        self._saved = self.signature
+
+    def _restore(self) -> None:
+        try:
+            state = json.loads(self.path.read_text(encoding="utf-8"))
+            if state.get("version") != ROLLUP_VERSION:
+                return
+            total = _Group.load(state["total"])
+            tags = {tag: _Group.load(g) for tag, g in state["tags"].items()}
+            signature = tuple(state["signature"])
+        except (OSError, ValueError, TypeError, KeyError, AttributeError):
+            return
+        self.total, self.tags, self.signature = total, tags, signature
+        self._saved = signature
@@ -0,0 +1,262 @@
+"""Ranked word-prefix and fuzzy search over row text."""
+
+from __future__ import annotations
+
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import groupby
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+_WORD = re.compile(r"[^\W_]+")
+
+# How much a match counts depending on the field it is found in: name, tags.
+WEIGHTS = (1.0, 0.5)
+# A query word that is a prefix of a longer word scores between PREFIX_SCORE
+# and 1.0, closer to 1.0 the more of the word it covers. Misspelled words
+# score at most FUZZY_SCORE, scaled by their trigram similarity, which must
+# be at least FUZZY_MIN.
+PREFIX_SCORE = 0.75
+FUZZY_SCORE = 0.5
+FUZZY_MIN = 0.4
+
+Doc = Tuple[str, Tuple[str, ...]]
+# Orders rows for tie-breaking: shorter names first, then by name and key.
+Rank = Tuple[int, str, Any]
+Match = Tuple[float, str]
+
+
+def words(text: Any) -> List[str]:
+    """Split ``text`` into case- and accent-folded words."""
+    text = unicodedata.normalize("NFKD", str(text))
+    if not text.isascii():
+        text = "".join(c for c in text if not unicodedata.combining(c))
+    return _WORD.findall(text.casefold())
+
+
+def trigrams(word: str) -> Set[str]:
+    padded = f"  {word} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class TextIndex:
+    """Find rows by the words of their name and tags, best matches first.
+
+    Every word of the query must match a word of the row: exactly, as a
+    prefix (so the last word can still be being typed), or, when prefixes
+    match fewer than ``limit`` rows, approximately by shared trigrams. A
+    row scores the sum of its best match per query word, with tag matches
+    worth half as much as name matches; ties go to shorter names.
+
+    Words are kept in a sorted vocabulary, so a prefix costs one bisect.
+    Each word's postings are lists of rows in tie-break order, one for
+    names and one for tags. A one-word query walks them best score first
+    and stops after ``limit`` rows, so even a single letter is answered
+    without visiting every row that matches it. Longer queries intersect
+    the postings of their words, most selective first.
+
+    Follows the index protocol of :mod:`src.db.index`. It is not
+    persisted by an :class:`~src.db.offsets.OffsetIndex`, whose saved file
+    it would dwarf, but refilled from the rows instead. As with
+    :class:`~src.db.index.SortedIndex`, rows added after :meth:`clear` are
+    sorted once on first use.
+    """
+
+    persist = False
+
+    def __init__(self, name_field: str = "name", tags_field: str = "tags") -> None:
+        self.name_field = name_field
+        self.tags_field = tags_field
+        self.clear()
+
+    # -- index protocol ----------------------------------------------------
+
+    def clear(self) -> None:
+        self._docs: Dict[Any, Doc] = {}
+        self._ranks: Dict[Any, Rank] = {}
+        self._postings: Dict[str, Tuple[List[Rank], List[Rank]]] = {}
+        self._grams: Dict[str, Set[str]] = {}
+        self._vocab: List[str] = []
+        self._building = True
+
+    def add(self, key: Any, row: Dict[str, Any]) -> None:
+        name = row.get(self.name_field)
+        tags = row.get(self.tags_field) or ()
+        self._add(
+            key,
+            (
+                "" if name is None else str(name),
+                tuple(str(tag) for tag in tags if tag is not None),
+            ),
+        )
+
+    def remove(self, key: Any, row: Dict[str, Any]) -> None:
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        self._ready()
+        rank = self._ranks.pop(key)
+        for field, word in self._fields(doc):
+            postings = self._postings.get(word)
+            if postings is None:
+                continue
+            ranks = postings[field]
+            i = bisect_left(ranks, rank)
+            if i < len(ranks) and ranks[i] == rank:
+                del ranks[i]
+            if postings[0] or postings[1]:
+                continue
+            del self._postings[word]
+            del self._vocab[bisect_left(self._vocab, word)]
+            for gram in trigrams(word):
+                grams = self._grams[gram]
+                grams.discard(word)
+                if not grams:
+                    del self._grams[gram]
+
+    def _add(self, key: Any, doc: Doc) -> None:
+        if key in self._docs:
+            self.remove(key, {})
+        self._docs[key] = doc
+        rank = self._ranks[key] = (len(doc[0]), doc[0], key)
+        for field, word in self._fields(doc):
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = ([], [])
+                for gram in trigrams(word):
+                    self._grams.setdefault(gram, set()).add(word)
+                if self._building:
+                    self._vocab.append(word)
+                else:
+                    insort(self._vocab, word)
+            if self._building:
+                postings[field].append(rank)
+            else:
+                insort(postings[field], rank)
+
+    @staticmethod
+    def _fields(doc: Doc) -> Set[Tuple[int, str]]:
+        """Return ``(field, word)`` for each distinct word of the row."""
+
+        name, tags = doc
+        fields = {(0, word) for word in words(name)}
+        for tag in tags:
+            fields.update((1, word) for word in words(tag))
+        return fields
+
+    def _ready(self) -> None:
+        if self._building:
+            self._vocab.sort()
+            for names, tags in self._postings.values():
+                names.sort()
+                tags.sort()
+            self._building = False
+
+    # -- searching ---------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _size(self, matches: List[Match]) -> int:
+        return sum(
+            len(names) + len(tags)
+            for names, tags in (self._postings[word] for _, word in matches)
+        )
+
+    def _matches(self, token: str, limit: int) -> List[Match]:
+        """Return ``(score, word)`` for the vocabulary words ``token`` matches."""
+
+        vocab = self._vocab
+        matches = []
+        for i in range(bisect_left(vocab, token), len(vocab)):
+            word = vocab[i]
+            if not word.startswith(token):
+                break
+            coverage = len(token) / len(word)
+            matches.append((PREFIX_SCORE + (1 - PREFIX_SCORE) * coverage, word))
+        if len(token) < 3 or self._size(matches) >= limit:
+            return matches
+        grams = trigrams(token)
+        shared = Counter(word for gram in grams for word in self._grams.get(gram, ()))
+        for word, count in shared.items():
+            # A word of n letters has n + 1 padded trigrams, give or take repeats.
+            similarity = count / (len(grams) + len(word) + 1 - count)
+            if similarity >= FUZZY_MIN and not word.startswith(token):
+                matches.append((FUZZY_SCORE * similarity, word))
+        return matches
+
+    def _top(self, matches: List[Match], limit: int) -> List[Tuple[Any, float]]:
+        """Return the best ``limit`` rows for a one-word query."""
+
+        streams = sorted(
+            (
+                (score * weight, ranks)
+                for score, word in matches
+                for weight, ranks in zip(WEIGHTS, self._postings[word])
+                if ranks
+            ),
+            key=lambda stream: -stream[0],
+        )
+        found: Dict[Any, float] = {}
+        # Rows in a higher-scoring stream beat any lower one, and within
+        # streams of equal score the postings are already in rank order.
+        for score, group in groupby(streams, key=lambda stream: stream[0]):
+            for rank in heapq.merge(*(ranks for _, ranks in group)):
+                if rank[2] not in found:
+                    found[rank[2]] = score
+                    if len(found) == limit:
+                        return list(found.items())
+        return list(found.items())
+
+    def _collect(
+        self, matches: List[Match], within: Optional[Dict[Any, float]]
+    ) -> Dict[Any, float]:
+        """Score rows for one query word, only among ``within`` if given."""
+
+        hits: Dict[Any, float] = {}
+        for score, word in matches:
+            for weight, ranks in zip(WEIGHTS, self._postings[word]):
+                if within is None:
+                    keys = [rank[2] for rank in ranks]
+                elif len(within) < len(ranks):
+                    keys = [key for key in within if _holds(ranks, self._ranks[key])]
+                else:
+                    keys = [rank[2] for rank in ranks if rank[2] in within]
+                value = score * weight
+                for key in keys:
+                    if value > hits.get(key, 0.0):
+                        hits[key] = value
+        if within is not None:
+            hits = {key: within[key] + score for key, score in hits.items()}
+        return hits
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[Any, float]]:
+        """Return up to ``limit`` ``(key, score)`` pairs, best first."""
+
+        tokens = list(dict.fromkeys(words(query)))
+        if not tokens or limit < 1:
+            return []
+        self._ready()
+        matched = [self._matches(token, limit) for token in tokens]
+        if not all(matched):
+            return []
+        if len(matched) == 1:
+            best = self._top(matched[0], limit)
+        else:
+            scores: Optional[Dict[Any, float]] = None
+            for matches in sorted(matched, key=self._size):
+                scores = self._collect(matches, scores)
+                if not scores:
+                    return []
+            ranks = self._ranks
+            best = heapq.nsmallest(
+                limit, scores.items(), key=lambda hit: (-hit[1], ranks[hit[0]])
+            )
+        return [(key, round(score, 4)) for key, score in best]
+
+
+def _holds(ranks: List[Rank], rank: Rank) -> bool:
+    i = bisect_left(ranks, rank)
+    return i < len(ranks) and ranks[i] == rank
@@ -0,0 +1,416 @@
+"""SQLite storage with the same interface as :class:`~src.db.JsonlDB`."""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from src.db import _VERSIONS, MISS, FSYNC_POLICIES, JsonlDB, views
+from src.db.index import IndexSpec
+from src.db.writer import Batch, GroupCommitWriter
+from src.metrics import Histogram
+
+T = TypeVar("T")
+
+# How ``fsync`` policies map onto SQLite's ``synchronous`` setting in WAL mode.
+SYNCHRONOUS = {"always": "FULL", "batched": "NORMAL", "never": "OFF"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rows (key NOT NULL PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS entries (name TEXT NOT NULL, value, key, pos);
+CREATE INDEX IF NOT EXISTS entries_value ON entries (name, value);
+CREATE INDEX IF NOT EXISTS entries_key ON entries (key);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value);
+INSERT OR IGNORE INTO meta VALUES ('generation', 0);
+"""
+
+
+class SqliteDB:
+    """Keyed rows stored in a SQLite database in WAL mode.
+
+    Offers the methods of :class:`~src.db.JsonlDB` that the services use, so
+    either can back them. Rows are kept as JSON text in a ``rows`` table in
+    insertion order; replacing a row keeps its place. ``indexes`` accepts the
+    same declarations as :class:`~src.db.JsonlDB`: extractors and
+    :class:`~src.db.index.HashIndex` or :class:`~src.db.index.SortedIndex`
+    objects are stored in an ``entries`` table with a SQL index on the
+    extracted values, so lookups and :meth:`lookup_between` never scan the
+    rows. Other index objects, such as :class:`~src.db.rollups.Rollups`,
+    are kept in memory, updated after every commit and rebuilt with one
+    pass when another connection has written.
+
+    Each thread uses its own connection. Writes go through a group-commit
+    writer thread like :class:`~src.db.JsonlDB`'s; each batch is one
+    ``BEGIN IMMEDIATE`` transaction, which SQLite also serializes against
+    other processes. ``fsync`` maps onto ``PRAGMA synchronous`` (see
+    :data:`SYNCHRONOUS`). Commits are timed in :attr:`timings`.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        key: str,
+        fsync: str = "always",
+        indexes: Optional[Dict[str, IndexSpec]] = None,
+        commit_window: float = 0.002,
+        busy_timeout: float = 5.0,
+    ) -> None:
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.path = path
+        self.key = key
+        self.fsync = fsync
+        self.busy_timeout = busy_timeout
+        self.extractors: Dict[str, Any] = {}
+        self.indexes: Dict[str, Any] = {}
+        for name, spec in (indexes or {}).items():
+            extract = spec if callable(spec) else getattr(spec, "extract", None)
+            if extract is not None:
+                self.extractors[name] = extract
+            else:
+                self.indexes[name] = spec
+        self.stats: Dict[str, float] = {"commits": 0, "commit_seconds": 0.0}
+        self.timings = {"write": Histogram()}
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._indexed: Optional[int] = None
+        self._changes: List[Tuple[Any, Any, Any]] = []
+        self._rebuild = False
+        self._version = 0
+        self._version_gen: Optional[int] = None
+        self._writer = GroupCommitWriter(
+            self._commit_batch, window=commit_window, name=f"writer:{path.name}"
+        )
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        self._extract_missing(conn)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path, timeout=self.busy_timeout, isolation_level=None
+            )
+            conn.execute(f"PRAGMA synchronous={SYNCHRONOUS[self.fsync]}")
+            self._local.conn = conn
+        return conn
+
+    def _generation(self) -> int:
+        row = (
+            self._conn()
+            .execute("SELECT value FROM meta WHERE name = 'generation'")
+            .fetchone()
+        )
+        return row[0]
+
+    @property
+    def version(self) -> int:
+        """Return a number that changes whenever a write is committed."""
+
+        generation = self._generation()
+        if generation != self._version_gen:
+            self._version_gen = generation
+            self._version = next(_VERSIONS)
+        return self._version
+
+    # -- reading -----------------------------------------------------------
+
+    def get(self, key_value: Any) -> Optional[Dict[str, Any]]:
+        """Return the row whose key equals ``key_value``."""
+
+        row = (
+            self._conn()
+            .execute("SELECT data FROM rows WHERE key = ?", (key_value,))
+            .fetchone()
+        )
+        return json.loads(row[0]) if row else None
+
+    def max_key(self) -> Any:
+        """Return the largest key, or ``None`` when there are no rows."""
+
+        return self._conn().execute("SELECT MAX(key) FROM rows").fetchone()[0]
+
+    def read_all(self) -> List[Dict[str, Any]]:
+        cursor = self._conn().execute("SELECT data FROM rows ORDER BY rowid")
+        return [json.loads(data) for data, in cursor]
+
+    def _pages(self, page: int) -> Iterator[List[str]]:
+        # Each page is a separate query on the calling thread's connection, so
+        # the iterator can be advanced from different threads.
+        after = 0
+        while True:
+            rows = (
+                self._conn()
+                .execute(
+                    "SELECT rowid, data FROM rows WHERE rowid > ?"
+                    " ORDER BY rowid LIMIT ?",
+                    (after, page),
+                )
+                .fetchall()
+            )
+            if not rows:
+                return
+            after = rows[-1][0]
+            yield [data for _, data in rows]
+
+    def iter_rows(self) -> Iterator[Dict[str, Any]]:
+        """Yield live rows one at a time, reading them a page at a time."""
+
+        for page in self._pages(256):
+            yield from (json.loads(data) for data in page)
+
+    def iter_lines(self, chunk_rows: int = 256) -> Iterator[bytes]:
+        """Yield rows as NDJSON bytes, copied from the stored text."""
+
+        for page in self._pages(chunk_rows):
+            yield ("\n".join(page) + "\n").encode("utf-8")
+
+    def _hits(self, where: str, params: Tuple[Any, ...]) -> List[Tuple[Any, Any]]:
+        cursor = self._conn().execute(
+            "SELECT rows.data, entries.pos FROM entries"
+            " JOIN rows ON rows.key = entries.key"
+            f" WHERE {where}",
+            params,
+        )
+        return [(json.loads(data), pos) for data, pos in cursor]
+
+    def lookup(self, index: str, value: Any) -> Optional[Tuple[Dict[str, Any], Any]]:
+        """Return ``(row, position)`` for the first row indexed under ``value``."""
+
+        hits = self._hits(
+            "entries.name = ? AND entries.value = ? ORDER BY rows.rowid LIMIT 1",
+            (index, value),
+        )
+        return hits[0] if hits else None
+
+    def lookup_all(self, index: str, value: Any) -> List[Tuple[Dict[str, Any], Any]]:
+        """Return ``(row, position)`` for every row indexed under ``value``."""
+
+        return self._hits(
+            "entries.name = ? AND entries.value = ? ORDER BY rows.rowid",
+            (index, value),
+        )
+
+    def lookup_between(
+        self,
+        index: str,
+        low: Any = None,
+        high: Any = None,
+        limit: Optional[int] = None,
+    ) -> List[Tuple[Dict[str, Any], Any]]:
+        """Return ``(row, position)`` for values in ``[low, high)``, in value order."""
+
+        where = "entries.name = ?"
+        params: Tuple[Any, ...] = (index,)
+        if low is not None:
+            where += " AND entries.value >= ?"
+            params += (low,)
+        if high is not None:
+            where += " AND entries.value < ?"
+            params += (high,)
+        where += " ORDER BY entries.value, entries.key, entries.pos"
+        if limit is not None:
+            where += " LIMIT ?"
+            params += (limit,)
+        return self._hits(where, params)
+
+    def if_cached(self, fn: Callable[[], T]) -> Any:
+        """Always :data:`~src.db.MISS`: every read goes to SQLite."""
+
+        return MISS
+
+    def read_index(self, name: str, read: Callable[[Any], T]) -> T:
+        """Call ``read`` with in-memory index ``name`` once it is current."""
+
+        with self._lock:
+            generation = self._generation()
+            if self._indexed != generation:
+                self._reindex(generation)
+            return read(self.indexes[name])
+
+    def _reindex(self, generation: int) -> None:
+        for index in self.indexes.values():
+            index.clear()
+        for page in self._pages(1024):
+            for data in page:
+                row = json.loads(data)
+                for index in self.indexes.values():
+                    index.add(row[self.key], row)
+        self._indexed = generation
+
+    # -- writing -----------------------------------------------------------
+
+    def mutate(self, fn: Callable[[], T]) -> T:
+        """Run ``fn`` on the writer thread and return its result.
+
+        As with :meth:`JsonlDB.mutate`, writes are serialized through one
+        thread and mutations queued within ``commit_window`` seconds of each
+        other share a transaction. Each runs under its own savepoint, so a
+        mutation that raises is rolled back alone and its exception
+        propagates to the caller.
+        """
+
+        if self._writer.on_thread():
+            return fn()
+        return self._writer.submit(fn).result()
+
+    def _commit_batch(self, batch: Batch) -> None:
+        done = []
+        with self._lock:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            generation = self._generation()
+            for fn, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                mark, rebuild = len(self._changes), self._rebuild
+                conn.execute("SAVEPOINT mutation")
+                try:
+                    result = fn()
+                except BaseException as exc:
+                    conn.execute("ROLLBACK TO mutation")
+                    conn.execute("RELEASE mutation")
+                    del self._changes[mark:]
+                    self._rebuild = rebuild
+                    future.set_exception(exc)
+                else:
+                    conn.execute("RELEASE mutation")
+                    done.append((future, result))
+            changes, self._changes = self._changes, []
+            rebuild, self._rebuild = self._rebuild, False
+            if not done:
+                conn.execute("ROLLBACK")
+                return
+            try:
+                conn.execute(
+                    "UPDATE meta SET value = value + 1 WHERE name = 'generation'"
+                )
+                start = time.perf_counter()
+                conn.execute("COMMIT")
+                elapsed = time.perf_counter() - start
+                self.stats["commit_seconds"] += elapsed
+                self.timings["write"].observe(elapsed)
+            except BaseException as exc:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                for future, _ in done:
+                    future.set_exception(exc)
+                return
+            self.stats["commits"] += 1
+            if self._indexed == generation and not rebuild:
+                for key, old, new in changes:
+                    for index in self.indexes.values():
+                        if old is not None:
+                            index.remove(key, old)
+                        if new is not None:
+                            index.add(key, new)
+                self._indexed = generation + 1
+        for future, result in done:
+            future.set_result(result)
+
+    def _entries(self, conn: sqlite3.Connection, row: Dict[str, Any]) -> None:
+        key = row[self.key]
+        conn.executemany(
+            "INSERT INTO entries VALUES (?, ?, ?, ?)",
+            [
+                (name, value, key, pos)
+                for name, extract in self.extractors.items()
+                for value, pos in extract(row)
+            ],
+        )
+
+    def _insert(self, conn: sqlite3.Connection, row: Dict[str, Any]) -> None:
+        conn.execute(
+            "INSERT INTO rows VALUES (?, ?)"
+            " ON CONFLICT (key) DO UPDATE SET data = excluded.data",
+            (row[self.key], views.dumps(row)),
+        )
+        self._entries(conn, row)
+
+    def _extract_missing(self, conn: sqlite3.Connection) -> None:
+        """Rebuild the entries once if the declared indexes have changed.
+
+        The names of the indexes the entries were extracted for are kept in
+        ``meta``, so a database created before an index was added gets its
+        entries on the next open instead of answering lookups with nothing.
+        """
+
+        names = json.dumps(sorted(self.extractors))
+        query = "SELECT value FROM meta WHERE name = 'indexes'"
+        if conn.execute(query).fetchone() == (names,):
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute(query).fetchone() != (names,):
+                conn.execute("DELETE FROM entries")
+                for (data,) in conn.execute("SELECT data FROM rows").fetchall():
+                    self._entries(conn, json.loads(data))
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('indexes', ?)", (names,)
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def put(self, row: Dict[str, Any], op: Optional[str] = None) -> None:
+        """Insert ``row`` or replace the row that has the same key.
+
+        ``op`` is accepted for compatibility with :meth:`JsonlDB.put`;
+        SQLite keeps its own log and no mutation log is written.
+        """
+
+        if not self._writer.on_thread():
+            self.mutate(lambda: self.put(row))
+            return
+        conn = self._conn()
+        key = row[self.key]
+        old = self.get(key) if self.indexes else None
+        conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self._insert(conn, row)
+        self._changes.append((key, old, row))
+
+    def delete(self, key_value: Any) -> None:
+        """Remove the row identified by ``key_value``."""
+
+        if not self._writer.on_thread():
+            self.mutate(lambda: self.delete(key_value))
+            return
+        conn = self._conn()
+        old = self.get(key_value) if self.indexes else None
+        conn.execute("DELETE FROM entries WHERE key = ?", (key_value,))
+        conn.execute("DELETE FROM rows WHERE key = ?", (key_value,))
+        self._changes.append((key_value, old, None))
+
+    def write_all(self, rows: List[Dict[str, Any]], log: bool = True) -> None:
+        """Replace every row with ``rows``.
+
+        ``log`` is accepted for compatibility with :meth:`JsonlDB.write_all`.
+        """
+
+        if not self._writer.on_thread():
+            self.mutate(lambda: self.write_all(rows))
+            return
+        conn = self._conn()
+        conn.execute("DELETE FROM entries")
+        conn.execute("DELETE FROM rows")
+        for row in rows:
+            self._insert(conn, row)
+        self._rebuild = True
+
+
+def migrate(source: JsonlDB, target: SqliteDB) -> int:
+    """Copy every live row of ``source`` into ``target``, replacing its rows.
+
+    Returns the number of rows copied.
+    """
+
+    rows = source.read_all()
+    target.write_all(rows)
+    return len(rows)
@@ -0,0 +1,105 @@
+"""Read-only views over cached rows."""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Iterator, List, Mapping, Sequence, Union
+
+
+class FrozenDict(Mapping[str, Any]):
+    """Read-only view of a dict.
+
+    Nested dicts and lists are wrapped as they are accessed, so handing a
+    cached row to callers costs one small object and no copying. Build a
+    new dict (``{**view, "field": value}``) to derive a changed row.
+    """
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data: Dict[str, Any]) -> None:
+        self._data = data
+
+    def __getitem__(self, key: str) -> Any:
+        return freeze(self._data[key])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._data
+
+    def __eq__(self, other: object) -> bool:
+        return self._data == _raw(other)
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"FrozenDict({self._data!r})"
+
+
+class FrozenList(Sequence[Any]):
+    """Read-only view of a list; see :class:`FrozenDict`."""
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data: List[Any]) -> None:
+        self._data = data
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return FrozenList(self._data[index])
+        return freeze(self._data[index])
+
+    def __iter__(self) -> Iterator[Any]:
+        return (freeze(value) for value in self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __eq__(self, other: object) -> bool:
+        return self._data == _raw(other)
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"FrozenList({self._data!r})"
+
+
+View = Union[FrozenDict, FrozenList]
+
+
+def _raw(value: Any) -> Any:
+    return value._data if isinstance(value, (FrozenDict, FrozenList)) else value
+
+
+def freeze(value: Any) -> Any:
+    """Wrap dicts and lists in read-only views; return anything else as is."""
+    if isinstance(value, dict):
+        return FrozenDict(value)
+    if isinstance(value, list):
+        return FrozenList(value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Return a mutable deep copy of ``value``, unwrapping any views."""
+    value = _raw(value)
+    if isinstance(value, Mapping):
+        return {key: thaw(v) for key, v in value.items()}
+    if isinstance(value, Sequence) and not isinstance(value, (str, bytes)):
+        return [thaw(v) for v in value]
+    return value
+
+
+def dumps(value: Any, **kwargs: Any) -> str:
+    """``json.dumps`` that serializes views straight from the data they wrap."""
+    return json.dumps(value, default=_default, **kwargs)
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (FrozenDict, FrozenList)):
+        return value._data
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
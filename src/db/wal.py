@@ -0,0 +1,343 @@
+"""Write-ahead log of row changes for crash and point-in-time recovery."""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.db import views
+
+# ``op`` values: the first four change one row, ``replace`` all of them, and
+# ``rewrite`` marks a replacement whose rows were not logged.
+OPS = ("create", "update", "consume", "delete", "replace", "rewrite")
+
+# How far back from the end of a segment to look for its last record at first.
+_TAIL_BYTES = 1 << 16
+
+
+def log_dir(path: Path) -> Path:
+    """Return the directory that holds the mutation log of data file ``path``."""
+    return path.with_name(path.name + ".wal")
+
+
+class MutationLog:
+    """Durable, timestamped record of every change to a keyed data file.
+
+    Records are NDJSON lines in segment files under ``<name>.wal/``, each
+    named after the ``seq`` of its first record. A record holds its
+    ``seq``, the time ``ts`` it was written, the ``op`` (see :data:`OPS`),
+    the row ``key`` and, except for deletes, the whole ``row``; a
+    ``replace`` record carries ``rows`` instead and a ``rewrite`` record
+    neither, since its rows went straight to the data file. Because rows
+    are logged whole, replaying a record that the data file already
+    reflects changes nothing.
+
+    ``checkpoint.json`` holds the ``seq`` up to which the data file is
+    known to be on disk, so only later records need replaying after a
+    crash. It also notes whether the log was started on an empty file, in
+    which case the log alone can rebuild the rows as of any time, until
+    its first segment is dropped. Segments are rotated at checkpoints once
+    they reach ``segment_bytes``. Each rotation prunes the segments whose
+    records are all older than both the checkpoint and the ``seq`` that
+    ``keep.json`` asks to keep, which backups set with :meth:`keep` so
+    their recovery window survives.
+
+    Callers serialize appends and checkpoints themselves, across processes
+    too; :class:`~src.db.JsonlDB` does so under its write lock.
+    """
+
+    def __init__(self, path: Path, segment_bytes: int = 4 << 20) -> None:
+        self.dir = log_dir(path)
+        self.segment_bytes = segment_bytes
+        self.checkpoint_path = self.dir / "checkpoint.json"
+        self.keep_path = self.dir / "keep.json"
+        self.last_seq = 0
+        self._segment: Optional[Path] = None
+        self._size = -1
+        if not self.checkpoint_path.exists():
+            self.dir.mkdir(parents=True, exist_ok=True)
+            empty = not path.exists() or path.stat().st_size == 0
+            self._write_checkpoint({"seq": 0, "ts": time.time(), "complete": empty})
+        state = self._read_checkpoint()
+        self.checkpointed: int = state["seq"]
+        self.complete: bool = state.get("complete", False)
+
+    # -- files -------------------------------------------------------------
+
+    def segments(self) -> List[Tuple[int, Path]]:
+        """Return ``(first seq, path)`` of every segment, oldest first."""
+
+        found = []
+        for path in self.dir.glob("*.ndjson"):
+            try:
+                found.append((int(path.stem), path))
+            except ValueError:
+                continue
+        return sorted(found)
+
+    def _new_segment(self, first: int) -> Path:
+        path = self.dir / f"{first:012d}.ndjson"
+        path.touch()
+        return path
+
+    def _read_checkpoint(self) -> Dict[str, Any]:
+        return json.loads(self.checkpoint_path.read_text(encoding="utf-8"))
+
+    def _write_checkpoint(self, state: Dict[str, Any]) -> None:
+        # Not synced: an older checkpoint only means more records get replayed.
+        tmp = self.checkpoint_path.with_name(f"checkpoint.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(state), encoding="utf-8")
+        os.replace(tmp, self.checkpoint_path)
+
+    @property
+    def kept(self) -> Optional[int]:
+        """Return the ``seq`` from which records are kept for backups, if set."""
+
+        try:
+            return json.loads(self.keep_path.read_text(encoding="utf-8"))["seq"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def keep(self, seq: Optional[int]) -> None:
+        """Keep records from ``seq`` on when pruning; ``None`` keeps none."""
+
+        if seq is None:
+            self.keep_path.unlink(missing_ok=True)
+            return
+        tmp = self.keep_path.with_name(f"keep.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({"seq": seq}), encoding="utf-8")
+        os.replace(tmp, self.keep_path)
+
+    def refresh(self) -> None:
+        """Find the last record, which another process may have written.
+
+        A torn record left by a crash mid-append is cut off; it was never
+        acknowledged to the caller.
+        """
+
+        segments = self.segments()
+        if not segments:
+            self._segment, self._size = None, -1
+            self.last_seq = max(self.last_seq, self.checkpointed)
+            return
+        first, path = segments[-1]
+        size = path.stat().st_size
+        if path == self._segment and size == self._size:
+            return
+        line, end = _last_line(path, size)
+        if end != size:
+            os.truncate(path, end)
+        self._segment, self._size = path, end
+        self.last_seq = json.loads(line)["seq"] if line else first - 1
+
+    @property
+    def current(self) -> Optional[Path]:
+        """Return the segment being appended to, if any."""
+
+        return self._segment
+
+    # -- writing -----------------------------------------------------------
+
+    def append(
+        self,
+        changes: List[Dict[str, Any]],
+        sync: Callable[[int], None],
+        end: Optional[int] = None,
+    ) -> int:
+        """Write one record per change, then ``sync`` the segment's fd.
+
+        ``end`` is stored on the last record: the size of the data file
+        once the same changes have been appended to it, which lets
+        :meth:`~src.db.JsonlDB` check on startup that they were. Returns a
+        mark to pass to :meth:`truncate` if the data file write fails.
+        """
+
+        self.refresh()
+        if self._segment is None:
+            self._segment, self._size = self._new_segment(self.last_seq + 1), 0
+        now = round(time.time(), 6)
+        lines = []
+        for i, entry in enumerate(changes, self.last_seq + 1):
+            record = {"seq": i, "ts": now, **entry}
+            if end is not None and i == self.last_seq + len(changes):
+                record["end"] = end
+            lines.append(views.dumps(record) + "\n")
+        data = "".join(lines).encode("utf-8")
+        mark = self._size
+        with self._segment.open("ab") as f:
+            f.write(data)
+            f.flush()
+            sync(f.fileno())
+        self._size += len(data)
+        self.last_seq += len(changes)
+        return mark
+
+    def truncate(self, mark: int) -> None:
+        """Drop the records appended since :meth:`append` returned ``mark``."""
+
+        if self._segment is not None:
+            os.truncate(self._segment, mark)
+            self._size = -1
+            self.refresh()
+
+    def checkpoint(self, seq: Optional[int] = None) -> None:
+        """Note that the data file is on disk up to ``seq`` (default: all)."""
+
+        self.refresh()
+        seq = self.last_seq if seq is None else seq
+        self.checkpointed = seq
+        self._write_checkpoint(
+            {"seq": seq, "ts": time.time(), "complete": self.complete}
+        )
+        if self._size >= self.segment_bytes:
+            self._segment, self._size = self._new_segment(self.last_seq + 1), 0
+            kept = self.kept
+            self.prune(seq + 1 if kept is None else kept)
+
+    def prune(self, before: int) -> int:
+        """Delete segments holding only records older than ``before``.
+
+        Records after the checkpoint and the current segment are always
+        kept. Returns the number of segments removed.
+        """
+
+        before = min(before, self.checkpointed + 1)
+        segments = self.segments()
+        removed = 0
+        for (_, path), (next_first, _) in zip(segments, segments[1:]):
+            if next_first > before:
+                break
+            path.unlink()
+            removed += 1
+        if removed:
+            self.complete = False
+            self.checkpoint(self.checkpointed)
+        return removed
+
+    # -- reading -----------------------------------------------------------
+
+    def records(
+        self, after: int = 0, until: Optional[float] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield records with a ``seq`` above ``after``, in order.
+
+        With ``until``, stop at the first record written after that time.
+        """
+
+        segments = self.segments()
+        start = 0
+        for i, (first, _) in enumerate(segments):
+            if first <= after + 1:
+                start = i
+        for _, path in segments[start:]:
+            with path.open("rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if record["seq"] <= after:
+                        continue
+                    if until is not None and record["ts"] > until:
+                        return
+                    yield record
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """Return the records written since the last checkpoint."""
+
+        return list(self.records(after=self.checkpointed))
+
+    @property
+    def first_seq(self) -> int:
+        """Return the ``seq`` of the oldest record still kept."""
+
+        segments = self.segments()
+        return segments[0][0] if segments else self.last_seq + 1
+
+
+def _last_line(path: Path, size: int) -> Tuple[bytes, int]:
+    """Return the last complete line of ``path`` and where it ends."""
+
+    window = _TAIL_BYTES
+    with path.open("rb") as f:
+        while True:
+            start = max(size - window, 0)
+            f.seek(start)
+            data = f.read(size - start)
+            end = data.rfind(b"\n") + 1
+            if end == 0 and start > 0:
+                window *= 2
+                continue
+            begin = data.rfind(b"\n", 0, end - 1) + 1
+            if begin == 0 and start > 0:
+                window *= 2
+                continue
+            return data[begin:end].strip(), start + end
+
+
+def change(record: Dict[str, Any], key: str, op: str) -> Dict[str, Any]:
+    """Return the log entry for staging data file ``record`` as ``op``."""
+
+    if op == "delete":
+        return {"op": op, "key": record[key]}
+    return {"op": op, "key": record[key], "row": record}
+
+
+def replay(
+    rows: Dict[Any, Dict[str, Any]], records: Iterable[Dict[str, Any]], key: str
+) -> int:
+    """Apply log ``records`` to ``rows``, a mapping of key to row.
+
+    Returns the number of records applied.
+    """
+
+    count = 0
+    for record in records:
+        op = record["op"]
+        if op == "rewrite":
+            raise ValueError(
+                f"Record {record['seq']} is a bulk rewrite the log does not hold"
+            )
+        if op == "replace":
+            rows.clear()
+            rows.update((row[key], row) for row in record["rows"] if key in row)
+        elif op == "delete":
+            rows.pop(record["key"], None)
+        else:
+            rows[record["key"]] = record["row"]
+        count += 1
+    return count
+
+
+def rows_as_of(
+    log: MutationLog,
+    key: str,
+    at: float,
+    base: Optional[Tuple[Iterable[Dict[str, Any]], int]] = None,
+) -> List[Dict[str, Any]]:
+    """Return the rows as they were at time ``at``.
+
+    ``base`` is a set of rows, such as a backup, and the ``seq`` of the
+    checkpoint it was taken at; changes logged after it are replayed on
+    top. Without one the whole log is replayed, which needs a log that
+    was started on an empty file and has not been pruned.
+    """
+
+    log.refresh()
+    if base is None:
+        if not log.complete or log.first_seq != 1:
+            raise ValueError("The log does not start from an empty file")
+        rows: Dict[Any, Dict[str, Any]] = {}
+        after = 0
+    else:
+        base_rows, after = base
+        if log.first_seq > after + 1:
+            raise ValueError("The log no longer holds the changes since the base")
+        rows = {row[key]: row for row in base_rows if key in row}
+    replay(rows, log.records(after=after, until=at), key)
+    return list(rows.values())
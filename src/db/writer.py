@@ -0,0 +1,85 @@
+"""Single-writer queue with group commit."""
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+Mutation = Callable[[], Any]
+Batch = List[Tuple[Mutation, "Future[Any]"]]
+
+
+class GroupCommitWriter:
+    """Run submitted mutations one at a time on a dedicated thread.
+
+    Mutations that arrive within ``window`` seconds of the first queued one
+    (up to ``max_batch``) are handed to ``commit`` together so they can be
+    made durable with a single write. ``commit`` is responsible for running
+    each mutation and resolving its future.
+    """
+
+    def __init__(
+        self,
+        commit: Callable[[Batch], None],
+        window: float = 0.002,
+        max_batch: int = 512,
+        name: str = "jsonl-writer",
+    ) -> None:
+        self.commit = commit
+        self.window = window
+        self.max_batch = max_batch
+        self.name = name
+        self._queue: "queue.Queue[Tuple[Mutation, Future[Any]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def on_thread(self) -> bool:
+        """Return ``True`` when called from the writer thread itself."""
+
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, fn: Mutation) -> "Future[Any]":
+        future: "Future[Any]" = Future()
+        self._ensure_started()
+        self._queue.put((fn, future))
+        return future
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                thread.start()
+                self._thread = thread
+
+    def _collect(self) -> Batch:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            try:
+                self.commit(batch)
+            except BaseException as exc:  # pragma: no cover - defensive
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
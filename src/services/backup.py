@@ -0,0 +1,299 @@
+"""Incremental, compressed, content-addressed backups of the data files."""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import lzma
+import os
+import sqlite3
+import tempfile
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+MANIFEST_VERSION = 1
+
+# Codec name -> (chunk file suffix, compress, decompress).
+CODECS: Dict[str, Tuple[str, Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    "gzip": (".gz", lambda data: gzip.compress(data, mtime=0), gzip.decompress),
+    "lzma": (".xz", lzma.compress, lzma.decompress),
+}
+
+# Average, smallest and largest chunk sizes in bytes.
+TARGET_CHUNK = 1 << 16
+MIN_CHUNK = TARGET_CHUNK // 4
+MAX_CHUNK = TARGET_CHUNK * 4
+
+
+def line_chunks(f: IO[bytes]) -> Iterator[bytes]:
+    """Split NDJSON into chunks that end where the content says so.
+
+    A line closes a chunk with probability proportional to its length,
+    decided by a checksum of the line itself. Inserting, changing or
+    dropping rows therefore only changes the chunks around them: the
+    boundaries elsewhere stay where they were, and so do those chunks'
+    hashes.
+    """
+    lines: List[bytes] = []
+    size = 0
+    for line in f:
+        lines.append(line)
+        size += len(line)
+        if size >= MAX_CHUNK or (
+            size >= MIN_CHUNK and zlib.crc32(line) * TARGET_CHUNK < len(line) << 32
+        ):
+            yield b"".join(lines)
+            lines, size = [], 0
+    if lines:
+        yield b"".join(lines)
+
+
+def block_chunks(f: IO[bytes]) -> Iterator[bytes]:
+    """Split a file into fixed-size blocks, which suits SQLite's pages."""
+    return iter(lambda: f.read(TARGET_CHUNK), b"")
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=32).hexdigest()
+
+
+def _signature(path: Path) -> List[int]:
+    st = path.stat()
+    return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+@contextmanager
+def _consistent(path: Path) -> Iterator[Path]:
+    """Yield a path holding a consistent copy of ``path``.
+
+    NDJSON files are only ever appended to or replaced whole, so they are
+    read in place. SQLite databases are copied with the backup API first,
+    which includes changes still in the write-ahead log.
+    """
+    if path.suffix != ".sqlite3":
+        yield path
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = Path(tmp) / path.name
+        source, target = sqlite3.connect(path), sqlite3.connect(copy)
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
+        yield copy
+
+
+class BackupStore:
+    """Snapshots made of deduplicated, compressed chunks.
+
+    Each file is split into chunks (see :func:`line_chunks` and
+    :func:`block_chunks`) that are stored once under ``chunks/`` by the
+    hash of their contents, compressed with one of :data:`CODECS`. A
+    snapshot is a small JSON manifest under ``snapshots/`` listing the
+    chunks of every file, so a snapshot of unchanged data costs only its
+    manifest. Files whose inode, size and modification time match the
+    previous snapshot are not even read.
+
+    Chunks and manifests are written to temporary files and renamed into
+    place, and the manifest goes last, so an interrupted backup leaves at
+    most some unreferenced chunks behind. :meth:`prune` removes those.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.chunk_dir = root / "chunks"
+        self.snapshot_dir = root / "snapshots"
+
+    # -- chunks ------------------------------------------------------------
+
+    def _chunk_path(self, digest: str, codec: str) -> Path:
+        return self.chunk_dir / digest[:2] / (digest + CODECS[codec][0])
+
+    def _find(self, digest: str) -> Optional[Tuple[Path, str]]:
+        for codec in CODECS:
+            path = self._chunk_path(digest, codec)
+            if path.exists():
+                return path, codec
+        return None
+
+    def _put(self, data: bytes, codec: str) -> Tuple[str, int]:
+        """Store ``data`` unless present; return its hash and bytes written."""
+
+        digest = _digest(data)
+        if self._find(digest) is not None:
+            return digest, 0
+        path = self._chunk_path(digest, codec)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        packed = CODECS[codec][1](data)
+        _write_atomic(path, packed)
+        return digest, len(packed)
+
+    def _read(self, digest: str) -> bytes:
+        found = self._find(digest)
+        if found is None:
+            raise FileNotFoundError(f"Missing chunk {digest}")
+        path, codec = found
+        data = CODECS[codec][2](path.read_bytes())
+        if _digest(data) != digest:
+            raise ValueError(f"Corrupt chunk {digest}")
+        return data
+
+    # -- snapshots ---------------------------------------------------------
+
+    def snapshots(self) -> List[str]:
+        """Return snapshot names, oldest first."""
+
+        if not self.snapshot_dir.exists():
+            return []
+        return sorted(path.stem for path in self.snapshot_dir.glob("*.json"))
+
+    def manifest(self, name: str) -> Dict[str, Any]:
+        path = self.snapshot_dir / f"{name}.json"
+        if not path.exists():
+            raise FileNotFoundError(f"No snapshot named {name}")
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    def create(
+        self,
+        files: Dict[str, Path],
+        codec: str = "gzip",
+        now: Optional[datetime] = None,
+        meta: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> Dict[str, Any]:
+        """Snapshot ``files``, a mapping of names to paths, and return the manifest.
+
+        ``meta`` adds fields to the manifest entries of the named files. The
+        manifest's ``stored`` counts the compressed bytes this snapshot
+        added to the store.
+        """
+
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec: {codec}")
+        names = self.snapshots()
+        previous = self.manifest(names[-1])["files"] if names else {}
+        entries: Dict[str, Any] = {}
+        stored = 0
+        for name, path in files.items():
+            old = previous.get(name)
+            if (
+                old is not None
+                and old.get("signature") is not None
+                and old["file"] == path.name
+                and old["signature"] == _signature(path)
+            ):
+                entries[name] = {**old, **(meta or {}).get(name, {})}
+                continue
+            entry, added = self._add_file(path, codec)
+            entries[name] = {**entry, **(meta or {}).get(name, {})}
+            stored += added
+
+        stamp = (now or datetime.now()).strftime("%Y%m%d_%H%M%S")
+        name, n = stamp, 1
+        while name in names:
+            n += 1
+            name = f"{stamp}-{n}"
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "name": name,
+            "created": (now or datetime.now()).isoformat(timespec="seconds"),
+            "codec": codec,
+            "stored": stored,
+            "files": entries,
+        }
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        _write_atomic(
+            self.snapshot_dir / f"{name}.json", json.dumps(manifest).encode("utf-8")
+        )
+        return manifest
+
+    def _add_file(self, path: Path, codec: str) -> Tuple[Dict[str, Any], int]:
+        # SQLite copies are taken through the backup API, so the stat of the
+        # database file alone does not say whether it changed.
+        signature = _signature(path) if path.suffix != ".sqlite3" else None
+        chunker = line_chunks if path.suffix != ".sqlite3" else block_chunks
+        whole = hashlib.blake2b(digest_size=32)
+        chunks: List[List[Any]] = []
+        size = stored = 0
+        with _consistent(path) as source, source.open("rb") as f:
+            for data in chunker(f):
+                digest, added = self._put(data, codec)
+                chunks.append([digest, len(data)])
+                whole.update(data)
+                size += len(data)
+                stored += added
+        entry = {
+            "file": path.name,
+            "size": size,
+            "hash": whole.hexdigest(),
+            "signature": signature,
+            "chunks": chunks,
+        }
+        return entry, stored
+
+    def restore(
+        self, name: str, target: Callable[[str, Dict[str, Any]], Path]
+    ) -> Dict[str, Path]:
+        """Rebuild the files of snapshot ``name`` one chunk at a time.
+
+        ``target`` maps each file's name and manifest entry to the path to
+        write. Every file is checked against its recorded hash before it
+        replaces that path. Returns the paths written.
+        """
+
+        written: Dict[str, Path] = {}
+        for file_name, entry in self.manifest(name)["files"].items():
+            path = target(file_name, entry)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.restore")
+            whole = hashlib.blake2b(digest_size=32)
+            try:
+                with tmp.open("wb") as f:
+                    for digest, _ in entry["chunks"]:
+                        data = self._read(digest)
+                        whole.update(data)
+                        f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                if whole.hexdigest() != entry["hash"]:
+                    raise ValueError(f"Restored {file_name} does not match snapshot")
+                os.replace(tmp, path)
+            finally:
+                tmp.unlink(missing_ok=True)
+            written[file_name] = path
+        return written
+
+    def prune(self, keep: int) -> Tuple[List[str], int]:
+        """Drop all but the newest ``keep`` snapshots and unreferenced chunks.
+
+        Returns the names of the dropped snapshots and the number of chunk
+        files removed.
+        """
+
+        names = self.snapshots()
+        dropped = names[: max(len(names) - keep, 0)]
+        for name in dropped:
+            (self.snapshot_dir / f"{name}.json").unlink()
+        referenced = {
+            digest
+            for name in self.snapshots()
+            for entry in self.manifest(name)["files"].values()
+            for digest, _ in entry["chunks"]
+        }
+        removed = 0
+        if self.chunk_dir.exists():
+            for path in self.chunk_dir.glob("*/*"):
+                if path.name.split(".")[0] not in referenced:
+                    path.unlink()
+                    removed += 1
+        return dropped, removed
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
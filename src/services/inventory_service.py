@@ -1,40 +1,34 @@
 from __future__ import annotations
 
+import base64
 import json
-from typing import Any, Dict, List, Optional
+import re
+from datetime import date, timedelta
+from itertools import count, islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import shortuuid
 
 from src.db import JsonlDB
+from src.db.views import freeze
 from . import product_info_service
 
 
-def _normalize(row: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
-    if row is None:
-        return None
-    data = json.loads(json.dumps(row))  # deep copy
-    return data
-
+def _next_id(inv_db: JsonlDB) -> int:
+    return (inv_db.max_key() or 0) + 1
 
-def _next_id(rows: List[Dict[str, Any]]) -> int:
-    return max((r.get("id", 0) for r in rows), default=0) + 1
 
+def _find_item(inv_db: JsonlDB, product_id: str) -> Optional[Dict[str, Any]]:
+    hit = inv_db.lookup("product_id", str(product_id))
+    return hit[0] if hit else None
 
-def _find_item(
-    items: List[Dict[str, Any]], product_id: str
-) -> Optional[Dict[str, Any]]:
-    for row in items:
-        if row.get("product_id") == product_id:
-            return row
-    return None
 
+def _product_fields(prod_db: JsonlDB, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill an entry's product details from the catalog.
 
-def create_item(
-    inv_db: JsonlDB, prod_db: JsonlDB, data: Dict[str, Any]
-) -> Dict[str, Any]:
-    items = inv_db.read_all()
-    data = data.copy()
-
+    ``product_id`` is ``None`` when the entry refers to a product by UPC
+    only; :func:`_ensure_product` resolves or creates it.
+    """
     product = data.get("product")
     upc = data.get("upc")
     name = data.get("name")
@@ -74,34 +68,61 @@ def create_item(
     else:
         product_id = None
 
-    if product_id is None:
-        if not upc:
-            raise ValueError("UPC required for new item")
-        existing = product_info_service.get_product_info_by_upc(prod_db, upc)
-        if existing:
-            product_id = existing["product_id"]
-            name = name or existing.get("name")
-            container_info = container_info or existing.get("container_info")
-            nutrition = nutrition or existing.get("nutrition")
-            tags = tags or existing.get("tags")
-        else:
-            if not name:
-                raise ValueError("Name required for unknown UPC")
-            new_prod = product_info_service.create_product_info(
-                prod_db,
-                {
-                    "name": name,
-                    "upc": upc,
-                    "container_info": container_info,
-                    "nutrition": nutrition,
-                    "tags": tags,
-                },
-            )
-            product_id = new_prod["product_id"]
-            container_info = new_prod.get("container_info")
-            nutrition = new_prod.get("nutrition")
-            tags = new_prod.get("tags")
+    if product_id is None and not upc:
+        raise ValueError("UPC required for new item")
+    return {
+        "product_id": product_id,
+        "upc": upc,
+        "name": name,
+        "container_info": container_info,
+        "nutrition": nutrition,
+        "tags": tags,
+    }
+
+
+def _ensure_product(prod_db: JsonlDB, fields: Dict[str, Any]) -> Dict[str, Any]:
+    """Resolve a UPC-only entry to a catalog product, creating it if needed.
 
+    Must run inside ``prod_db.mutate`` so concurrent entries for the same
+    unknown UPC share a single product.
+    """
+    if fields["product_id"] is not None:
+        return fields
+    existing = product_info_service.get_product_info_by_upc(prod_db, fields["upc"])
+    if existing:
+        return {
+            **fields,
+            "product_id": existing["product_id"],
+            "name": fields["name"] or existing.get("name"),
+            "container_info": fields["container_info"]
+            or existing.get("container_info"),
+            "nutrition": fields["nutrition"] or existing.get("nutrition"),
+            "tags": fields["tags"] or existing.get("tags"),
+        }
+    if not fields["name"]:
+        raise ValueError("Name required for unknown UPC")
+    new_prod = product_info_service.create_product_info(
+        prod_db,
+        {
+            "name": fields["name"],
+            "upc": fields["upc"],
+            "container_info": fields["container_info"],
+            "nutrition": fields["nutrition"],
+            "tags": fields["tags"],
+        },
+    )
+    return {
+        **fields,
+        "product_id": new_prod["product_id"],
+        "container_info": new_prod.get("container_info"),
+        "nutrition": new_prod.get("nutrition"),
+        "tags": new_prod.get("tags"),
+    }
+
+
+def _new_units(
+    data: Dict[str, Any], container_info: Optional[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
     unit_weight = data.get("weight_g")
     if unit_weight is None and container_info:
         net = container_info.get("net_weight_g")
@@ -122,43 +143,302 @@ def create_item(
             }
         )
         uuid_value = None
+    return units
+
 
-    item = _find_item(items, product_id)
+def _merge_units(
+    inv_db: JsonlDB,
+    fields: Dict[str, Any],
+    units: List[Dict[str, Any]],
+    new_id: Callable[[], int],
+) -> Dict[str, Any]:
+    """Add ``units`` to the product's item. Runs inside ``inv_db.mutate``."""
+    item = _find_item(inv_db, fields["product_id"])
     if item is None:
         item = {
-            "id": _next_id(items),
-            "product_id": product_id,
-            "name": name,
-            "upc": upc,
-            "tags": tags,
-            "container_info": container_info,
-            "nutrition": nutrition,
+            "id": new_id(),
+            "product_id": fields["product_id"],
+            "name": fields["name"],
+            "upc": fields["upc"],
+            "tags": fields["tags"],
+            "container_info": fields["container_info"],
+            "nutrition": fields["nutrition"],
             "units": [],
         }
-        items.append(item)
+    item = {**item, "units": list(item.get("units") or []) + units}
+    inv_db.put(item)
+    return item
+
+
+def create_item(
+    inv_db: JsonlDB, prod_db: JsonlDB, data: Dict[str, Any]
+) -> Dict[str, Any]:
+    fields = _product_fields(prod_db, data)
+    if fields["product_id"] is None:
+        fields = prod_db.mutate(lambda: _ensure_product(prod_db, fields))
+    units = _new_units(data, fields["container_info"])
+    item = inv_db.mutate(
+        lambda: _merge_units(inv_db, fields, units, lambda: _next_id(inv_db))
+    )
+    return freeze(item)
+
+
+def create_items(
+    inv_db: JsonlDB, prod_db: JsonlDB, entries: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Create many items with one catalog commit and one inventory commit.
+
+    Returns one result per entry, in order: ``{"index": i, "item": ...}`` on
+    success or ``{"index": i, "error": ...}`` when the entry was rejected.
+    Rejected entries do not affect the others.
+    """
+    results: List[Dict[str, Any]] = [{"index": i} for i in range(len(entries))]
+    resolved: Dict[int, Dict[str, Any]] = {}
+    for i, data in enumerate(entries):
+        try:
+            resolved[i] = _product_fields(prod_db, data)
+        except ValueError as exc:
+            results[i]["error"] = str(exc)
+
+    def ensure_all() -> None:
+        for i, fields in list(resolved.items()):
+            try:
+                resolved[i] = _ensure_product(prod_db, fields)
+            except ValueError as exc:
+                results[i]["error"] = str(exc)
+                del resolved[i]
+
+    if any(fields["product_id"] is None for fields in resolved.values()):
+        prod_db.mutate(ensure_all)
+
+    def merge_all() -> None:
+        next_ids = count(_next_id(inv_db))
+        for i, fields in resolved.items():
+            units = _new_units(entries[i], fields["container_info"])
+            item = _merge_units(inv_db, fields, units, lambda: next(next_ids))
+            results[i]["item"] = item
+
+    inv_db.mutate(merge_all)
+    for result in results:
+        if "item" in result:
+            result["item"] = freeze(result["item"])
+    return results
+
+
+def consume_unit(inv_db: JsonlDB, uuid: str) -> Optional[Dict[str, Any]]:
+    """Remove the unit with ``uuid`` and return its item, or ``None``.
+
+    The item is kept, possibly without units, so its id stays stable.
+    """
+
+    def consume() -> Optional[Dict[str, Any]]:
+        hit = inv_db.lookup("unit_uuid", str(uuid))
+        if hit is None:
+            return None
+        row, pos = hit
+        units = list(row.get("units") or [])
+        del units[pos]
+        item = {**row, "units": units}
+        inv_db.put(item, op="consume")
+        return item
+
+    return freeze(inv_db.mutate(consume))
+
+
+def delete_item(inv_db: JsonlDB, id_: Any) -> bool:
+    def delete() -> bool:
+        if inv_db.get(int(id_)) is None:
+            return False
+        inv_db.delete(int(id_))
+        return True
+
+    return inv_db.mutate(delete)
 
-    item_units = item.setdefault("units", [])
-    item_units.extend(units)
-    inv_db.write_all(items)
-    return _normalize(item)
+
+def encode_cursor(item_id: int) -> str:
+    """Return an opaque cursor that resumes a listing after ``item_id``."""
+    raw = json.dumps({"after": item_id}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded))["after"])
+    except (ValueError, TypeError, KeyError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def _parse_date(text: Optional[str]) -> Optional[str]:
+    """Return ``text`` as a normalized ISO date, or ``None`` if not given."""
+    if text is None:
+        return None
+    try:
+        return date.fromisoformat(text).isoformat()
+    except (ValueError, TypeError) as exc:
+        raise ValueError("Invalid expires_before, expected an ISO date") from exc
+
+
+# Rows read from the ``id`` index at a time when paging past a cursor.
+_SEEK_ROWS = 256
+
+
+def _rows_after(inv_db: JsonlDB, after: int) -> Iterator[Dict[str, Any]]:
+    """Yield items with ids above ``after`` in id order, seeking by the ``id`` index."""
+    low = after + 1
+    while True:
+        hits = inv_db.lookup_between("id", low=low, limit=_SEEK_ROWS)
+        for row, _ in hits:
+            yield row
+        if len(hits) < _SEEK_ROWS:
+            return
+        low = hits[-1][0]["id"] + 1
+
+
+def _candidates(
+    inv_db: JsonlDB,
+    tags: Optional[List[str]],
+    upc: Optional[str],
+    after: Optional[int] = None,
+) -> Iterable[Dict[str, Any]]:
+    """Narrow the rows to scan through the upc, tag and id indexes."""
+    if not tags and upc is None:
+        return inv_db.iter_rows() if after is None else _rows_after(inv_db, after)
+    lookups = [("upc", upc)] if upc is not None else []
+    lookups += [("tag", tag) for tag in tags or []]
+    matched: Optional[Dict[Any, Dict[str, Any]]] = None
+    for index, value in lookups:
+        rows = {row["id"]: row for row, _ in inv_db.lookup_all(index, str(value))}
+        if matched is not None:
+            rows = {key: row for key, row in rows.items() if key in matched}
+        matched = rows
+        if not matched:
+            return []
+    return [matched[key] for key in sorted(matched)]
+
+
+def _unit_matches(
+    unit: Dict[str, Any], opened: Optional[bool], expires_before: Optional[str]
+) -> bool:
+    if opened is not None and bool(unit.get("opened")) != opened:
+        return False
+    if expires_before is not None:
+        expiration = unit.get("expiration_date")
+        if not expiration or expiration >= expires_before:
+            return False
+    return True
+
+
+def _select(
+    inv_db: JsonlDB,
+    tags: Optional[List[str]] = None,
+    upc: Optional[str] = None,
+    opened: Optional[bool] = None,
+    expires_before: Optional[str] = None,
+    after: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    for row in _candidates(inv_db, tags, upc, after):
+        if after is not None and row.get("id", 0) <= after:
+            continue
+        if upc is not None and row.get("upc") != upc:
+            continue
+        if tags and not set(tags) <= set(row.get("tags") or ()):
+            continue
+        if opened is not None or expires_before is not None:
+            units = [
+                unit
+                for unit in row.get("units") or []
+                if _unit_matches(unit, opened, expires_before)
+            ]
+            if not units:
+                continue
+            row = {**row, "units": units}
+        yield row
+
+
+def list_items(
+    inv_db: JsonlDB,
+    tags: Optional[List[str]] = None,
+    upc: Optional[str] = None,
+    opened: Optional[bool] = None,
+    expires_before: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Return inventory items, optionally filtered.
+
+    ``tags`` must all be present on an item. ``opened`` and
+    ``expires_before`` (an ISO date) apply to units: matching items are
+    returned with only the units that satisfy them.
+    """
+    rows = _select(inv_db, tags, upc, opened, _parse_date(expires_before))
+    return [freeze(row) for row in rows]
+
+
+def page_items(
+    inv_db: JsonlDB,
+    limit: int,
+    cursor: Optional[str] = None,
+    **filters: Any,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Return up to ``limit`` items after ``cursor`` and the next cursor.
+
+    Items are ordered by id. ``filters`` are those accepted by
+    :func:`list_items`. The next cursor is ``None`` on the last page.
+    """
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    after = _decode_cursor(cursor) if cursor else None
+    if filters.get("expires_before") is not None:
+        filters["expires_before"] = _parse_date(filters["expires_before"])
+    rows = list(islice(_select(inv_db, after=after, **filters), limit + 1))
+    next_cursor = encode_cursor(rows[limit - 1]["id"]) if len(rows) > limit else None
+    return [freeze(row) for row in rows[:limit]], next_cursor
+
+
+_WINDOW = re.compile(r"^\s*(\d+)\s*([dw]?)\s*$")
+
+
+def parse_window(text: str) -> timedelta:
+    """Parse a window such as ``3d``, ``2w`` or ``5`` (days) into a timedelta."""
+    match = _WINDOW.match(text or "")
+    if not match:
+        raise ValueError("Invalid window, expected e.g. 3d or 2w")
+    amount, unit = int(match.group(1)), match.group(2)
+    return timedelta(weeks=amount) if unit == "w" else timedelta(days=amount)
+
+
+def expiring_units(
+    inv_db: JsonlDB, within: timedelta, today: Optional[date] = None
+) -> List[Dict[str, Any]]:
+    """Return units that expire on or before ``today + within``, soonest first.
+
+    Units that have already expired are included. Each entry is the unit
+    together with the ``item_id``, ``product_id`` and ``name`` of its item.
+    Served from the sorted ``expires`` index, so the cost depends on the
+    number of matching units rather than on the size of the inventory.
+    """
+    cutoff = (today or date.today()) + within + timedelta(days=1)
+    units = []
+    for row, pos in inv_db.lookup_between("expires", high=cutoff.isoformat()):
+        units.append(
+            {
+                "item_id": row.get("id"),
+                "product_id": row.get("product_id"),
+                "name": row.get("name"),
+                **row["units"][pos],
+            }
+        )
+    return [freeze(unit) for unit in units]
 
 
-def list_items(inv_db: JsonlDB) -> List[Dict[str, Any]]:
-    return [_normalize(row) for row in inv_db.read_all()]
+def iter_item_lines(inv_db: JsonlDB) -> Iterator[bytes]:
+    """Yield the inventory as raw NDJSON chunks for streaming responses."""
+    return inv_db.iter_lines()
 
 
 def get_item_by_id(inv_db: JsonlDB, id_: Any) -> Optional[Dict[str, Any]]:
-    items = inv_db.read_all()
-    for row in items:
-        if row.get("id") == int(id_):
-            return _normalize(row)
-    return None
+    return freeze(inv_db.get(int(id_)))
 
 
 def get_item_by_unit_uuid(inv_db: JsonlDB, uuid: str) -> Optional[Dict[str, Any]]:
-    items = inv_db.read_all()
-    for row in items:
-        for unit in row.get("units", []):
-            if str(unit.get("uuid")) == str(uuid):
-                return _normalize(row)
-    return None
+    hit = inv_db.lookup("unit_uuid", str(uuid))
+    return freeze(hit[0]) if hit else None
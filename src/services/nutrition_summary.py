@@ -0,0 +1,16 @@
+"""Nutrition totals across the inventory."""
+
+from __future__ import annotations
+
+from typing import Any, Dict
+
+from src.db import JsonlDB
+
+
+def nutrition_summary(inv_db: JsonlDB) -> Dict[str, Any]:
+    """Summarize nutrition on hand across every unit of the inventory.
+
+    Reads the totals the database keeps up to date on every write (see
+    :class:`src.db.rollups.Rollups`) rather than walking the units.
+    """
+    return inv_db.read_index("rollups", lambda rollups: rollups.summary())
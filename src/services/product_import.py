@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import json
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import shortuuid
+
+from src.db import JsonlDB
+from src.utils.nutrition import filter_nutrition_batch
+
+PRODUCT_FIELDS = ("name", "upc", "product_id", "tags", "container_info", "nutrition")
+
+
+def iter_ndjson(path: Path) -> Iterator[Any]:
+    """Stream JSON values from an NDJSON file, yielding ``None`` for bad lines."""
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                yield None
+
+
+def _normalize_batch(batch: List[Any]) -> List[Optional[Dict[str, Any]]]:
+    rows: List[Optional[Dict[str, Any]]] = []
+    for raw in batch:
+        if not isinstance(raw, dict):
+            rows.append(None)
+            continue
+        row = {k: raw[k] for k in PRODUCT_FIELDS if k in raw and k != "product_id"}
+        if "upc" in row and row["upc"] is not None:
+            row["upc"] = str(row["upc"])
+        rows.append(row)
+    with_nutrition = [row for row in rows if row is not None and "nutrition" in row]
+    normalized = filter_nutrition_batch(row["nutrition"] for row in with_nutrition)
+    for row, nutrition in zip(with_nutrition, normalized):
+        row["nutrition"] = nutrition
+    return rows
+
+
+def import_products(
+    db: JsonlDB,
+    source: Iterable[Any],
+    batch_size: int = 5000,
+    progress: Optional[Callable[[Dict[str, int]], None]] = None,
+) -> Dict[str, int]:
+    """Upsert catalog rows from ``source`` and write the catalog once.
+
+    Rows are normalized ``batch_size`` at a time and matched on UPC against
+    both the existing catalog and earlier rows of the same import: a match
+    updates the fields present in the input and keeps its ``product_id``,
+    anything else becomes a new product. Entries that are not JSON objects
+    are counted as skipped. ``progress`` receives the running counts after
+    every batch. Returns the final counts.
+    """
+    counts = {"read": 0, "created": 0, "updated": 0, "skipped": 0}
+
+    def run() -> Dict[str, int]:
+        catalog: Dict[Any, Dict[str, Any]] = {}
+        by_upc: Dict[str, Any] = {}
+        for row in db.read_all():
+            key = row.get("product_id")
+            catalog[key] = row
+            if row.get("upc") is not None:
+                by_upc.setdefault(str(row["upc"]), key)
+
+        entries = iter(source)
+        while True:
+            batch = list(islice(entries, batch_size))
+            if not batch:
+                break
+            for row in _normalize_batch(batch):
+                counts["read"] += 1
+                if row is None:
+                    counts["skipped"] += 1
+                    continue
+                key = by_upc.get(row["upc"]) if row.get("upc") else None
+                if key is not None:
+                    catalog[key] = {**catalog[key], **row}
+                    counts["updated"] += 1
+                    continue
+                key = shortuuid.uuid()
+                catalog[key] = {
+                    field: key if field == "product_id" else row.get(field)
+                    for field in PRODUCT_FIELDS
+                }
+                if row.get("upc"):
+                    by_upc[row["upc"]] = key
+                counts["created"] += 1
+            if progress is not None:
+                progress(dict(counts))
+
+        if counts["created"] or counts["updated"]:
+            # The catalog is far too large to log whole; see JsonlDB.write_all.
+            db.write_all(list(catalog.values()), log=False)
+        return counts
+
+    return db.mutate(run)
@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import json
 from typing import Any, Dict, List, Optional
 
 from src.utils.nutrition import filter_nutrition
@@ -8,17 +7,7 @@ from src.utils.nutrition import filter_nutrition
 import shortuuid
 
 from src.db import JsonlDB
-
-
-def _normalize(row: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
-    if row is None:
-        return None
-    data = dict(row)
-    if "nutrition" in data and data["nutrition"] is not None:
-        data["nutrition"] = json.loads(json.dumps(data["nutrition"]))
-    if "tags" in data and data["tags"] is not None:
-        data["tags"] = json.loads(json.dumps(data["tags"]))
-    return data
+from src.db.views import freeze
 
 
 def _next_id(rows: List[Dict[str, Any]]) -> int:
@@ -26,7 +15,6 @@ def _next_id(rows: List[Dict[str, Any]]) -> int:
 
 
 def create_product_info(db: JsonlDB, data: Dict[str, Any]) -> Dict[str, Any]:
-    rows = db.read_all()
     item = {
         "name": data.get("name"),
         "upc": data.get("upc"),
@@ -35,57 +23,63 @@ def create_product_info(db: JsonlDB, data: Dict[str, Any]) -> Dict[str, Any]:
         "container_info": data.get("container_info"),
         "nutrition": filter_nutrition(data.get("nutrition")),
     }
-    rows.append(item)
-    db.write_all(rows)
-    return _normalize(item)
+    db.put(item)
+    return freeze(item)
 
 
 def get_product_info_by_id(db: JsonlDB, id_: Any) -> Optional[Dict[str, Any]]:
-    rows = db.read_all()
-    for row in rows:
-        if str(row.get("product_id")) == str(id_):
-            return _normalize(row)
-    return None
+    return freeze(db.get(str(id_)))
 
 
 def get_product_info_by_upc(db: JsonlDB, upc: str) -> Optional[Dict[str, Any]]:
-    rows = db.read_all()
-    for row in rows:
-        if row.get("upc") == upc:
-            return _normalize(row)
-    return None
+    hit = db.lookup("upc", str(upc))
+    return freeze(hit[0]) if hit else None
+
+
+def search_products(db: JsonlDB, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """Return up to ``limit`` products whose name or tags match ``query``.
+
+    Best matches come first; see :class:`src.db.search.TextIndex`. Each
+    product carries its match ``score``.
+    """
+    hits = db.read_index("search", lambda index: index.search(query, limit))
+    results = []
+    for key, score in hits:
+        row = db.get(key)
+        if row is not None:
+            results.append(freeze({**row, "score": score}))
+    return results
 
 
 def list_product_info(db: JsonlDB) -> List[Dict[str, Any]]:
-    return [_normalize(row) for row in db.read_all()]
+    return [freeze(row) for row in db.read_all()]
 
 
 def update_product_info(
     db: JsonlDB, id_: Any, data: Dict[str, Any]
 ) -> Optional[Dict[str, Any]]:
-    rows = db.read_all()
-    updated = None
-    for row in rows:
-        if str(row.get("product_id")) == str(id_):
-
-            row_update = data.copy()
-            if "nutrition" in row_update:
-                row_update["nutrition"] = filter_nutrition(row_update["nutrition"])
-            if "tags" in row_update:
-                row_update["tags"] = row_update["tags"]
-            row.update(row_update)
-            updated = row
-            break
-    if updated is None:
-        return None
-    db.write_all(rows)
-    return _normalize(updated)
+    row_update = data.copy()
+    if "nutrition" in row_update:
+        row_update["nutrition"] = filter_nutrition(row_update["nutrition"])
+    if "tags" in row_update:
+        row_update["tags"] = row_update["tags"]
+
+    def update() -> Optional[Dict[str, Any]]:
+        row = db.get(str(id_))
+        if row is None:
+            return None
+        updated = {**row, **row_update}
+        db.put(updated)
+        return updated
+
+    return freeze(db.mutate(update))
 
 
 def delete_product_info(db: JsonlDB, id_: Any) -> bool:
-    rows = db.read_all()
-    new_rows = [row for row in rows if str(row.get("product_id")) != str(id_)]
-    if len(new_rows) == len(rows):
-        return False
-    db.write_all(new_rows)
-    return True
+    def delete() -> bool:
+        if db.get(str(id_)) is None:
+            return False
+        db.delete(str(id_))
+        return True
+
+    return db.mutate(delete)
@@ -2,7 +2,7 @@
 
 from __future__ import annotations
 
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 # Supported nutrient keys grouped by category
 SERVING_FIELDS = {"size_g", "calories"}
@@ -48,38 +48,125 @@ MICRO_FIELDS = {
     "zinc",
 }
 
+# Fixed order used when nutrients are handled as vectors.
+NUTRIENT_COLUMNS: Tuple[str, ...] = (
+    ("calories",) + tuple(sorted(MACRO_FIELDS)) + tuple(sorted(MICRO_FIELDS))
+)
+_COLUMN = {name: i for i, name in enumerate(NUTRIENT_COLUMNS)}
+_SECTIONS = ("serving", "macros", "micronutrients")
 
-def _filter_section(data: Dict[str, Any], allowed: set[str]) -> Dict[str, Any]:
-    return {k: v for k, v in data.items() if k in allowed}
+
+def to_number(value: Any) -> Optional[float]:
+    """Return ``value`` as a float, or ``None`` when it is not numeric."""
+    if type(value) in (int, float):
+        return float(value)
+    if isinstance(value, bool) or value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def per_gram(info: Optional[Dict[str, Any]]) -> Iterator[Tuple[int, float]]:
+    """Yield ``(column, amount per gram)`` for each nutrient in ``info``.
+
+    ``info`` is in the nested format and columns index
+    :data:`NUTRIENT_COLUMNS`. Nothing is yielded without a serving size.
+    """
+    if not info:
+        return
+    size = to_number((info.get("serving") or {}).get("size_g"))
+    if not size:
+        return
+    for section in _SECTIONS:
+        for name, value in (info.get(section) or {}).items():
+            column = _COLUMN.get(name)
+            if column is None:
+                continue
+            amount = to_number(value)
+            if amount is not None:
+                yield column, amount / size
+
+
+# Alternative spellings accepted on input and stored under the canonical name.
+NUTRIENT_ALIASES = {
+    "thiamin_b1": "thiamin",
+    "riboflavin_b2": "riboflavin",
+}
+
+_SECTION_FIELDS = dict(zip(_SECTIONS, (SERVING_FIELDS, MACRO_FIELDS, MICRO_FIELDS)))
+
+
+def _section_table(fields: set[str]) -> Dict[str, str]:
+    table = {name: name for name in fields}
+    table.update((a, c) for a, c in NUTRIENT_ALIASES.items() if c in fields)
+    return table
+
+
+# Per section of the nested format: its allowed names and a table from
+# every accepted input key to the canonical name.
+_NESTED = tuple(
+    (section, frozenset(fields), _section_table(fields))
+    for section, fields in _SECTION_FIELDS.items()
+)
+
+
+def _flat_table() -> Dict[str, Tuple[int, str]]:
+    table = {
+        "serving_size": (0, "size_g"),
+        "size_g": (0, "size_g"),
+        "calories": (0, "calories"),
+    }
+    for pos, (section, _, names) in enumerate(_NESTED):
+        if section != "serving":
+            table.update((key, (pos, name)) for key, name in names.items())
+    return table
+
+
+# Input key -> (section position, canonical name) for the flat format.
+_FLAT = _flat_table()
+
+
+def _normalize(info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    result: Dict[str, Any] = {}
+    if "serving" in info or "macros" in info or "micronutrients" in info:
+        for section, fields, table in _NESTED:
+            data = info.get(section)
+            if not data:
+                continue
+            if data.keys() <= fields:
+                # Already canonical: no per-key work needed.
+                result[section] = dict(data)
+                continue
+            get = table.get
+            out = {name: v for k, v in data.items() if (name := get(k)) is not None}
+            if out:
+                result[section] = out
+        return result or None
+
+    sections: Tuple[Dict[str, Any], ...] = ({}, {}, {})
+    flat = _FLAT
+    for key, value in info.items():
+        target = flat.get(key)
+        if target is not None:
+            sections[target[0]][target[1]] = value
+    for section, out in zip(_SECTIONS, sections):
+        if out:
+            result[section] = out
+    return result or None
 
 
 def filter_nutrition(info: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
     """Normalize nutrition data into the new nested format."""
     if info is None:
         return None
+    return _normalize(info)
 
-    if any(k in info for k in ("serving", "macros", "micronutrients")):
-        serving = _filter_section(info.get("serving", {}), SERVING_FIELDS)
-        macros = _filter_section(info.get("macros", {}), MACRO_FIELDS)
-        micros = _filter_section(info.get("micronutrients", {}), MICRO_FIELDS)
-    else:
-        serving = {}
-        macros = {}
-        micros = {}
-        for key, value in info.items():
-            if key in {"serving_size", "size_g"}:
-                serving["size_g"] = value
-            elif key == "calories":
-                serving["calories"] = value
-            elif key in MACRO_FIELDS:
-                macros[key] = value
-            elif key in MICRO_FIELDS:
-                micros[key] = value
-    result: Dict[str, Any] = {}
-    if serving:
-        result["serving"] = serving
-    if macros:
-        result["macros"] = macros
-    if micros:
-        result["micronutrients"] = micros
-    return result or None
+
+def filter_nutrition_batch(
+    infos: Iterable[Optional[Dict[str, Any]]],
+) -> List[Optional[Dict[str, Any]]]:
+    """Normalize many nutrition payloads, as :func:`filter_nutrition` does."""
+    normalize = _normalize
+    return [normalize(info) if info is not None else None for info in infos]
@@ -6,16 +6,16 @@ import pytest
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from src.db import JsonlDB
+from src.db import JsonlDB, open_inventory_db, open_product_db
 
 
 @pytest.fixture()
 def inventory_db(tmp_path) -> Generator[JsonlDB, None, None]:
-    db = JsonlDB(tmp_path / "inventory.ndjson")
+    db = open_inventory_db(tmp_path / "inventory.ndjson")
     yield db
 
 
 @pytest.fixture()
 def product_db(tmp_path) -> Generator[JsonlDB, None, None]:
-    db = JsonlDB(tmp_path / "product-info.ndjson")
+    db = open_product_db(tmp_path / "product-info.ndjson")
     yield db
@@ -0,0 +1,59 @@
+import asyncio
+import threading
+
+from src.db import JsonlDB
+from src.db.aio import Storage
+
+
+def test_cache_hits_are_served_inline(tmp_path):
+    db = JsonlDB(tmp_path / "rows.ndjson", key="id")
+    db.put({"id": 1, "name": "a"})
+    storage = Storage(workers=1)
+
+    async def main():
+        assert (await storage.read(db, db.get, 1))["name"] == "a"
+        assert storage.stats()["inline"] == 1
+
+        # A change on disk means the cache cannot answer until reloaded.
+        with db.path.open("a") as f:
+            f.write('{"id": 2, "name": "b"}\n')
+        assert (await storage.read(db, db.get, 2))["name"] == "b"
+        assert storage.stats()["offloaded"] == 1
+
+        # Neither can it while a writer holds the lock.
+        held, release = threading.Event(), threading.Event()
+
+        def writer():
+            with db._lock:
+                held.set()
+                release.wait()
+
+        threading.Thread(target=writer).start()
+        held.wait()
+        pending = asyncio.ensure_future(storage.read(db, db.get, 1))
+        await asyncio.sleep(0.01)
+        assert not pending.done()
+        release.set()
+        assert (await pending)["name"] == "a"
+        assert storage.stats()["offloaded"] == 2
+
+    asyncio.run(main())
+
+
+def test_queue_depth_is_reported():
+    storage = Storage(workers=1)
+    gate = threading.Event()
+
+    async def main():
+        calls = [asyncio.ensure_future(storage.run(gate.wait)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        stats = storage.stats()
+        assert (stats["running"], stats["queued"]) == (1, 2)
+        gate.set()
+        await asyncio.gather(*calls)
+        assert storage.stats()["queued"] == 0
+
+        chunks = [chunk async for chunk in storage.iterate(iter([b"a", b"b"]))]
+        assert chunks == [b"a", b"b"]
+
+    asyncio.run(main())
@@ -1,3 +1,5 @@
+import json
+
 from fastapi.testclient import TestClient
 
 from src.api.app import (
@@ -58,3 +60,234 @@ def test_create_item_with_quantity(inventory_db, product_db):
     assert len(data["units"]) == 2
 
     app.dependency_overrides.clear()
+
+
+def test_get_item_by_uuid(inventory_db, product_db):
+    app.dependency_overrides[app_inventory_conn] = lambda: inventory_db
+    app.dependency_overrides[app_product_conn] = lambda: product_db
+    client = TestClient(app)
+
+    prod = setup_product(product_db)
+    created = client.post(
+        "/inventory",
+        json={"product": prod["product_id"], "quantity": 2},
+    ).json()
+    uuid = created["units"][1]["uuid"]
+
+    resp = client.get(f"/inventory/uuid/{uuid}")
+    assert resp.status_code == 200
+    assert resp.json()["id"] == created["id"]
+
+    resp = client.get(f"/inventory/{created['id']}")
+    assert resp.status_code == 200
+    assert resp.json()["product_id"] == prod["product_id"]
+
+    assert client.get("/inventory/uuid/missing").status_code == 404
+
+    app.dependency_overrides.clear()
+
+
+def test_list_items_as_ndjson(inventory_db, product_db):
+    app.dependency_overrides[app_inventory_conn] = lambda: inventory_db
+    app.dependency_overrides[app_product_conn] = lambda: product_db
+    client = TestClient(app)
+
+    prod = setup_product(product_db)
+    client.post("/inventory", json={"product": prod["product_id"]})
+    client.post("/inventory", json={"upc": "222", "name": "Rice"})
+    client.post("/inventory", json={"product": prod["product_id"]})
+
+    resp = client.get("/inventory", headers={"Accept": "application/x-ndjson"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    assert [row["name"] for row in rows] == ["Bread", "Rice"]
+    assert len(rows[0]["units"]) == 2
+
+    app.dependency_overrides.clear()
+
+
+def test_list_items_paginated(inventory_db, product_db):
+    app.dependency_overrides[app_inventory_conn] = lambda: inventory_db
+    app.dependency_overrides[app_product_conn] = lambda: product_db
+    client = TestClient(app)
+
+    for upc in ("1", "2", "3"):
+        client.post("/inventory", json={"upc": upc, "name": upc, "tags": ["dry"]})
+
+    resp = client.get("/inventory", params={"limit": 2, "tags": "dry"})
+    assert [item["upc"] for item in resp.json()] == ["1", "2"]
+    cursor = resp.headers["X-Next-Cursor"]
+
+    resp = client.get("/inventory", params={"limit": 2, "cursor": cursor})
+    assert [item["upc"] for item in resp.json()] == ["3"]
+    assert "X-Next-Cursor" not in resp.headers
+
+    assert client.get("/inventory", params={"cursor": "bogus"}).status_code == 400
+    assert client.get("/inventory?expires_before=zzz").status_code == 400
+    assert client.get("/inventory", params={"upc": "9"}).json() == []
+
+    app.dependency_overrides.clear()
+
+
+def test_bulk_create(inventory_db, product_db):
+    app.dependency_overrides[app_inventory_conn] = lambda: inventory_db
+    app.dependency_overrides[app_product_conn] = lambda: product_db
+    client = TestClient(app)
+
+    prod = setup_product(product_db)
+    entries = [
+        {"product": prod["product_id"], "quantity": 2},
+        {"upc": "222", "name": "Rice"},
+        {"upc": "333"},
+        {"product": prod["product_id"]},
+        "not an object",
+        {"upc": "444", "name": "Oats", "quantity": "many"},
+    ]
+    resp = client.post("/inventory/bulk", json=entries)
+    assert resp.status_code == 200
+    results = resp.json()
+    assert [r["index"] for r in results] == [0, 1, 2, 3, 4, 5]
+    assert results[2]["error"] == "Name required for unknown UPC"
+    assert results[4]["error"] == "entry must be a JSON object"
+    assert results[5]["error"] == "Invalid entry"
+    [detail] = results[5]["detail"]
+    assert detail["loc"] == ["body", 5, "quantity"]
+    assert detail["type"] == "int_parsing"
+    assert detail["input"] == "many"
+    assert len(results[3]["item"]["units"]) == 3
+
+    body = "\n".join(json.dumps(e) for e in entries[:2]) + "\n"
+    resp = client.post(
+        "/inventory/bulk",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert all("item" in r for r in resp.json())
+
+    items = client.get("/inventory").json()
+    assert [len(item["units"]) for item in items] == [5, 2]
+
+    app.dependency_overrides.clear()
+
+
+def test_list_expiring(inventory_db, product_db):
+    from datetime import date, timedelta
+
+    app.dependency_overrides[app_inventory_conn] = lambda: inventory_db
+    app.dependency_overrides[app_product_conn] = lambda: product_db
+    client = TestClient(app)
+
+    soon = (date.today() + timedelta(days=2)).isoformat()
+    later = (date.today() + timedelta(days=30)).isoformat()
+    client.post(
+        "/inventory", json={"upc": "1", "name": "Milk", "expiration_date": soon}
+    )
+    client.post(
+        "/inventory", json={"upc": "2", "name": "Rice", "expiration_date": later}
+    )
+
+    resp = client.get("/inventory/expiring", params={"within": "3d"})
+    assert resp.status_code == 200
+    assert [(u["name"], u["expiration_date"]) for u in resp.json()] == [("Milk", soon)]
+    assert len(client.get("/inventory/expiring?within=5w").json()) == 2
+    assert client.get("/inventory/expiring?within=later").status_code == 400
+
+    app.dependency_overrides.clear()
+
+
+def test_nutrition_summary(inventory_db, product_db):
+    app.dependency_overrides[app_inventory_conn] = lambda: inventory_db
+    app.dependency_overrides[app_product_conn] = lambda: product_db
+    client = TestClient(app)
+
+    prod = setup_product(product_db)
+    client.post("/inventory", json={"product": prod["product_id"], "quantity": 3})
+
+    resp = client.get("/inventory/nutrition-summary")
+    assert resp.status_code == 200
+    assert (resp.json()["units"], resp.json()["grams"]) == (3, 300)
+
+    app.dependency_overrides.clear()
+
+
+def test_consume_and_delete(inventory_db, product_db):
+    app.dependency_overrides[app_inventory_conn] = lambda: inventory_db
+    app.dependency_overrides[app_product_conn] = lambda: product_db
+    client = TestClient(app)
+
+    prod = setup_product(product_db)
+    item = client.post(
+        "/inventory", json={"product": prod["product_id"], "quantity": 2}
+    ).json()
+    uuid = item["units"][0]["uuid"]
+
+    resp = client.post(f"/inventory/uuid/{uuid}/consume")
+    assert resp.status_code == 200
+    assert len(resp.json()["units"]) == 1
+    assert client.post(f"/inventory/uuid/{uuid}/consume").status_code == 404
+    assert client.get("/inventory/nutrition-summary").json()["units"] == 1
+
+    assert client.delete(f"/inventory/{item['id']}").status_code == 204
+    assert client.delete(f"/inventory/{item['id']}").status_code == 404
+    assert client.get("/inventory/nutrition-summary").json()["units"] == 0
+
+    app.dependency_overrides.clear()
+
+
+def test_etag_revalidation(inventory_db, product_db):
+    app.dependency_overrides[app_inventory_conn] = lambda: inventory_db
+    app.dependency_overrides[app_product_conn] = lambda: product_db
+    client = TestClient(app)
+
+    client.post("/inventory", json={"upc": "1", "name": "Milk"})
+    first = client.get("/inventory")
+    etag = first.headers["ETag"]
+    assert etag.startswith('"')
+
+    resp = client.get("/inventory", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.content == b""
+    assert (
+        client.get("/inventory/1", headers={"If-None-Match": etag}).status_code == 200
+    )
+
+    client.post("/inventory", json={"upc": "2", "name": "Rice"})
+    resp = client.get("/inventory", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+    assert len(resp.json()) == 2
+
+    app.dependency_overrides.clear()
+
+
+def test_search_products(product_db):
+    app.dependency_overrides[app_product_conn] = lambda: product_db
+    client = TestClient(app)
+    setup_product(product_db)
+
+    resp = client.get("/products/search", params={"q": "bre"})
+    assert resp.status_code == 200
+    assert [p["name"] for p in resp.json()] == ["Bread"]
+    assert client.get("/products/search", params={"q": "tea"}).json() == []
+    assert client.get("/products/search", params={"q": ""}).status_code == 422
+
+    app.dependency_overrides.clear()
+
+
+def test_response_cache_evicts_least_recently_used():
+    from fastapi import Response
+
+    from src.api.cache import ResponseCache
+
+    cache = ResponseCache(max_bytes=10)
+    cache.put("a", 1, Response(b"aaaa"))
+    cache.put("b", 1, Response(b"bbbb"))
+    assert cache.get("a", 1).body == b"aaaa"
+    cache.put("c", 1, Response(b"cccc"))
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) is not None
+    assert cache.get("a", 2) is None
+    cache.put("big", 1, Response(b"x" * 11))
+    assert cache.get("big", 1) is None
+    assert cache.size == 8
@@ -0,0 +1,133 @@
+import json
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from src.db import JsonlDB, open_inventory_db
+from src.db.sqlite import SqliteDB
+from src.db.wal import MutationLog, rows_as_of
+from src.services.backup import BackupStore, line_chunks
+
+NOW = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def _write_rows(path, rows):
+    with path.open("w") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+
+
+def _rows(start, stop):
+    return [
+        {"id": i, "name": f"item {i}", "pad": "x" * 200} for i in range(start, stop)
+    ]
+
+
+def test_chunk_boundaries_survive_edits(tmp_path):
+    path = tmp_path / "rows.ndjson"
+    _write_rows(path, _rows(0, 5000))
+    with path.open("rb") as f:
+        before = set(line_chunks(f))
+    _write_rows(path, _rows(0, 10) + [{"id": "new"}] + _rows(10, 5000))
+    with path.open("rb") as f:
+        after = list(line_chunks(f))
+
+    assert len(before) > 5
+    # Only the chunk holding the inserted row differs.
+    assert len([chunk for chunk in after if chunk not in before]) == 1
+
+
+def test_snapshots_share_unchanged_chunks(tmp_path):
+    data = tmp_path / "inventory.ndjson"
+    _write_rows(data, _rows(0, 5000))
+    store = BackupStore(tmp_path / "backups")
+
+    first = store.create({"inventory": data}, now=NOW)
+    assert first["stored"] > 0
+    assert store.create({"inventory": data}, now=NOW)["stored"] == 0
+
+    with data.open("a") as f:
+        f.write(json.dumps({"id": 5000}) + "\n")
+    third = store.create({"inventory": data}, codec="lzma", now=NOW)
+    assert 0 < third["stored"] < first["stored"] / 5
+    assert store.snapshots() == [
+        "20240101_120000",
+        "20240101_120000-2",
+        "20240101_120000-3",
+    ]
+
+    out = tmp_path / "restored"
+    written = store.restore(first["name"], lambda name, entry: out / entry["file"])
+    assert written["inventory"].read_text().count("\n") == 5000
+    store.restore(third["name"], lambda name, entry: out / entry["file"])
+    assert (out / "inventory.ndjson").read_bytes() == data.read_bytes()
+
+
+def test_restore_rejects_corrupt_chunks(tmp_path):
+    data = tmp_path / "inventory.ndjson"
+    _write_rows(data, _rows(0, 10))
+    store = BackupStore(tmp_path / "backups")
+    name = store.create({"inventory": data})["name"]
+    (chunk,) = store.chunk_dir.glob("*/*")
+    chunk.write_bytes(chunk.read_bytes()[:-8] + b"\0" * 8)
+
+    with pytest.raises((OSError, ValueError)):
+        store.restore(name, lambda name, entry: tmp_path / "out.ndjson")
+    assert not (tmp_path / "out.ndjson").exists()
+
+
+def test_sqlite_snapshot_and_prune(tmp_path):
+    db = SqliteDB(tmp_path / "inventory.sqlite3", key="id")
+    for row in _rows(0, 100):
+        db.put(row)
+    store = BackupStore(tmp_path / "backups")
+    old = store.create({"inventory": db.path}, now=NOW)["name"]
+    db.delete(0)
+    new = store.create({"inventory": db.path}, now=NOW)["name"]
+
+    dropped, removed = store.prune(keep=1)
+    assert dropped == [old]
+    assert removed > 0
+    store.restore(new, lambda name, entry: tmp_path / "out" / entry["file"])
+    restored = SqliteDB(tmp_path / "out" / "inventory.sqlite3", key="id")
+    assert restored.read_all() == db.read_all()
+
+
+def test_restored_jsonl_is_readable(tmp_path):
+    db = JsonlDB(tmp_path / "inventory.ndjson", key="id", append_only=True)
+    db.put({"id": 1})
+    db.put({"id": 1, "name": "milk"})
+    store = BackupStore(tmp_path / "backups")
+    name = store.create({"inventory": db.path})["name"]
+
+    store.restore(name, lambda name, entry: tmp_path / "out" / entry["file"])
+    restored = JsonlDB(tmp_path / "out" / "inventory.ndjson", key="id")
+    assert restored.read_all() == [{"id": 1, "name": "milk"}]
+
+
+def test_restore_is_not_undone_by_the_mutation_log(monkeypatch, tmp_path):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path / "data"))
+    monkeypatch.setenv("BACKUP_DIR", str(tmp_path / "backups"))
+    script = Path(__file__).resolve().parents[1] / "scripts" / "backup.py"
+    path = tmp_path / "data" / "inventory.ndjson"
+    path.parent.mkdir()
+    (path.parent / "product-info.ndjson").touch()
+
+    open_inventory_db(path).put({"id": 1, "name": "milk"})
+    subprocess.run([sys.executable, str(script)], check=True)
+    snapshot = BackupStore(tmp_path / "backups").snapshots()[0]
+    files = BackupStore(tmp_path / "backups").manifest(snapshot)["files"]
+    # The log keeps what recovery from the snapshot replays.
+    assert MutationLog(path).kept == files["inventory"]["wal_seq"] + 1
+    open_inventory_db(path).put({"id": 2, "name": "eggs"})
+    subprocess.run(
+        [sys.executable, str(script), "restore", snapshot, "--force"], check=True
+    )
+
+    assert open_inventory_db(path).read_all() == [{"id": 1, "name": "milk"}]
+    # The restore is part of the history that recovery replays.
+    log = MutationLog(path)
+    assert rows_as_of(log, "id", 10**12) == [{"id": 1, "name": "milk"}]
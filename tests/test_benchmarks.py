@@ -0,0 +1,31 @@
+from benchmarks.bench_storage import compare, parse_size, run_size
+from benchmarks.generate import generate, inventory, products
+
+
+def test_generator_is_deterministic(tmp_path):
+    first = generate(tmp_path / "a", 20, seed=3)
+    second = generate(tmp_path / "b", 20, seed=3)
+    assert [p.read_bytes() for p in first] == [p.read_bytes() for p in second]
+
+    catalog = list(products(20, seed=3))
+    items = list(inventory(catalog, seed=3))
+    assert len({p["upc"] for p in catalog}) == 20
+    assert [item["product_id"] for item in items] == [p["product_id"] for p in catalog]
+    assert all(1 <= len(item["units"]) <= 12 for item in items)
+
+
+def test_run_size_and_compare(tmp_path):
+    generate(tmp_path / "data", 30)
+    size = run_size(30, tmp_path / "data", tmp_path / "run", ops=5, writes=2)
+    assert size["timings"]["lookup_unit_uuid"]["ops"] == 5
+    assert size["timings"]["create_item"]["ops"] == 2
+
+    current = {"sizes": {"30": size}}
+    slower = {
+        case: {**timing, "per_op": timing["per_op"] * 3}
+        for case, timing in size["timings"].items()
+    }
+    assert compare(current, current, 0.2) == []
+    regressions = compare(current, {"sizes": {"30": {"timings": slower}}}, 0.2)
+    assert any("create_item" in line for line in regressions)
+    assert parse_size("100k") == 100_000 and parse_size("1m") == 1_000_000
@@ -0,0 +1,400 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from src.db import MISS, TOMBSTONE, JsonlDB
+from src.db.index import SortedIndex, field, unit_expirations, unit_uuids
+from src.db.search import TextIndex
+
+
+def test_append_only_folds_records(tmp_path):
+    db = JsonlDB(tmp_path / "rows.ndjson", key="id", append_only=True)
+    db.put({"id": 1, "name": "a"})
+    db.put({"id": 2, "name": "b"})
+    db.put({"id": 1, "name": "c"})
+    db.delete(2)
+
+    lines = (tmp_path / "rows.ndjson").read_text().splitlines()
+    assert len(lines) == 4
+    assert json.loads(lines[-1]) == {"id": 2, TOMBSTONE: True}
+    assert db.read_all() == [{"id": 1, "name": "c"}]
+    assert db.dead_records == 3
+
+
+def test_rewrite_mode_put_and_delete(tmp_path):
+    db = JsonlDB(tmp_path / "rows.ndjson", key="id")
+    db.put({"id": 1, "name": "a"})
+    db.put({"id": 1, "name": "b"})
+    db.put({"id": 2, "name": "c"})
+    db.delete(1)
+
+    assert (tmp_path / "rows.ndjson").read_text() == '{"id": 2, "name": "c"}\n'
+
+
+def test_compact_keeps_live_rows(tmp_path):
+    db = JsonlDB(tmp_path / "rows.ndjson", key="id", append_only=True)
+    for i in range(5):
+        db.put({"id": 1, "value": i})
+    db.put({"id": 2, "value": 0})
+    db.compact()
+
+    assert db.read_all() == [{"id": 1, "value": 4}, {"id": 2, "value": 0}]
+    assert len((tmp_path / "rows.ndjson").read_text().splitlines()) == 2
+    assert db.dead_records == 0
+
+
+def test_append_repairs_torn_last_line(tmp_path):
+    path = tmp_path / "rows.ndjson"
+    path.write_text('{"id": 1}\n{"id": 2, "na')
+    db = JsonlDB(path, key="id", append_only=True)
+    db.put({"id": 3})
+
+    assert db.read_all() == [{"id": 1}, {"id": 3}]
+
+
+def test_cache_reloads_on_external_change(tmp_path):
+    path = tmp_path / "rows.ndjson"
+    db = JsonlDB(path, key="id", append_only=True)
+    db.put({"id": 1})
+    assert db.read_all() == [{"id": 1}]
+    assert db.read_all() == [{"id": 1}]
+    assert db.stats["cache_misses"] == 1
+    assert db.stats["cache_hits"] >= 2
+
+    path.write_text('{"id": 1}\n{"id": 22}\n')
+    assert db.read_all() == [{"id": 1}, {"id": 22}]
+    assert db.stats["cache_misses"] == 2
+
+
+def test_indexes_follow_writes(tmp_path):
+    db = JsonlDB(
+        tmp_path / "rows.ndjson",
+        key="id",
+        append_only=True,
+        indexes={"upc": field("upc"), "unit_uuid": unit_uuids},
+    )
+    db.put({"id": 1, "upc": "111", "units": [{"uuid": "a"}, {"uuid": "b"}]})
+    db.put({"id": 2, "upc": "222", "units": []})
+
+    assert db.lookup("upc", "222")[0]["id"] == 2
+    row, pos = db.lookup("unit_uuid", "b")
+    assert (row["id"], pos) == (1, 1)
+
+    db.put({"id": 1, "upc": "333", "units": [{"uuid": "b"}]})
+    assert db.lookup("upc", "111") is None
+    assert db.lookup("unit_uuid", "a") is None
+    assert db.lookup("unit_uuid", "b")[1] == 0
+
+    db.delete(2)
+    assert db.lookup("upc", "222") is None
+    assert db.get(1)["upc"] == "333"
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_sorted_index_range_follows_writes(tmp_path, lazy):
+    def open_db():
+        return JsonlDB(
+            tmp_path / "rows.ndjson",
+            key="id",
+            append_only=True,
+            indexes={"expires": SortedIndex(unit_expirations)},
+            lazy=lazy,
+        )
+
+    def expiring(db, low=None, high=None):
+        return [
+            (row["id"], pos) for row, pos in db.lookup_between("expires", low, high)
+        ]
+
+    db = open_db()
+    db.put({"id": 1, "units": [{"expiration_date": "2025-03"}, {}]})
+    db.put({"id": 2, "units": [{"expiration_date": "2025-01"}]})
+    db.put({"id": 3, "units": [{"expiration_date": "2025-02"}]})
+    assert expiring(db) == [(2, 0), (3, 0), (1, 0)]
+    assert expiring(db, "2025-02", "2025-03") == [(3, 0)]
+
+    db.put({"id": 2, "units": [{}, {"expiration_date": "2025-04"}]})
+    db.delete(3)
+    assert expiring(db, high="2025-04") == [(1, 0)]
+    assert expiring(open_db()) == [(1, 0), (2, 1)]
+
+
+def test_failed_mutation_is_rolled_back(tmp_path):
+    db = JsonlDB(tmp_path / "rows.ndjson", key="id", append_only=True)
+    db.put({"id": 1, "name": "a"})
+
+    def broken():
+        db.put({"id": 1, "name": "b"})
+        db.put({"id": 2, "name": "c"})
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        db.mutate(broken)
+
+    assert db.read_all() == [{"id": 1, "name": "a"}]
+    assert len((tmp_path / "rows.ndjson").read_text().splitlines()) == 1
+
+
+def test_rewrite_is_atomic_and_synced(tmp_path):
+    db = JsonlDB(tmp_path / "rows.ndjson", key="id")
+    db.write_all([{"id": 1}, {"id": 2}])
+
+    assert [p.name for p in tmp_path.iterdir()] == ["rows.ndjson"]
+    assert db.read_all() == [{"id": 1}, {"id": 2}]
+    assert db.stats["fsyncs"] >= 1
+
+
+@pytest.mark.parametrize("policy, expected", [("always", 3), ("never", 0)])
+def test_fsync_policy(tmp_path, policy, expected):
+    db = JsonlDB(tmp_path / "rows.ndjson", key="id", append_only=True, fsync=policy)
+    for i in range(3):
+        db.put({"id": i})
+    assert db.stats["fsyncs"] == expected
+
+
+def test_batched_fsync_coalesces(tmp_path):
+    db = JsonlDB(
+        tmp_path / "rows.ndjson",
+        key="id",
+        append_only=True,
+        fsync="batched",
+        fsync_interval=60,
+    )
+    for i in range(3):
+        db.put({"id": i})
+    assert db.stats["fsyncs"] == 1
+
+
+def test_max_key_follows_writes(tmp_path):
+    db = JsonlDB(tmp_path / "rows.ndjson", key="id", append_only=True)
+    assert db.max_key() is None
+    for i in (3, 1, 7):
+        db.put({"id": i})
+    assert db.max_key() == 7
+    db.put({"id": 9})
+    db.delete(3)
+    assert db._max == 9
+    db.delete(9)
+    assert db.max_key() == 7
+
+    def fail():
+        db.put({"id": 12})
+        raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        db.mutate(fail)
+    assert db.max_key() == 7
+
+
+def test_lazy_lookups_decode_single_rows(tmp_path):
+    path = tmp_path / "rows.ndjson"
+    db = JsonlDB(
+        path, key="id", append_only=True, indexes={"upc": field("upc")}, lazy=True
+    )
+    db.put({"id": "a", "upc": "111"})
+    db.put({"id": "b", "upc": "222"})
+    db.put({"id": "a", "upc": "333"})
+    db.delete("b")
+
+    assert db.get("a") == {"id": "a", "upc": "333"}
+    assert db.get("b") is None
+    assert db.lookup("upc", "111") is None
+    assert db.lookup("upc", "333")[0]["id"] == "a"
+    assert db.stats["cache_misses"] == 0
+
+    reopened = JsonlDB(
+        path, key="id", append_only=True, indexes={"upc": field("upc")}, lazy=True
+    )
+    assert reopened.get("a") == {"id": "a", "upc": "333"}
+    assert reopened._offsets.rebuilds == 0
+
+
+def test_lazy_search_index_is_refilled_not_persisted(tmp_path):
+    path = tmp_path / "rows.ndjson"
+
+    def open_db():
+        return JsonlDB(
+            path,
+            key="id",
+            append_only=True,
+            indexes={"upc": field("upc"), "search": TextIndex()},
+            lazy=True,
+        )
+
+    open_db().write_all(
+        [{"id": "a", "upc": "1", "name": "Whole Milk"}, {"id": "b", "name": "Bread"}]
+    )
+    saved = json.loads(path.with_name(path.name + ".idx").read_text())
+    assert list(saved["indexes"]) == ["upc"]
+
+    reopened = open_db()
+    reopened.put({"id": "c", "name": "Chocolate Milk"})
+    reopened.delete("b")
+    found = reopened.read_index("search", lambda index: index.search("milk"))
+    assert [key for key, _ in found] == ["a", "c"]
+    assert reopened.read_index("search", len) == 2
+    assert reopened.lookup("upc", "1")[0]["id"] == "a"
+    assert reopened._offsets.rebuilds == 0
+
+
+def test_lazy_index_catches_up_and_rebuilds(tmp_path):
+    path = tmp_path / "rows.ndjson"
+    db = JsonlDB(path, key="id", append_only=True, lazy=True)
+    db.put({"id": 1, "v": "x"})
+    assert db.get(1) == {"id": 1, "v": "x"}
+
+    with path.open("a") as f:
+        f.write('{"id": 2, "v": "y"}\n')
+    assert db.get(2) == {"id": 2, "v": "y"}
+    assert db._offsets.rebuilds == 1
+
+    path.write_text('{"id": 3, "v": "z"}\n')
+    assert db.get(1) is None
+    assert db.get(3) == {"id": 3, "v": "z"}
+    assert db._offsets.rebuilds == 2
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_iter_lines_streams_live_rows(tmp_path, lazy):
+    path = tmp_path / "rows.ndjson"
+    path.write_text('{"id": 1, "v": "a"}\n\n{"id":2,"v":"b"}\n')
+    db = JsonlDB(path, key="id", append_only=True, lazy=lazy)
+
+    assert b"".join(db.iter_lines()) == b'{"id": 1, "v": "a"}\n{"id":2,"v":"b"}\n'
+
+    db.put({"id": 1, "v": "c"})
+    lines = b"".join(db.iter_lines(chunk_rows=1)).splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"id": 1, "v": "c"},
+        {"id": 2, "v": "b"},
+    ]
+    # Live lines are copied as written even with superseded records around.
+    assert lines[1] == b'{"id":2,"v":"b"}'
+    assert list(db.iter_rows()) == [{"id": 1, "v": "c"}, {"id": 2, "v": "b"}]
+
+    db.put({"id": 3, "v": "d"})
+    db.delete(1)
+    reopened = JsonlDB(path, key="id", append_only=True, lazy=lazy)
+    for current in (db, reopened):
+        lines = b"".join(current.iter_lines(chunk_rows=1)).splitlines()
+        assert lines == [b'{"id":2,"v":"b"}', b'{"id": 3, "v": "d"}']
+
+
+def test_iter_lines_reads_the_file_its_spans_describe(tmp_path):
+    path = tmp_path / "rows.ndjson"
+    db = JsonlDB(path, key="id", append_only=True, compact_min_dead=1000)
+    for i in range(4):
+        db.put({"id": i, "v": "old"})
+    db.put({"id": 0, "v": "new"})
+    reading = db._reading
+    swaps = []
+
+    def compact_first(*args):
+        # Another compaction swaps the file just as the stream opens it.
+        if not swaps:
+            swaps.append(True)
+            db.compact()
+        return reading(*args)
+
+    db._reading = compact_first
+    lines = b"".join(db.iter_lines()).splitlines()
+    assert swaps
+    assert [json.loads(line) for line in lines] == db.read_all()
+
+
+def test_shared_instances_see_each_others_writes(tmp_path):
+    path = tmp_path / "rows.ndjson"
+    a = JsonlDB(path, key="id", append_only=True, shared=True)
+    b = JsonlDB(path, key="id", append_only=True, shared=True)
+    a.put({"id": 1})
+    assert b.read_all() == [{"id": 1}]
+    version = b.version
+
+    b.put({"id": 2})
+    assert b.version != version
+    assert a.if_cached(a.read_all) is MISS
+    assert a.read_all() == [{"id": 1}, {"id": 2}]
+    assert a.stats["cache_misses"] == 2
+
+    b.put({"id": 1, "v": 1})
+    b.compact()
+    assert a.read_all() == [{"id": 1, "v": 1}, {"id": 2}]
+
+
+def test_reload_reads_only_appended_records(tmp_path):
+    path = tmp_path / "rows.ndjson"
+    a = JsonlDB(
+        path, key="id", append_only=True, shared=True, indexes={"upc": field("upc")}
+    )
+    b = JsonlDB(path, key="id", append_only=True, shared=True)
+    for i in range(10):
+        b.put({"id": i, "upc": str(i)})
+    assert len(a.read_all()) == 10
+
+    b.put({"id": 3, "upc": "x"})
+    b.delete(4)
+    assert len(a.read_all()) == 9
+    assert a.stats["rows_read"] == 12
+    assert a.lookup("upc", "x")[0]["id"] == 3
+    assert a.lookup("upc", "3") is None
+
+    # A file rewritten in place, rather than appended to, is read in full.
+    path.write_text('{"id": 7, "upc": "y"}\n' + " " * 600 + "\n")
+    b.put({"id": 8})
+    assert a.read_all() == [{"id": 7, "upc": "y"}, {"id": 8}]
+    assert a.stats["rows_read"] == 14
+
+
+WRITER = """
+import sys
+from pathlib import Path
+from src.db import JsonlDB
+
+db = JsonlDB(Path(sys.argv[1]), key="id", append_only=True, shared=True)
+for i in range(50):
+    db.mutate(lambda: db.put({"id": sys.argv[2] + str(i), "pad": "x" * 4000}))
+"""
+
+
+def test_shared_writers_in_separate_processes(tmp_path):
+    path = tmp_path / "rows.ndjson"
+    procs = [
+        subprocess.Popen([sys.executable, "-c", WRITER, str(path), name])
+        for name in "abcd"
+    ]
+    assert [proc.wait(timeout=60) for proc in procs] == [0] * 4
+
+    db = JsonlDB(path, key="id", append_only=True, shared=True)
+    assert len(db.read_all()) == 200
+    assert db._bad_lines == 0
+    assert db._shared.generation == 200
+
+
+def test_text_index_ranks_matches():
+    index = TextIndex()
+    index.add(1, {"name": "Organic Whole Milk", "tags": ["dairy"]})
+    index.add(2, {"name": "Milk", "tags": []})
+    index.add(3, {"name": "Milky Way Bar", "tags": ["candy"]})
+    index.add(4, {"name": "Crème Brûlée", "tags": ["dairy", "dessert"]})
+
+    assert [key for key, _ in index.search("milk")] == [2, 1, 3]
+    assert [key for key, _ in index.search("org mi")] == [1]
+    assert [key for key, _ in index.search("creme brul")] == [4]
+    assert [key for key, _ in index.search("dairy")] == [4, 1]
+    assert [key for key, _ in index.search("mlik")] == []
+    assert [key for key, _ in index.search("chocolatee milk")] == []
+    assert index.search("milk", limit=1) == [(2, 1.0)]
+
+    index.add(5, {"name": "Chocolate Milk"})
+    assert [key for key, _ in index.search("chocolat milk")] == [5]
+    assert [key for key, _ in index.search("choclate")] == [5]
+
+    index.remove(2, {})
+    index.remove(3, {})
+    index.add(1, {"name": "Skim Milk"})
+    assert [key for key, _ in index.search("milk")] == [1, 5]
+    assert index.search("organic") == []
+    # With no prefix matches left, "milky" falls back to similar words.
+    assert [key for key, _ in index.search("milky")] == [1, 5]
@@ -1,3 +1,5 @@
+import json
+
 import pytest
 from src.services import inventory_service, product_info_service
 
@@ -35,3 +37,155 @@ def test_create_and_group_units(inventory_db, product_db):
     items = inventory_service.list_items(inventory_db)
     assert len(items) == 1
     assert len(items[0]["units"]) == 2
+
+
+def test_concurrent_creates_keep_every_unit(inventory_db, product_db):
+    from concurrent.futures import ThreadPoolExecutor
+
+    prod = setup_product(product_db)
+
+    def create(i):
+        data = {"upc": "789", "name": "Eggs"}
+        if i % 2:
+            data = {"product": prod["product_id"]}
+        return inventory_service.create_item(inventory_db, product_db, data)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(create, range(40)))
+
+    items = inventory_service.list_items(inventory_db)
+    assert sorted(item["id"] for item in items) == [1, 2]
+    assert sum(len(item["units"]) for item in items) == 40
+    assert len(product_db.read_all()) == 2
+    assert inventory_db.stats["commits"] < 40
+
+
+def test_filter_and_page_items(inventory_db, product_db):
+    for upc, tags in (("1", ["frozen"]), ("2", ["frozen", "meat"]), ("3", ["canned"])):
+        inventory_service.create_item(
+            inventory_db,
+            product_db,
+            {"upc": upc, "name": f"Item {upc}", "tags": tags, "quantity": 2},
+        )
+    inventory_service.create_item(
+        inventory_db,
+        product_db,
+        {"upc": "2", "opened": True, "expiration_date": "2024-05-01"},
+    )
+
+    frozen = inventory_service.list_items(inventory_db, tags=["frozen"])
+    assert [item["upc"] for item in frozen] == ["1", "2"]
+    both = inventory_service.list_items(inventory_db, tags=["frozen", "meat"])
+    assert [item["upc"] for item in both] == ["2"]
+    assert inventory_service.list_items(inventory_db, upc="3")[0]["tags"] == ["canned"]
+
+    opened = inventory_service.list_items(inventory_db, opened=True)
+    assert len(opened) == 1 and len(opened[0]["units"]) == 1
+    expiring = inventory_service.list_items(inventory_db, expires_before="2025-01-01")
+    assert [unit["expiration_date"] for unit in expiring[0]["units"]] == ["2024-05-01"]
+
+    page, cursor = inventory_service.page_items(inventory_db, 2)
+    assert [item["id"] for item in page] == [1, 2]
+    page, cursor = inventory_service.page_items(inventory_db, 2, cursor)
+    assert [item["id"] for item in page] == [3]
+    assert cursor is None
+
+    with pytest.raises(ValueError):
+        inventory_service.page_items(inventory_db, 2, "not-a-cursor")
+    with pytest.raises(ValueError):
+        inventory_service.list_items(inventory_db, expires_before="zzz")
+
+
+def test_pages_after_a_cursor_seek_by_id(inventory_db, product_db, monkeypatch):
+    entries = [
+        {"upc": str(i), "name": f"Can {i}", "opened": i % 3 == 0} for i in range(600)
+    ]
+    inventory_service.create_items(inventory_db, product_db, entries)
+    page, cursor = inventory_service.page_items(inventory_db, 250)
+
+    def scan():
+        raise AssertionError("paging after a cursor scanned every row")
+
+    monkeypatch.setattr(inventory_db, "iter_rows", scan)
+    ids = [item["id"] for item in page]
+    while cursor:
+        page, cursor = inventory_service.page_items(inventory_db, 250, cursor)
+        ids += [item["id"] for item in page]
+    assert ids == list(range(1, 601))
+
+    cursor = inventory_service.encode_cursor(1)
+    page, _ = inventory_service.page_items(inventory_db, 300, cursor, opened=True)
+    assert [item["id"] for item in page] == list(range(4, 601, 3))
+
+
+def test_create_items_commits_once(inventory_db, product_db):
+    prod = setup_product(product_db)
+    entries = [{"product": prod["product_id"]} for _ in range(20)]
+    entries += [{"upc": str(i), "name": f"Can {i}"} for i in range(20)]
+    commits = inventory_db.stats["commits"], product_db.stats["commits"]
+
+    results = inventory_service.create_items(inventory_db, product_db, entries)
+
+    assert all("item" in r for r in results)
+    assert inventory_db.stats["commits"] == commits[0] + 1
+    assert product_db.stats["commits"] == commits[1] + 1
+    assert len(inventory_service.list_items(inventory_db)) == 21
+    assert len(inventory_service.get_item_by_id(inventory_db, 1)["units"]) == 20
+
+
+def test_expiring_units_in_date_order(inventory_db, product_db):
+    from datetime import date, timedelta
+
+    prod = setup_product(product_db)
+    for expiration in ("2025-01-09", "2025-01-02", None, "2025-01-04T08:00"):
+        data = {"product": prod["product_id"]}
+        if expiration:
+            data["expiration_date"] = expiration
+        inventory_service.create_item(inventory_db, product_db, data)
+    inventory_service.create_item(
+        inventory_db,
+        product_db,
+        {"upc": "9", "name": "Jam", "expiration_date": "2024-12-30"},
+    )
+
+    units = inventory_service.expiring_units(
+        inventory_db, timedelta(days=3), today=date(2025, 1, 1)
+    )
+    assert [u["expiration_date"] for u in units] == [
+        "2024-12-30",
+        "2025-01-02",
+        "2025-01-04T08:00",
+    ]
+    assert [u["name"] for u in units] == ["Jam", "Milk", "Milk"]
+    assert units[1]["item_id"] == 1
+
+    assert inventory_service.parse_window("2w") == timedelta(days=14)
+    assert inventory_service.parse_window("5") == timedelta(days=5)
+    with pytest.raises(ValueError):
+        inventory_service.parse_window("soon")
+
+
+def test_results_are_read_only_views(inventory_db, product_db):
+    from src.db.views import thaw
+
+    prod = setup_product(product_db)
+    item = inventory_service.create_item(
+        inventory_db, product_db, {"product": prod["product_id"], "quantity": 2}
+    )
+    with pytest.raises(TypeError):
+        item["name"] = "Cream"
+    with pytest.raises(TypeError):
+        item["units"][0]["opened"] = True
+    with pytest.raises(AttributeError):
+        item["units"].append({})
+
+    listed = inventory_service.list_items(inventory_db)[0]
+    assert listed == item
+    assert listed == json.loads(json.dumps(thaw(item)))
+    assert inventory_service.get_item_by_id(inventory_db, item["id"])["units"][1] == {
+        **item["units"][1]
+    }
+
+    copy = thaw(item)
+    copy["units"][0]["opened"] = True
+    assert not inventory_db.get(item["id"])["units"][0]["opened"]
@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from benchmarks.generate import generate
+from benchmarks.load import asgi_client, drive, parse_mix, percentile
+
+
+def test_drive_app_in_process(monkeypatch, tmp_path):
+    generate(tmp_path, 20)
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+
+    async def run():
+        async with asgi_client() as client:
+            return await drive(client, 60, 4, parse_mix("create=1,list=1,lookup=2"))
+
+    report = asyncio.run(run())
+    assert report["requests"] == 60
+    endpoints = report["endpoints"]
+    assert set(endpoints) == {
+        "POST /inventory",
+        "GET /inventory",
+        "GET /inventory/uuid/{uuid}",
+    }
+    assert all(e["errors"] == 0 for e in endpoints.values())
+    assert (
+        endpoints["POST /inventory"]["p50_ms"] <= endpoints["POST /inventory"]["p99_ms"]
+    )
+
+
+def test_mix_and_percentiles():
+    assert parse_mix("lookup=3,create") == {"lookup": 3.0, "create": 1.0}
+    with pytest.raises(ValueError):
+        parse_mix("delete=1")
+    ordered = [float(i) for i in range(1, 101)]
+    assert [percentile(ordered, q) for q in (50, 95, 99)] == [50.0, 95.0, 99.0]
+    assert percentile([], 50) == 0.0
@@ -0,0 +1,71 @@
+from fastapi.testclient import TestClient
+
+from src.api.app import app, inventory_conn, product_conn
+from src.db import JsonlDB
+from src.metrics import Exposition, Histogram
+
+
+def _samples(text):
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, _, value = line.rpartition(" ")
+            samples[name] = float(value)
+    return samples
+
+
+def test_histogram_exposition():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+    out = Exposition()
+    out.histogram("t_seconds", "Test.", [({"route": '/a"b'}, histogram)])
+    out.metric("t_total", "counter", "Test.", [(None, 7)])
+
+    samples = _samples(out.text())
+    assert samples['t_seconds_bucket{route="/a\\"b",le="0.1"}'] == 2
+    assert samples['t_seconds_bucket{route="/a\\"b",le="1.0"}'] == 3
+    assert samples['t_seconds_bucket{route="/a\\"b",le="+Inf"}'] == 4
+    assert samples['t_seconds_count{route="/a\\"b"}'] == 4
+    assert samples['t_seconds_sum{route="/a\\"b"}'] == 3.65
+    assert samples["t_total"] == 7
+    assert "# TYPE t_seconds histogram" in out.text()
+
+
+def test_metrics_endpoint(inventory_db, product_db):
+    app.dependency_overrides[inventory_conn] = lambda: inventory_db
+    app.dependency_overrides[product_conn] = lambda: product_db
+    client = TestClient(app)
+
+    created = client.post("/inventory", json={"upc": "1", "name": "Milk"}).json()
+    client.get(f"/inventory/{created['id']}")
+    client.get(f"/inventory/{created['id']}")
+    client.get("/inventory/999")
+    resp = client.get("/metrics")
+    app.dependency_overrides.clear()
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples = _samples(resp.text)
+    route = 'method="GET",route="/inventory/{item_id}"'
+    assert samples[f'http_request_duration_seconds_count{{{route},status="200"}}'] >= 2
+    assert samples[f'http_request_duration_seconds_count{{{route},status="404"}}'] >= 1
+    commits = samples['db_commits_total{db="inventory"}']
+    assert commits >= 1
+    assert samples['db_write_duration_seconds_count{db="inventory"}'] == commits
+    size = inventory_db.path.stat().st_size
+    assert samples['db_file_bytes{db="inventory",file="data"}'] == size
+    assert "storage_queue_wait_seconds_count" in samples
+    assert "response_cache_hits_total" in samples
+
+
+def test_parse_errors_are_counted(tmp_path):
+    path = tmp_path / "rows.ndjson"
+    path.write_text('{"id": 1}\nnot json\n[1]\n{"id": 2}\n')
+    db = JsonlDB(path, key="id")
+
+    assert len(db.read_all()) == 2
+    assert db.stats["parse_errors"] == 2
+    assert db.stats["rows_read"] == 2
+    assert db.stats["bytes_read"] == path.stat().st_size
+    assert db.timings["read"].snapshot()[0][-1] == 1
@@ -0,0 +1,25 @@
+from src.utils.nutrition import filter_nutrition, filter_nutrition_batch
+
+
+def test_aliases_are_stored_under_canonical_names():
+    flat = {"size_g": 30, "protein": 4, "thiamin_b1": 0.2, "bogus": 1}
+    nested = {
+        "serving": {"calories": 80, "bogus": 1},
+        "micronutrients": {"riboflavin_b2": 0.3, "zinc": 2},
+    }
+    assert filter_nutrition(flat) == {
+        "serving": {"size_g": 30},
+        "macros": {"protein": 4},
+        "micronutrients": {"thiamin": 0.2},
+    }
+    assert filter_nutrition(nested) == {
+        "serving": {"calories": 80},
+        "micronutrients": {"riboflavin": 0.3, "zinc": 2},
+    }
+    assert filter_nutrition({"bogus": 1}) is None
+    assert filter_nutrition_batch([flat, None, nested, {}]) == [
+        filter_nutrition(flat),
+        None,
+        filter_nutrition(nested),
+        None,
+    ]
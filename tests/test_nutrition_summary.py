@@ -0,0 +1,122 @@
+import pytest
+
+from benchmarks.bench_nutrition_summary import recompute
+from src.db import open_inventory_db
+from src.services import inventory_service
+from src.services.nutrition_summary import nutrition_summary
+
+
+def test_totals_scale_by_unit_grams(inventory_db, product_db):
+    milk = {
+        "upc": "1",
+        "name": "Milk",
+        "tags": ["dairy", "cold"],
+        "container_info": {"net_weight_g": 1000, "empty_container_weight_g": 50},
+        "nutrition": {
+            "serving": {"size_g": 250, "calories": 150},
+            "macros": {"protein": 8, "sodium": "0.1"},
+        },
+    }
+    inventory_service.create_item(inventory_db, product_db, {**milk, "quantity": 2})
+    # Half drunk: weighed at 500 g, of which 50 g is the bottle.
+    inventory_service.create_item(
+        inventory_db, product_db, {**milk, "weight_g": 500, "opened": True}
+    )
+    inventory_service.create_item(
+        inventory_db,
+        product_db,
+        {
+            "upc": "2",
+            "name": "Ice",
+            "tags": ["cold"],
+            "container_info": {"net_weight_g": 200},
+        },
+    )
+
+    summary = nutrition_summary(inventory_db)
+    assert summary["units"] == 4
+    assert summary["grams"] == 2650
+    assert summary["nutrients"] == {
+        "calories": pytest.approx(1470),
+        "protein": pytest.approx(78.4),
+        "sodium": pytest.approx(0.98),
+    }
+    assert set(summary["by_tag"]) == {"cold", "dairy"}
+    assert summary["by_tag"]["cold"]["units"] == 4
+    assert summary["by_tag"]["cold"]["grams"] == 2650
+    assert summary["by_tag"]["dairy"]["grams"] == 2450
+    assert summary["by_tag"]["dairy"]["nutrients"]["protein"] == pytest.approx(78.4)
+
+
+def test_empty_inventory(inventory_db):
+    assert nutrition_summary(inventory_db) == {
+        "units": 0,
+        "grams": 0.0,
+        "nutrients": {},
+        "by_tag": {},
+    }
+
+
+def _stock(inventory_db, product_db):
+    for upc, tags, weight in (("1", ["a"], 300), ("2", ["a", "b"], None)):
+        inventory_service.create_item(
+            inventory_db,
+            product_db,
+            {
+                "upc": upc,
+                "name": upc,
+                "tags": tags,
+                "quantity": 2,
+                "weight_g": weight,
+                "container_info": {"net_weight_g": 100},
+                "nutrition": {"serving": {"size_g": 50, "calories": 20}},
+            },
+        )
+
+
+def test_rollups_follow_every_mutation(inventory_db, product_db):
+    _stock(inventory_db, product_db)
+    assert nutrition_summary(inventory_db) == recompute(inventory_db)
+    assert nutrition_summary(inventory_db)["grams"] == 800
+
+    uuid = inventory_db.get(1)["units"][0]["uuid"]
+    inventory_service.consume_unit(inventory_db, uuid)
+    assert nutrition_summary(inventory_db)["units"] == 3
+    assert inventory_service.delete_item(inventory_db, 2)
+
+    summary = nutrition_summary(inventory_db)
+    assert summary == recompute(inventory_db)
+    assert summary["grams"] == 300
+    assert summary["nutrients"] == {"calories": 120}
+    assert set(summary["by_tag"]) == {"a"}
+
+
+def test_rollups_survive_restart_without_loading(inventory_db, product_db):
+    _stock(inventory_db, product_db)
+    expected = nutrition_summary(inventory_db)
+
+    reopened = open_inventory_db(inventory_db.path)
+    assert nutrition_summary(reopened) == expected
+    assert reopened.stats["cache_misses"] == 0
+
+    # A change made behind the database's back invalidates the saved totals.
+    with inventory_db.path.open("a") as f:
+        f.write('{"id": 9, "units": [{"weight_g": 5}]}\n')
+    reopened = open_inventory_db(inventory_db.path)
+    assert nutrition_summary(reopened)["units"] == expected["units"] + 1
+    assert reopened.stats["cache_misses"] == 1
+
+
+def test_rollups_are_saved_only_when_the_file_changes(inventory_db, product_db):
+    _stock(inventory_db, product_db)
+    saved = inventory_db.path.with_name(inventory_db.path.name + ".rollups")
+    inode = saved.stat().st_ino
+
+    reopened = open_inventory_db(inventory_db.path)
+    reopened.read_all()
+    assert reopened.stats["cache_misses"] == 1
+    assert saved.stat().st_ino == inode
+
+    saved.unlink()
+    open_inventory_db(inventory_db.path).read_all()
+    assert saved.exists()
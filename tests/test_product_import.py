@@ -0,0 +1,47 @@
+import json
+
+from src.db.wal import MutationLog, log_dir
+from src.services import product_info_service
+from src.services.product_import import import_products, iter_ndjson
+
+
+def test_import_upserts_on_upc(product_db, tmp_path):
+    existing = product_info_service.create_product_info(
+        product_db, {"name": "Old Beans", "upc": "100", "tags": ["canned"]}
+    )
+    source = tmp_path / "dump.ndjson"
+    lines = [
+        {"name": "Beans", "upc": 100, "nutrition": {"calories": 90, "bogus": 1}},
+        {"name": "Corn", "upc": "200"},
+        "not a product",
+        {"name": "Sweet Corn", "upc": "200"},
+    ]
+    source.write_text("\n".join(json.dumps(line) for line in lines) + "\n{broken\n")
+    seen = []
+
+    counts = import_products(
+        product_db, iter_ndjson(source), batch_size=2, progress=seen.append
+    )
+
+    assert counts == {"read": 5, "created": 1, "updated": 2, "skipped": 2}
+    assert [c["read"] for c in seen] == [2, 4, 5]
+    beans = product_info_service.get_product_info_by_upc(product_db, "100")
+    assert beans["product_id"] == existing["product_id"]
+    assert beans["name"] == "Beans"
+    assert beans["tags"] == ["canned"]
+    assert beans["nutrition"] == {"serving": {"calories": 90}}
+    corn = product_info_service.get_product_info_by_upc(product_db, "200")
+    assert corn["name"] == "Sweet Corn"
+    assert list(corn) == [
+        "name",
+        "upc",
+        "product_id",
+        "tags",
+        "container_info",
+        "nutrition",
+    ]
+    assert len(product_info_service.list_product_info(product_db)) == 2
+    # Only a marker is logged for the rewritten catalog, not its rows.
+    if log_dir(product_db.path).exists():
+        ops = [r["op"] for r in MutationLog(product_db.path).records()]
+        assert ops == ["create", "rewrite"]
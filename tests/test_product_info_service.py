@@ -81,3 +81,53 @@ def test_product_key_order(product_db):
         "container_info",
         "nutrition",
     ]
+
+
+def test_search_products_follows_writes(product_db):
+    milk = product_info_service.create_product_info(
+        product_db, {"name": "Whole Milk", "tags": ["dairy"]}
+    )
+    product_info_service.create_product_info(product_db, {"name": "Oat Milk"})
+    product_info_service.create_product_info(product_db, {"name": "Milky Bar"})
+
+    results = product_info_service.search_products(product_db, "milk", limit=2)
+    assert [r["name"] for r in results] == ["Oat Milk", "Whole Milk"]
+    assert results[0]["score"] == 1.0
+
+    product_info_service.update_product_info(
+        product_db, milk["product_id"], {"name": "Skim Milk"}
+    )
+    product_info_service.delete_product_info(product_db, results[0]["product_id"])
+    names = [r["name"] for r in product_info_service.search_products(product_db, "mil")]
+    assert names == ["Skim Milk", "Milky Bar"]
+    assert product_info_service.search_products(product_db, "whole") == []
+
+
+def test_concurrent_updates_and_delete(product_db):
+    from concurrent.futures import ThreadPoolExecutor
+
+    created = product_info_service.create_product_info(
+        product_db, {"name": "Tea", "upc": "1"}
+    )
+    product_id = created["product_id"]
+
+    def update(i):
+        return product_info_service.update_product_info(
+            product_db, product_id, {f"field_{i}": i}
+        )
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(update, range(40)))
+
+    row = product_info_service.get_product_info_by_id(product_db, product_id)
+    assert all(row[f"field_{i}"] == i for i in range(40))
+
+    def update_or_delete(i):
+        if i == 10:
+            return product_info_service.delete_product_info(product_db, product_id)
+        return update(i)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(update_or_delete, range(40)))
+
+    assert product_info_service.get_product_info_by_id(product_db, product_id) is None
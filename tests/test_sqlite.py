@@ -0,0 +1,130 @@
+import json
+
+import pytest
+
+from benchmarks.bench_nutrition_summary import recompute
+from src.db import JsonlDB, open_inventory_db, open_product_db
+from src.db.index import SortedIndex, field, item_ids, unit_expirations, unit_uuids
+from src.db.sqlite import SqliteDB, migrate
+from src.services import inventory_service
+from src.services.nutrition_summary import nutrition_summary
+
+
+@pytest.fixture()
+def sqlite_env(monkeypatch, tmp_path):
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    return tmp_path
+
+
+def test_keyed_rows_and_indexes(tmp_path):
+    db = SqliteDB(
+        tmp_path / "rows.sqlite3",
+        key="id",
+        indexes={
+            "upc": field("upc"),
+            "unit_uuid": unit_uuids,
+            "expires": SortedIndex(unit_expirations),
+        },
+    )
+    db.put({"id": 1, "upc": "a", "units": [{"uuid": "u1"}]})
+    db.put({"id": 2, "upc": "b", "units": [{"uuid": "u2"}]})
+    db.put(
+        {
+            "id": 1,
+            "upc": "a",
+            "units": [{"uuid": "u3"}, {"uuid": "u4", "expiration_date": "2024-01-02"}],
+        }
+    )
+    db.put({"id": 3, "upc": "a", "units": [{"expiration_date": "2024-01-01"}]})
+    db.delete(2)
+
+    assert [row["id"] for row in db.read_all()] == [1, 3]
+    assert db.get(2) is None
+    assert db.max_key() == 3
+    assert db.lookup("unit_uuid", "u4") == (db.get(1), 1)
+    assert db.lookup("unit_uuid", "u1") is None
+    assert [row["id"] for row, _ in db.lookup_all("upc", "a")] == [1, 3]
+    assert [(row["id"], pos) for row, pos in db.lookup_between("expires")] == [
+        (3, 0),
+        (1, 1),
+    ]
+    assert db.lookup_between("expires", high="2024-01-02")[0][0]["id"] == 3
+    lines = b"".join(db.iter_lines(chunk_rows=1)).splitlines()
+    assert [json.loads(line)["id"] for line in lines] == [1, 3]
+
+
+def test_failed_mutation_is_rolled_back(tmp_path):
+    db = SqliteDB(tmp_path / "rows.sqlite3", key="id", indexes={"upc": field("upc")})
+    db.put({"id": 1, "upc": "a"})
+    version = db.version
+
+    def fail():
+        db.put({"id": 1, "upc": "b"})
+        db.put({"id": 2, "upc": "c"})
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        db.mutate(fail)
+
+    assert db.read_all() == [{"id": 1, "upc": "a"}]
+    assert db.lookup("upc", "b") is None
+    assert db.version == version
+
+
+def test_services_and_rollups_on_sqlite(sqlite_env):
+    inv_db = open_inventory_db(sqlite_env / "inventory.ndjson")
+    prod_db = open_product_db(sqlite_env / "product-info.ndjson")
+    assert isinstance(inv_db, SqliteDB)
+    assert inv_db.path.name == "inventory.sqlite3"
+
+    entry = {
+        "upc": "1",
+        "name": "Milk",
+        "tags": ["dairy"],
+        "container_info": {"net_weight_g": 1000},
+        "nutrition": {"serving": {"size_g": 100}, "macros": {"protein": 3}},
+    }
+    item = inventory_service.create_item(inv_db, prod_db, {**entry, "quantity": 2})
+    assert nutrition_summary(inv_db)["nutrients"]["protein"] == pytest.approx(60)
+
+    uuid = item["units"][0]["uuid"]
+    assert inventory_service.get_item_by_unit_uuid(inv_db, uuid)["id"] == item["id"]
+    inventory_service.consume_unit(inv_db, uuid)
+    assert nutrition_summary(inv_db) == recompute(inv_db)
+    assert nutrition_summary(inv_db)["units"] == 1
+
+    # A second connection to the same file notices the write.
+    other = open_inventory_db(sqlite_env / "inventory.ndjson")
+    assert nutrition_summary(other)["units"] == 1
+    inventory_service.delete_item(other, item["id"])
+    assert nutrition_summary(inv_db)["units"] == 0
+
+
+def test_migrate_from_jsonl(tmp_path):
+    source = JsonlDB(tmp_path / "inventory.ndjson", key="id", append_only=True)
+    source.put({"id": 1, "upc": "a"})
+    source.put({"id": 2, "upc": "b"})
+    source.put({"id": 1, "upc": "c"})
+    source.delete(2)
+    target = SqliteDB(
+        tmp_path / "inventory.sqlite3", key="id", indexes={"upc": field("upc")}
+    )
+    target.put({"id": 9})
+
+    assert migrate(source, target) == 1
+    assert target.read_all() == [{"id": 1, "upc": "c"}]
+    assert target.lookup("upc", "c")[0] == {"id": 1, "upc": "c"}
+
+
+def test_entries_are_extracted_for_added_indexes(tmp_path):
+    path = tmp_path / "inventory.sqlite3"
+    db = SqliteDB(path, key="id", indexes={"upc": field("upc")})
+    for i in range(1, 5):
+        db.put({"id": i, "upc": str(i)})
+
+    reopened = SqliteDB(
+        path, key="id", indexes={"upc": field("upc"), "id": SortedIndex(item_ids)}
+    )
+    hits = reopened.lookup_between("id", low=2, limit=2)
+    assert [row["id"] for row, _ in hits] == [2, 3]
+    assert reopened.lookup("upc", "4")[0]["id"] == 4
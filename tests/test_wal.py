@@ -0,0 +1,156 @@
+import pytest
+
+from src.db import JsonlDB, open_inventory_db, open_product_db
+from src.db.wal import MutationLog, rows_as_of
+from src.services import inventory_service
+
+
+def _ops(db):
+    return [(r["op"], r.get("key")) for r in MutationLog(db.path).records()]
+
+
+def test_every_change_is_logged(monkeypatch, tmp_path):
+    inv_db = open_inventory_db(tmp_path / "inventory.ndjson")
+    prod_db = open_product_db(tmp_path / "product-info.ndjson")
+    item = inventory_service.create_item(
+        inv_db, prod_db, {"upc": "1", "name": "Milk", "quantity": 2}
+    )
+    inventory_service.consume_unit(inv_db, item["units"][0]["uuid"])
+    inventory_service.delete_item(inv_db, item["id"])
+
+    def fail():
+        inv_db.put({"id": 9})
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        inv_db.mutate(fail)
+
+    assert _ops(inv_db) == [("create", 1), ("consume", 1), ("delete", 1)]
+    assert [op for op, _ in _ops(prod_db)] == ["create"]
+    seqs = [r["seq"] for r in MutationLog(inv_db.path).records()]
+    assert seqs == [1, 2, 3]
+
+
+def test_lost_appends_are_replayed_on_open(tmp_path):
+    path = tmp_path / "rows.ndjson"
+    db = JsonlDB(path, key="id", append_only=True, log=True)
+    db.put({"id": 1, "name": "a"})
+    size = path.stat().st_size
+    db.put({"id": 2, "name": "b"})
+    db.put({"id": 1, "name": "c"})
+    db.delete(2)
+
+    # Reopening a file that holds every change only syncs it.
+    reopened = JsonlDB(path, key="id", append_only=True, log=True)
+    assert reopened.read_all() == [{"id": 1, "name": "c"}]
+    assert reopened.stats["replayed"] == 0
+    synced = path.stat().st_size
+    assert synced > size
+
+    # Appends that never reached the disk come back from the log.
+    db.put({"id": 3, "name": "d"})
+    with path.open("r+b") as f:
+        f.truncate(synced + 3)
+    recovered = JsonlDB(path, key="id", append_only=True, log=True)
+    assert recovered.stats["replayed"] == 1
+    assert recovered.read_all() == [{"id": 1, "name": "c"}, {"id": 3, "name": "d"}]
+    assert JsonlDB(path, key="id").read_all() == recovered.read_all()
+
+
+def test_checkpoints_and_segments(tmp_path):
+    path = tmp_path / "rows.ndjson"
+    db = JsonlDB(path, key="id", append_only=True, log=True, checkpoint_records=3)
+    db._log.segment_bytes = 1
+    db._log.keep(1)
+    for i in range(7):
+        db.put({"id": i})
+
+    log = MutationLog(path)
+    assert log.checkpointed == 6
+    assert [first for first, _ in log.segments()] == [1, 4, 7]
+    assert [r["seq"] for r in log.pending()] == [7]
+    assert log.prune(5) == 1
+    assert [r["seq"] for r in log.records()][:1] == [4]
+
+
+def test_rotation_prunes_segments_no_backup_needs(tmp_path):
+    path = tmp_path / "rows.ndjson"
+    db = JsonlDB(path, key="id", append_only=True, log=True, checkpoint_records=3)
+    db._log.segment_bytes = 1
+    for i in range(30):
+        db.put({"id": i})
+    # Nothing is kept from before the last checkpoint, at seq 30.
+    assert [first for first, _ in db._log.segments()] == [31]
+
+    db._log.keep(31)
+    for i in range(30, 36):
+        db.put({"id": i})
+    assert [first for first, _ in db._log.segments()] == [31, 34, 37]
+    assert JsonlDB(path, key="id", log=True).read_all() == db.read_all()
+
+
+def test_rows_as_of(monkeypatch, tmp_path):
+    clock = iter(range(100, 200))
+    monkeypatch.setattr("src.db.wal.time.time", lambda: next(clock))
+    path = tmp_path / "rows.ndjson"
+    db = JsonlDB(path, key="id", log=True)
+    db.put({"id": 1, "n": 1})
+    db.put({"id": 2, "n": 1})
+    marker = next(clock)
+    db.put({"id": 1, "n": 2})
+    db.delete(2)
+    db.write_all([{"id": 5}])
+
+    log = MutationLog(path)
+    assert rows_as_of(log, "id", marker) == [{"id": 1, "n": 1}, {"id": 2, "n": 1}]
+    assert rows_as_of(log, "id", marker + 4) == [{"id": 1, "n": 2}]
+    assert rows_as_of(log, "id", 10**6) == [{"id": 5}]
+    # From a backup taken at seq 2: replays the update and delete only.
+    base = ([{"id": 1, "n": 1}, {"id": 2, "n": 1}, {"id": 3}], 2)
+    assert rows_as_of(log, "id", marker + 4, base) == [{"id": 1, "n": 2}, {"id": 3}]
+
+
+def test_log_started_on_existing_data_needs_a_base(tmp_path):
+    path = tmp_path / "rows.ndjson"
+    JsonlDB(path, key="id").put({"id": 1})
+    db = JsonlDB(path, key="id", log=True)
+    db.put({"id": 2})
+
+    with pytest.raises(ValueError):
+        rows_as_of(MutationLog(path), "id", 10**12)
+    assert rows_as_of(MutationLog(path), "id", 10**12, ([{"id": 1}], 0)) == [
+        {"id": 1},
+        {"id": 2},
+    ]
+
+
+def test_unlogged_rewrite_logs_only_a_marker(tmp_path):
+    path = tmp_path / "rows.ndjson"
+    db = JsonlDB(path, key="id", append_only=True, log=True)
+    db.put({"id": 1, "name": "a"})
+    db.put({"id": 2, "name": "b"})
+    db.write_all([{"id": 1, "name": "x" * 1000}, {"id": 5}], log=False)
+    size = path.stat().st_size
+    db.put({"id": 6})
+
+    log = MutationLog(path)
+    assert [r["op"] for r in log.records()] == [
+        "create",
+        "create",
+        "rewrite",
+        "create",
+    ]
+    assert sum(p.stat().st_size for _, p in log.segments()) < 1000
+    with pytest.raises(ValueError):
+        rows_as_of(log, "id", 10**12)
+    # A backup taken after the rewrite is a usable base.
+    assert rows_as_of(log, "id", 10**12, ([{"id": 5}], 3)) == [{"id": 5}, {"id": 6}]
+
+    # Crashing between the marker and its checkpoint replays nothing over
+    # the new file, and appends after the marker are still recovered.
+    log.checkpoint(2)
+    with path.open("r+b") as f:
+        f.truncate(size)
+    reopened = JsonlDB(path, key="id", append_only=True, log=True)
+    assert reopened.stats["replayed"] == 1
+    assert [row["id"] for row in reopened.read_all()] == [1, 5, 6]